@@ -2,18 +2,17 @@ import matplotlib
 matplotlib.use("Agg")
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from io import BytesIO
 import geopandas as gpd
+import numpy as np
 import osmnx as ox
 import os
 import time
 import asyncio
-import functools
 import logging
-import hashlib
 import requests
 from pyproj import Transformer
 from reportlab.platypus import SimpleDocTemplate, Image as RLImage, Spacer, Paragraph, PageBreak
@@ -29,12 +28,28 @@ from fastapi import Response as _FResponse
 # Override via env var OVERPASS_URL if needed.
 # ox.settings.overpass_url = os.getenv("OVERPASS_URL", "https://overpass.kumi.systems/api/")
 
-from modules.walking import generate_walking
-from modules.driving import generate_driving
-from modules.transport import generate_transport
-from modules.context import generate_context
-from modules.view import generate_view
-from modules.noise import generate_noise
+from modules.walking import (generate_walking, osm_layers as walking_layers,
+                             isochrone_bands as walking_isochrones)
+from modules.driving import (generate_driving, osm_layers as driving_layers,
+                             isochrone_bands as driving_isochrones)
+from modules.transport import generate_transport, osm_layers as transport_layers
+from modules.context import generate_context, osm_layers as context_layers
+from modules.view import generate_view, osm_layers as view_layers
+from modules.noise import (generate_noise, osm_layers as noise_layers,
+                           set_propagation_cutoff, QUALITY_PRESETS as NOISE_QUALITIES,
+                           noise_raster, NoiseRaster)
+from modules.site_bundle import SiteBundle, set_feature_store
+from modules.isochrone import band_geojson
+from modules.accessibility import score_sites, MODES as ACCESS_MODES
+from modules.resolver import resolve_location
+from modules.osm_store import OSMStore
+from modules.graph_store import (GraphStore, register_store, set_graph_cache,
+                                 graph_cache_stats)
+from modules.executor import AnalysisExecutor, AnalysisQueueFull
+from modules.render_pool import RenderPool, register_dataset
+from modules.jobs import JobStore, JobManager, JobQueueFull
+from modules.cache import (ResultCache, DiskCache, SingleFlight, parse_quotas,
+                           canonical_request, fingerprint, analysis_group)
 
 # ── App ───────────────────────────────────────────────────────
 app = FastAPI(title="Automated Site Analysis API", version="3.1")
@@ -50,15 +65,56 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 # ── Cache ─────────────────────────────────────────────────────
-CACHE_STORE = {}
+# Bounded in-memory LRU of rendered results. The free tier has 512MB RAM,
+# so the budget stays small; view PNGs (dpi=200) and PDFs get their own
+# quotas so a few large results cannot evict every panel.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() != "false"
+RESULT_CACHE  = ResultCache(
+    max_bytes = int(float(os.getenv("RESULT_CACHE_MAX_MB", "96")) * 1024 * 1024),
+    ttl_s     = float(os.getenv("RESULT_CACHE_TTL_S", "21600")),
+    quotas    = parse_quotas(os.getenv("RESULT_CACHE_QUOTAS", "view=32")),
+)
 
-def cache_key(data_type: str, value: str, analysis_type: str):
-    return hashlib.md5(f"{data_type}_{value}_{analysis_type}".encode()).hexdigest()
+# Bump a module's version whenever its rendered output changes so stale
+# entries in the disk cache stop matching.
+ANALYSIS_VERSIONS = {
+    "walking":   "4",
+    "driving":   "6",
+    "transport": "2",
+    "context":   "8",
+    "view":      "1",
+    "noise":     "2.12",
+}
+
+def cache_request(site, analysis_type: str, params: dict = None):
+    """Canonical request dict for a normalised site tuple (see normalise_request)."""
+    data_type, value, lon, lat, lot_ids, extents = site
+    return canonical_request(
+        data_type, value, analysis_type, lon, lat, lot_ids, extents,
+        params=params, version=ANALYSIS_VERSIONS.get(analysis_group(analysis_type)))
+
+def cache_key(site, analysis_type: str, params: dict = None):
+    return fingerprint(cache_request(site, analysis_type, params))
 
 # ── Static data ───────────────────────────────────────────────
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
+# ── Disk cache ────────────────────────────────────────────────
+# Second tier on local disk: shared by all uvicorn workers and kept across
+# restarts, so a deploy comes up warm. Set DISK_CACHE_MAX_MB=0 to disable.
+DISK_CACHE_MAX_MB = float(os.getenv("DISK_CACHE_MAX_MB", "512"))
+DISK_CACHE = DiskCache(
+    root      = os.getenv("DISK_CACHE_DIR", os.path.join(DATA_DIR, "result_cache")),
+    max_bytes = int(DISK_CACHE_MAX_MB * 1024 * 1024),
+) if CACHE_ENABLED and DISK_CACHE_MAX_MB > 0 else None
+
+# Identical requests that arrive while a result is being computed (double
+# clicks, frontend retries, /report batches racing panel requests) wait on
+# the first caller instead of starting a second pipeline.
+IN_FLIGHT = SingleFlight()
+
+# ── Datasets ──────────────────────────────────────────────────
 print("Loading zoning dataset...")
 ZONE_DATA = gpd.read_file(os.path.join(DATA_DIR, "ZONE_REDUCED.gpkg")).to_crs(3857)
 
@@ -67,6 +123,63 @@ BUILDING_DATA = gpd.read_file(os.path.join(DATA_DIR, "BUILDINGS_FINAL .gpkg")).t
 if "HEIGHT_M" not in BUILDING_DATA.columns:
     raise ValueError(f"HEIGHT_M column not found. Available: {BUILDING_DATA.columns}")
 BUILDING_DATA = BUILDING_DATA[BUILDING_DATA["HEIGHT_M"] > 5]
+
+# ── Local OSM store ───────────────────────────────────────────
+# Feature queries are answered from the prepare_osm_data.py GeoPackages
+# when they cover the tags and area; Overpass is only the fallback. Set
+# OSM_LOCAL=false to always go to Overpass.
+OSM_STORE = None
+if os.getenv("OSM_LOCAL", "true").lower() != "false":
+    OSM_STORE = OSMStore(os.getenv("OSM_DATA_DIR", os.path.join(DATA_DIR, "osm")))
+    set_feature_store(OSM_STORE)
+    print(f"Local OSM layers: {sorted(OSM_STORE.layers) or 'none (Overpass only)'}")
+
+# ── Local street graphs ───────────────────────────────────────
+# Walk / drive graphs prebuilt by prepare_osm_data.py and memory-mapped, so
+# walking and driving cut their network locally instead of asking Overpass
+# and re-simplifying it per request. Missing graphs fall back to osmnx.
+GRAPH_STORES = {}
+if os.getenv("GRAPH_LOCAL", "true").lower() != "false":
+    graph_dir = os.getenv("GRAPH_DIR", os.path.join(DATA_DIR, "graphs"))
+    for network_type in ("walk", "drive"):
+        store = GraphStore.load(os.path.join(graph_dir, network_type))
+        if store is not None:
+            register_store(store)
+            GRAPH_STORES[network_type] = store
+    print(f"Local street graphs: {sorted(GRAPH_STORES) or 'none (Overpass only)'}")
+
+# The last graphs (and their nearest-node indexes) stay in memory so a
+# repeat request or /isochrones call for the same site reuses them. A 20-min
+# drive graph with its projection runs to tens of MB, so the default keeps
+# two — one site's walk and drive graph — within the 512 MB tier.
+set_graph_cache(int(os.getenv("GRAPH_CACHE_SIZE", "2")))
+
+# NOISE_CUTOFF_M > 0 lets each noise grid cell sum only road segments
+# within that many metres (plus a far-field estimate); the map reports the
+# worst-case error. Part of the noise cache version so results don't mix.
+NOISE_CUTOFF_M = float(os.getenv("NOISE_CUTOFF_M", "0"))
+set_propagation_cutoff(NOISE_CUTOFF_M)
+if NOISE_CUTOFF_M > 0:
+    ANALYSIS_VERSIONS["noise"] += f"-cut{NOISE_CUTOFF_M:g}"
+
+# ── Render backend ────────────────────────────────────────────
+# RENDER_BACKEND=process runs generators in pre-forked worker processes so
+# CPU-heavy matplotlib work escapes the GIL. Workers are forked here — after
+# the datasets are loaded and before any thread starts — and share the
+# datasets copy-on-write. Default "thread" renders in the executor threads.
+# If a worker dies (OOM kill) the pool is not re-forked from this threaded
+# process; rendering falls back to the executor threads instead.
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "thread").lower()
+RENDER_POOL    = None
+if RENDER_BACKEND == "process":
+    register_dataset("zone_data", ZONE_DATA)
+    register_dataset("building_data", BUILDING_DATA)
+    print("Starting render workers...")
+    RENDER_POOL = RenderPool(
+        processes = int(os.getenv("RENDER_PROCESSES", str(os.cpu_count() or 2))),
+        preload   = ["modules.walking", "modules.driving", "modules.transport",
+                     "modules.context", "modules.view", "modules.noise"],
+    ).start()
 print("Startup complete.")
 
 # ── Request model ─────────────────────────────────────────────
@@ -80,6 +193,22 @@ class LocationRequest(BaseModel):
     max_walk_minutes:   Optional[int] = None
     max_drive_minutes:  Optional[int] = None
     context_radius_m:   Optional[int] = None
+    noise_quality:      Optional[str] = None
+
+class JobRequest(LocationRequest):
+    kind: str = "report"
+
+class IsochroneRequest(LocationRequest):
+    mode: str = "walk"
+
+class NoiseSampleRequest(LocationRequest):
+    points: List[List[float]]          # [[lon, lat], ...]
+
+class AccessibilityBatchRequest(BaseModel):
+    sites:       List[LocationRequest]
+    modes:       List[str] = ["walk", "drive"]
+    stations:    int = 3
+    max_minutes: int = 15
 
 def image_response(buf: BytesIO):
     buf.seek(0)
@@ -93,18 +222,108 @@ def normalise_request(req: LocationRequest):
         raise ValueError("ADDRESS type requires pre-resolved lon/lat from search results.")
     return dt, req.value, req.lon, req.lat, lot_ids, extents
 
+# ── Analysis executor ─────────────────────────────────────────
+# Analyses run on their own bounded pool instead of Starlette's shared
+# threadpool, so health checks and cache hits are never queued behind a
+# minute-long render. Each analysis peaks at ~150-250MB on the 512MB free
+# tier, hence 2 workers by default; beyond ANALYSIS_QUEUE_MAX waiting
+# requests the API answers 503 + Retry-After.
+ANALYSIS_EXECUTOR = AnalysisExecutor(
+    max_workers = int(os.getenv("ANALYSIS_WORKERS", "2")),
+    max_queue   = int(os.getenv("ANALYSIS_QUEUE_MAX", "8")),
+)
+
 # ── Generic wrapper ───────────────────────────────────────────
-def run_analysis(data_type, value, analysis_type, func, *args):
+def _in_process(func):
+    """Mark an analysis built from other cached analyses: it runs in this
+    process and sends each of its own steps to the render backend."""
+    func.in_process = True
+    return func
+
+def _render(func, *args, **kwargs):
+    """Run one generator on the configured backend and return its PNG bytes."""
+    if RENDER_POOL is not None and not getattr(func, "in_process", False):
+        return RENDER_POOL.render(func, *args, **kwargs)
+    return func(*args, **kwargs).getvalue()
+
+def _compute_result(key, request, func, *args, bundle=None,
+                    content_type="image/png"):
+    """Disk lookup → compute under the cross-worker lock → store. Returns bytes."""
+    analysis_type = request["analysis_type"]
+    label         = f"{request['data_type']} {request['value']}"
+    if DISK_CACHE is None:
+        data = _render(func, *args, bundle=bundle)
+    else:
+        cached = DISK_CACHE.get(key)
+        if cached is not None:
+            logging.info(f"{analysis_type.upper()} disk cache hit for {label}")
+            data = cached.getvalue()
+        else:
+            # Another worker may be computing the same key — wait on its lock,
+            # then re-check the disk before doing the work ourselves.
+            with DISK_CACHE.lock(key):
+                cached = DISK_CACHE.get(key)
+                if cached is not None:
+                    data = cached.getvalue()
+                else:
+                    data = _render(func, *args, bundle=bundle)
+                    DISK_CACHE.put(key, data, {"request": request,
+                                               "content_type": content_type})
+    if CACHE_ENABLED:
+        RESULT_CACHE.put(key, data, analysis_type)
+    return data
+
+def run_analysis(site, analysis_type, func, *args, params=None, bundle=None,
+                 content_type="image/png"):
+    """
+    site = normalise_request(...) tuple. The cache key is the canonical
+    fingerprint of the site plus analysis_type and params, so requests that
+    share a display name but differ in coordinates or extents never collide.
+    bundle (a SiteBundle) only changes where the inputs come from, so it is
+    not part of the key.
+    """
+    data_type, value = site[0], site[1]
     logging.info(f"Incoming {analysis_type.upper()} request for {data_type} {value}")
-    start = time.time()
-    key = cache_key(data_type, value, analysis_type)
-    if key in CACHE_STORE:
-        logging.info(f"{analysis_type.upper()} cache hit for {data_type} {value}")
-        return CACHE_STORE[key]
-    result = func(*args)
-    CACHE_STORE[key] = result
+    start   = time.time()
+    request = cache_request(site, analysis_type, params)
+    key     = fingerprint(request)
+    if CACHE_ENABLED:
+        cached = RESULT_CACHE.get(key)
+        if cached is not None:
+            logging.info(f"{analysis_type.upper()} cache hit for {data_type} {value}")
+            return cached
+    data = IN_FLIGHT.do(key, _compute_result, key, request, func, *args,
+                        bundle=bundle, content_type=content_type)
     logging.info(f"{analysis_type.upper()} completed in {round(time.time()-start,2)}s")
-    return result
+    return BytesIO(data)
+
+def _is_cached(site, analysis_type, params=None) -> bool:
+    if not CACHE_ENABLED:
+        return False
+    key = cache_key(site, analysis_type, params)
+    return (RESULT_CACHE.get(key, count_miss=False) is not None
+            or (DISK_CACHE is not None and key in DISK_CACHE))
+
+async def run_analysis_async(site, analysis_type, func, *args, params=None,
+                             content_type="image/png"):
+    """
+    Endpoint entry point: memory-cache hits are answered on the event loop,
+    everything else is queued on ANALYSIS_EXECUTOR (503 when it is full).
+    """
+    if CACHE_ENABLED:
+        cached = RESULT_CACHE.get(cache_key(site, analysis_type, params),
+                                  count_miss=False)
+        if cached is not None:
+            logging.info(f"{analysis_type.upper()} cache hit for {site[0]} {site[1]}")
+            return cached
+    try:
+        return await ANALYSIS_EXECUTOR.run(
+            run_analysis, site, analysis_type, func, *args, params=params,
+            content_type=content_type)
+    except AnalysisQueueFull as e:
+        logging.warning(f"{analysis_type.upper()} rejected: {e}")
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
 
 # ── Search helpers ────────────────────────────────────────────
 _t2326_4326 = Transformer.from_crs(2326, 4326, always_xy=True)
@@ -223,82 +442,244 @@ def lot_boundary(
 
 # ── Analysis endpoints ────────────────────────────────────────
 CONTEXT_RADIUS_ALLOWED = {600, 800, 1000}
+ANALYSIS_KINDS = ("walking", "driving", "transport", "context", "view", "noise")
 
-@app.post("/walking")
-def walking(req: LocationRequest):
-    try:
-        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
+def analysis_task(kind: str, req: LocationRequest):
+    """Map an analysis kind + request to (site, analysis_type, func, args)."""
+    site = normalise_request(req)
+    dt, v, lon, lat, lot_ids, extents = site
+    if kind == "walking":
         max_walk = req.max_walk_minutes if req.max_walk_minutes is not None else 15
         max_walk = max(5, min(20, max_walk))
-        img = run_analysis(dt, v, f"walking_{max_walk}",
-            generate_walking, dt, v, max_walk, lon, lat, lot_ids, extents)
-        return image_response(img)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/driving")
-def driving(req: LocationRequest):
-    try:
-        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
+        return site, f"walking_{max_walk}", generate_walking, \
+            [dt, v, max_walk, lon, lat, lot_ids, extents]
+    if kind == "driving":
         max_drive = req.max_drive_minutes if req.max_drive_minutes is not None else 15
         max_drive = max(5, min(20, max_drive))
-        img = run_analysis(dt, v, f"driving_{max_drive}",
-            generate_driving, dt, v, ZONE_DATA, lon, lat, lot_ids, extents, max_drive)
+        return site, f"driving_{max_drive}", generate_driving, \
+            [dt, v, ZONE_DATA, lon, lat, lot_ids, extents, max_drive]
+    if kind == "transport":
+        return site, "transport", generate_transport, \
+            [dt, v, lon, lat, lot_ids, extents]
+    if kind == "context":
+        radius_m = req.context_radius_m if req.context_radius_m is not None else 600
+        if radius_m not in CONTEXT_RADIUS_ALLOWED:
+            radius_m = 600
+        return site, f"context_{radius_m}", generate_context, \
+            [dt, v, ZONE_DATA, radius_m, lon, lat, lot_ids, extents]
+    if kind == "view":
+        return site, "view", generate_view, \
+            [dt, v, BUILDING_DATA, lon, lat, lot_ids, extents]
+    if kind == "noise":
+        # "standard" keeps the plain "noise" type so it shares cache
+        # entries with /report; draft / high get their own.
+        quality = (req.noise_quality or "standard").lower()
+        if quality not in NOISE_QUALITIES:
+            raise HTTPException(status_code=400,
+                                detail=f"noise_quality must be one of {sorted(NOISE_QUALITIES)}")
+        analysis_type = "noise" if quality == "standard" else f"noise_{quality}"
+        return site, analysis_type, _noise_map, \
+            [dt, v, lon, lat, lot_ids, extents, quality]
+    raise ValueError(f"Unknown analysis kind: {kind}")
+
+async def _analysis_endpoint(kind: str, req: LocationRequest):
+    try:
+        site, analysis_type, func, args = analysis_task(kind, req)
+        if site[5]:
+            logging.info(f"  extents count: {len(site[5])}")
+        img = await run_analysis_async(site, analysis_type, func, *args)
         return image_response(img)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/walking")
+async def walking(req: LocationRequest):
+    return await _analysis_endpoint("walking", req)
+
+@app.post("/driving")
+async def driving(req: LocationRequest):
+    return await _analysis_endpoint("driving", req)
+
 @app.post("/transport")
-def transport(req: LocationRequest):
-    try:
-        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
-        img = run_analysis(dt, v, "transport",
-            generate_transport, dt, v, lon, lat, lot_ids, extents)
-        return image_response(img)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def transport(req: LocationRequest):
+    return await _analysis_endpoint("transport", req)
 
 @app.post("/context")
 async def context(req: LocationRequest):
+    return await _analysis_endpoint("context", req)
+
+@app.post("/view")
+async def view(req: LocationRequest):
+    return await _analysis_endpoint("view", req)
+
+@app.post("/noise")
+async def noise(req: LocationRequest):
+    return await _analysis_endpoint("noise", req)
+
+
+# ── /noise/raster, /noise/sample ──────────────────────────────
+# The propagated noise grid as data: cached once per site and quality as a
+# compressed float32 raster ("noise_raster" analysis type, same version as
+# the map), then served as GeoTIFF / .npy or sampled at points. The /noise
+# map is drawn from the same entry, so the three propagate once per site.
+NOISE_RASTER_FORMATS = {"tiff": "image/tiff", "npy": "application/octet-stream"}
+NOISE_SAMPLE_MAX     = int(os.getenv("NOISE_SAMPLE_MAX", "5000"))
+_t4326_3857 = Transformer.from_crs(4326, 3857, always_xy=True)
+
+def _noise_raster_type(quality: str) -> str:
+    return "noise_raster" if quality == "standard" else f"noise_raster_{quality}"
+
+@_in_process
+def _noise_map(data_type, value, lon=None, lat=None, lot_ids=None, extents=None,
+               quality="standard", bundle=None):
+    """The noise map, rendered from the cached noise raster."""
+    site   = (data_type, value, lon, lat, lot_ids, extents)
+    args   = [data_type, value, lon, lat, lot_ids, extents, quality]
+    raster = run_analysis(site, _noise_raster_type(quality), noise_raster, *args,
+                          bundle=bundle, content_type="application/x-npz")
+    return BytesIO(_render(generate_noise, *args, bundle=bundle,
+                           raster=raster.getvalue()))
+
+async def _noise_raster(req: LocationRequest) -> NoiseRaster:
+    site, _, _, args = analysis_task("noise", req)
+    buf = await run_analysis_async(site, _noise_raster_type(args[-1]), noise_raster,
+                                   *args, content_type="application/x-npz")
+    return NoiseRaster.from_bytes(buf.getvalue())
+
+@app.post("/noise/raster")
+async def noise_raster_endpoint(req: LocationRequest, format: str = "tiff"):
+    fmt = format.lower()
+    if fmt not in NOISE_RASTER_FORMATS:
+        raise HTTPException(status_code=400,
+                            detail=f"format must be one of {sorted(NOISE_RASTER_FORMATS)}")
     try:
-        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
-        if extents:
-            logging.info(f"  extents count: {len(extents)}")
-        radius_m = req.context_radius_m if req.context_radius_m is not None else 600
-        if radius_m not in CONTEXT_RADIUS_ALLOWED:
-            radius_m = 600
-        loop = asyncio.get_event_loop()
-        img  = await loop.run_in_executor(
-            None,
-            functools.partial(
-                run_analysis, dt, v, f"context_{radius_m}",
-                generate_context, dt, v, ZONE_DATA, radius_m,
-                lon, lat, lot_ids, extents
-            )
-        )
-        return image_response(img)
+        raster = await _noise_raster(req)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/view")
-def view(req: LocationRequest):
+    body = raster.to_geotiff() if fmt == "tiff" else raster.to_npy()
+    return _FResponse(content=body, media_type=NOISE_RASTER_FORMATS[fmt], headers={
+        "Content-Disposition": f'attachment; filename="noise.{fmt}"',
+        "X-Raster-CRS":        NoiseRaster.CRS,
+        "X-Raster-Transform":  ",".join(f"{v:.3f}" for v in raster.transform),
+    })
+
+@app.post("/noise/sample")
+async def noise_sample(req: NoiseSampleRequest):
+    if len(req.points) > NOISE_SAMPLE_MAX:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {NOISE_SAMPLE_MAX} points per request")
+    if any(len(p) != 2 for p in req.points):
+        raise HTTPException(status_code=400, detail="points must be [lon, lat] pairs")
     try:
-        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
-        img = run_analysis(dt, v, "view",
-            generate_view, dt, v, BUILDING_DATA, lon, lat, lot_ids, extents)
-        return image_response(img)
+        raster = await _noise_raster(req)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    pts = np.asarray(req.points, dtype=np.float64).reshape(-1, 2)
+    x, y = _t4326_3857.transform(pts[:, 0], pts[:, 1])
+    levels = raster.sample(x, y)
+    return {
+        "resolution_m": raster.resolution,
+        "levels_db":    [round(float(v), 1) if np.isfinite(v) else None for v in levels],
+    }
+
+
+# ── /isochrones ───────────────────────────────────────────────
+# The polygons the walking / driving maps draw (same site polygon, source
+# node and band list) as GeoJSON, one feature per band, smallest first.
+# Cached like a map under "<walking|driving>_isochrones_<minutes>", so the
+# entry follows the map module's version.
+ISOCHRONE_MODES = {"walk": "walking", "drive": "driving"}
+
+def isochrone_task(mode: str, req: IsochroneRequest):
+    """Map a mode + request to (site, analysis_type, args) for band_geojson."""
+    site = normalise_request(req)
+    dt, v, lon, lat, lot_ids, extents = site
+    if mode == "walk":
+        minutes = req.max_walk_minutes if req.max_walk_minutes is not None else 15
+        minutes = max(5, min(20, minutes))
+        args = [walking_isochrones, dt, v, lon, lat, lot_ids, extents, minutes]
+    else:
+        minutes = req.max_drive_minutes if req.max_drive_minutes is not None else 15
+        minutes = max(5, min(20, minutes))
+        args = [driving_isochrones, dt, v, ZONE_DATA, lon, lat, lot_ids, extents, minutes]
+    return site, f"{ISOCHRONE_MODES[mode]}_isochrones_{minutes}", args
+
+@app.post("/isochrones")
+async def isochrones(req: IsochroneRequest):
+    mode = req.mode.lower()
+    if mode not in ISOCHRONE_MODES:
+        raise HTTPException(status_code=400,
+                            detail=f"mode must be one of {sorted(ISOCHRONE_MODES)}")
+    try:
+        site, analysis_type, args = isochrone_task(mode, req)
+        buf = await run_analysis_async(site, analysis_type, band_geojson, *args,
+                                       content_type="application/geo+json")
+        return _FResponse(content=buf.getvalue(), media_type="application/geo+json")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/noise")
-def noise(req: LocationRequest):
+
+# ── /accessibility/batch ──────────────────────────────────────
+# Nearest-station minutes for many sites as JSON, no rendering. Sites are
+# grouped so neighbours share one graph and one multi-source search.
+ACCESS_BATCH_MAX = int(os.getenv("ACCESS_BATCH_MAX", "500"))
+
+def accessibility_batch(sites: list, modes: list, k: int, max_minutes: int):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _resolve(site):
+        dt, v, lon, lat, lot_ids, extents = site
+        try:
+            return resolve_location(dt, v, lon, lat, lot_ids, extents)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        located = list(pool.map(_resolve, sites))
+    ok = [i for i, loc in enumerate(located) if not isinstance(loc, Exception)]
+    results = [{"data_type": site[0], "value": site[1]} for site in sites]
+    for i, loc in enumerate(located):
+        if isinstance(loc, Exception):
+            results[i]["error"] = str(loc)
+        else:
+            results[i]["lon"], results[i]["lat"] = loc
+    for mode in modes:
+        scores = score_sites([located[i] for i in ok], mode, k, max_minutes)
+        for i, score in zip(ok, scores):
+            results[i][mode] = score
+    return {"modes": modes, "max_minutes": max_minutes, "sites": results}
+
+@app.post("/accessibility/batch")
+async def accessibility(req: AccessibilityBatchRequest):
+    modes = [m.lower() for m in req.modes]
+    bad   = [m for m in modes if m not in ACCESS_MODES]
+    if bad or not modes:
+        raise HTTPException(status_code=400,
+                            detail=f"modes must be from {sorted(ACCESS_MODES)}")
+    if len(req.sites) > ACCESS_BATCH_MAX:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {ACCESS_BATCH_MAX} sites per batch")
+    k           = max(1, min(5, req.stations))
+    max_minutes = max(1, min(30, req.max_minutes))
     try:
-        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
-        if extents:
-            logging.info(f"  extents count: {len(extents)}")
-        img = run_analysis(dt, v, "noise",
-            generate_noise, dt, v, lon, lat, lot_ids, extents)
-        return image_response(img)
+        sites = [normalise_request(s) for s in req.sites]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logging.info(f"Accessibility batch: {len(sites)} sites, modes {modes}")
+    try:
+        return await ANALYSIS_EXECUTOR.run(
+            accessibility_batch, sites, modes, k, max_minutes)
+    except AnalysisQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -307,38 +688,61 @@ def noise(req: LocationRequest):
 
 def generate_pdf_report(data_type: str, value: str,
                          lon: float = None, lat: float = None,
-                         lot_ids: list = None, extents: list = None):
+                         lot_ids: list = None, extents: list = None,
+                         progress=None):
     """
-    Generates all analysis images IN PARALLEL using a ThreadPoolExecutor,
-    then assembles them into a PDF.
+    Generates all analysis images IN PARALLEL on ANALYSIS_EXECUTOR, then
+    assembles them into a PDF. Each panel takes its own executor slot, so a
+    report counts against the same limit as the panel endpoints. Call it
+    from outside the executor's threads — panels wait for a free slot.
+
+    progress(name, status) — optional callback (used by /jobs) receiving
+    "queued" / "running" / "done" / "failed" / "timeout" per analysis and
+    for the final "pdf" step.
 
     Each module runs concurrently — total wall time ≈ slowest single module
     (~60-80s) instead of the sum of all modules (~400s+ sequential).
 
-    Uses shutdown(wait=False) after cf.wait so zombie threads (e.g. a slow
-    Overpass fetch) do not block PDF assembly after the timeout fires.
+    Panels still running after the batch timeout (e.g. a slow Overpass
+    fetch) are left to finish on the executor; PDF assembly does not wait.
+
+    All analyses share one SiteBundle: the site is resolved once and OSM
+    layers several modules ask for (stations, buildings) are fetched once.
     """
     import concurrent.futures as _cf
-    from concurrent.futures import ThreadPoolExecutor
 
     lot_ids = lot_ids or []
     extents = extents or []
+    site    = (data_type, value, lon, lat, lot_ids, extents)
 
     # ── Define all analysis tasks ─────────────────────────────
+    # Analysis types match the panel endpoints' defaults so the report and
+    # individual panel requests share cache entries.
     tasks = [
         ("walking_5",    generate_walking,   [data_type, value, 5,  lon, lat, lot_ids, extents]),
         ("walking_15",   generate_walking,   [data_type, value, 15, lon, lat, lot_ids, extents]),
         ("driving_15",   generate_driving,   [data_type, value, ZONE_DATA, lon, lat, lot_ids, extents, 15]),
         ("transport",    generate_transport, [data_type, value, lon, lat, lot_ids, extents]),
         ("context_600",  generate_context,   [data_type, value, ZONE_DATA, 600, lon, lat, lot_ids, extents]),
-        ("noise",        generate_noise,     [data_type, value, lon, lat, lot_ids, extents]),
+        ("view",         generate_view,      [data_type, value, BUILDING_DATA, lon, lat, lot_ids, extents]),
+        ("noise",        _noise_map,         [data_type, value, lon, lat, lot_ids, extents]),
     ]
+    layers = {
+        "walking_5":   walking_layers(data_type, 5),
+        "walking_15":  walking_layers(data_type, 15),
+        "driving_15":  driving_layers(data_type, 15),
+        "transport":   transport_layers(data_type),
+        "context_600": context_layers(data_type, 600),
+        "view":        view_layers(data_type),
+        "noise":       noise_layers(data_type),
+    }
     titles = [
         "Walking Accessibility (5 min)",
         "Walking Accessibility (15 min)",
         "Driving Distance",
         "Transport Network",
         "Context & Zoning",
+        "View Analysis",
         "Noise Assessment",
     ]
 
@@ -347,19 +751,44 @@ def generate_pdf_report(data_type: str, value: str,
     # exhausts memory and triggers an OOM kill. Batching to 2 concurrent
     # workers keeps peak RAM safe while still being 3× faster than sequential.
     # Cache hits return instantly so cached modules don't slow down batches.
-    BATCH_SIZE = 2
+    # With the process backend each worker renders on its own core, so a
+    # batch is as wide as the render pool. Panels run on ANALYSIS_EXECUTOR,
+    # so ANALYSIS_WORKERS still caps renders across reports, jobs and panels.
+    BATCH_SIZE = max(2, RENDER_POOL.processes) if RENDER_POOL is not None else 2
     logging.info(f"[report] Launching {len(tasks)} analyses in batches of {BATCH_SIZE}...")
     t0   = time.time()
     imgs = [None] * len(tasks)
+    progress = progress or (lambda name, status: None)
+    for atype, _, _ in tasks:
+        progress(atype, "queued")
+
+    # ── Shared site data ──────────────────────────────────────
+    # Only layers of analyses that still have to run are reserved, so a
+    # mostly-cached report does not fetch anything it will not use. Worker
+    # processes cannot share a lazily filled bundle, so with the process
+    # backend shared layers are fetched up front and each task gets a
+    # snapshot holding just the layers it needs.
+    bundle = SiteBundle(data_type, value, lon, lat, lot_ids, extents)
+    for atype, _, _ in tasks:
+        if not _is_cached(site, atype):
+            bundle.reserve_all(layers[atype])
+    if RENDER_POOL is not None:
+        bundle.prefetch()
+
+    def _task_bundle(atype):
+        return bundle.snapshot(layers[atype]) if RENDER_POOL is not None else bundle
 
     for batch_start in range(0, len(tasks), BATCH_SIZE):
         batch = list(enumerate(tasks))[batch_start:batch_start + BATCH_SIZE]
         logging.info(f"[report] Batch {batch_start//BATCH_SIZE + 1}: "
                      f"{[tasks[i][0] for i, _ in batch]}")
 
-        _pool = ThreadPoolExecutor(max_workers=BATCH_SIZE)
+        for i, (atype, _, _) in batch:
+            progress(atype, "running")
+
         future_to_idx = {
-            _pool.submit(run_analysis, data_type, value, atype, func, *args): i
+            ANALYSIS_EXECUTOR.submit(run_analysis, site, atype, func, *args,
+                                     bundle=_task_bundle(atype), wait=True): i
             for i, (atype, func, args) in batch
         }
 
@@ -369,20 +798,23 @@ def generate_pdf_report(data_type: str, value: str,
         for f in pending:
             idx = future_to_idx[f]
             logging.warning(f"[report] '{tasks[idx][0]}' timed out — using blank image")
-
-        # CRITICAL: shutdown(wait=False) — do not block on zombie Overpass threads
-        _pool.shutdown(wait=False)
+            progress(tasks[idx][0], "timeout")
 
         for f, idx in future_to_idx.items():
             if f in done:
                 try:
                     imgs[idx] = f.result()
+                    progress(tasks[idx][0], "done")
                 except Exception as e:
                     logging.warning(f"[report] '{tasks[idx][0]}' failed: {e}")
+                    progress(tasks[idx][0], "failed")
 
         import gc as _gc; _gc.collect()   # free memory between batches
 
-    logging.info(f"[report] All analyses done in {time.time()-t0:.1f}s")
+    logging.info(f"[report] All analyses done in {time.time()-t0:.1f}s "
+                 f"(site bundle: {bundle.stats()})")
+    del bundle
+    progress("pdf", "running")
 
     # ── Build PDF ─────────────────────────────────────────────
     buffer = BytesIO()
@@ -404,31 +836,6 @@ def generate_pdf_report(data_type: str, value: str,
         leftMargin=margin_pt, rightMargin=margin_pt,
         topMargin=margin_pt,  bottomMargin=margin_pt)
 
-    logging.info("Generating report images...")
-
-    # Use run_analysis so we reuse cached results from individual panel requests
-    imgs = [
-        run_analysis(data_type, value, "walking_5",
-            generate_walking, data_type, value, 5,  lon, lat, lot_ids, extents),
-        run_analysis(data_type, value, "walking_15",
-            generate_walking, data_type, value, 15, lon, lat, lot_ids, extents),
-        run_analysis(data_type, value, "driving",
-            generate_driving, data_type, value, ZONE_DATA, lon, lat, lot_ids, extents),
-        run_analysis(data_type, value, "transport",
-            generate_transport, data_type, value, lon, lat, lot_ids, extents),
-        run_analysis(data_type, value, "context",
-            generate_context, data_type, value, ZONE_DATA, None, lon, lat, lot_ids, extents),        
-        run_analysis(data_type, value, "view",
-            generate_view, data_type, value, BUILDING_DATA, lon, lat, lot_ids, extents),
-        run_analysis(data_type, value, "noise",
-            generate_noise, data_type, value, lon, lat, lot_ids, extents),
-    ]
-    titles = [
-        "Walking Accessibility (5 min)", "Walking Accessibility (15 min)",
-        "Driving Distance", "Transport Network",
-        "Context & Zoning", "View Analysis", "Noise Assessment",
-    ]
-
     elements = []
     elements.append(Spacer(1, 3 * inch))
     elements.append(Paragraph("Site Analysis Report", title_style))
@@ -457,6 +864,7 @@ def generate_pdf_report(data_type: str, value: str,
 
     doc.build(elements)
     buffer.seek(0)
+    progress("pdf", "done")
     return buffer
 
 
@@ -464,39 +872,138 @@ def generate_pdf_report(data_type: str, value: str,
 @app.post("/report")
 async def report(req: LocationRequest):
     """
-    Async endpoint — runs the blocking PDF generation in a thread executor.
-    Keeps the FastAPI event loop free to answer Render health checks (HEAD /)
-    during the ~60-90s it takes to generate all analysis images.
+    Async endpoint — assembles the PDF on a worker thread while its panels
+    run on ANALYSIS_EXECUTOR. Keeps the FastAPI event loop free to answer
+    Render health checks (HEAD /) during the ~60-90s it takes to generate
+    all analysis images. A full executor queue answers 503 up front.
     """
     try:
         dt, v, lon, lat, lot_ids, extents = normalise_request(req)
         logging.info(f"Generating FULL PDF report for {dt} {v}")
-        loop = asyncio.get_event_loop()
-        pdf  = await loop.run_in_executor(
-            None,
-            functools.partial(
-                generate_pdf_report, dt, v, lon, lat, lot_ids, extents
-            )
-        )
+        try:
+            ANALYSIS_EXECUTOR.check()
+            pdf = await asyncio.to_thread(
+                generate_pdf_report, dt, v, lon, lat, lot_ids, extents)
+        except AnalysisQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e),
+                                headers={"Retry-After": str(e.retry_after)})
         return StreamingResponse(pdf, media_type="application/pdf",
             headers={"Content-Disposition": "attachment; filename=site_analysis_report.pdf"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ── Async jobs ────────────────────────────────────────────────
+# POST /jobs returns at once; clients poll GET /jobs/{id} and fetch
+# GET /jobs/{id}/result, so no socket is held open for 60-90s behind the
+# proxy. JOBS_WORKERS bounds how many jobs are in progress; their renders
+# run on ANALYSIS_EXECUTOR and count against the same ANALYSIS_WORKERS limit
+# as the panel endpoints. The handlers are plain `def`: SQLite reads and the
+# result purge on submit run on Starlette's threadpool, not the event loop.
+def _run_job(kind: str, request: dict, progress):
+    req = LocationRequest(**request)
+    if kind == "report":
+        dt, v, lon, lat, lot_ids, extents = normalise_request(req)
+        pdf = generate_pdf_report(dt, v, lon, lat, lot_ids, extents, progress=progress)
+        return pdf.getvalue(), "application/pdf"
+    site, analysis_type, func, args = analysis_task(kind, req)
+    progress(analysis_type, "running")
+    img = ANALYSIS_EXECUTOR.submit(run_analysis, site, analysis_type, func, *args,
+                                   wait=True).result()
+    progress(analysis_type, "done")
+    return img.getvalue(), "image/png"
+
+JOBS = JobManager(
+    JobStore(os.getenv("JOBS_DIR", os.path.join(DATA_DIR, "jobs"))),
+    runner    = _run_job,
+    workers   = int(os.getenv("JOBS_WORKERS", "1")),
+    max_queue = int(os.getenv("JOBS_QUEUE_MAX", "20")),
+    ttl_s     = float(os.getenv("JOBS_TTL_S", "86400")),
+)
+
+def _job_status(job: dict) -> dict:
+    return {
+        "job_id":     job["id"],
+        "kind":       job["kind"],
+        "status":     job["status"],
+        "progress":   job["progress"],
+        "error":      job["error"],
+        "created":    job["created"],
+        "started":    job["started"],
+        "finished":   job["finished"],
+        "result_url": f"/jobs/{job['id']}/result" if job["status"] == "done" else None,
+    }
+
+@app.post("/jobs", status_code=202)
+def create_job(req: JobRequest):
+    kind = req.kind.lower()
+    if kind != "report" and kind not in ANALYSIS_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {req.kind}")
+    try:
+        if kind == "report":
+            normalise_request(req)
+        else:
+            analysis_task(kind, req)      # reject bad options before queueing
+        job_id = JOBS.submit(kind, req.model_dump(exclude={"kind"}))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job_id, "status": "queued",
+            "status_url": f"/jobs/{job_id}", "result_url": f"/jobs/{job_id}/result"}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(job)
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"] or "Job failed")
+    if job["status"] != "done" or not job["result_path"] or not os.path.exists(job["result_path"]):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    filename = "site_analysis_report.pdf" if job["kind"] == "report" else f"{job['kind']}.png"
+    return FileResponse(job["result_path"], media_type=job["media_type"], filename=filename)
+
+
 # ── Health / root ─────────────────────────────────────────────
 @app.get("/")
-def root():
+async def root():
     return {"status": "Automated Site Analysis API v3.1"}
 
 @app.head("/")
-def root_head():
+async def root_head():
     return _FResponse(status_code=200)
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    return {
+        "status":         "ok",
+        "analysis_queue": ANALYSIS_EXECUTOR.stats(),
+        "render_pool":    RENDER_POOL.stats() if RENDER_POOL is not None else None,
+        "jobs":           JOBS.stats(),
+        "osm_store":      OSM_STORE.stats() if OSM_STORE is not None else None,
+        "graph_store":    {k: s.stats() for k, s in GRAPH_STORES.items()},
+        "graph_cache":    graph_cache_stats(),
+    }
 
 @app.head("/health")
-def health_head():
+async def health_head():
     return _FResponse(status_code=200)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "enabled": CACHE_ENABLED,
+        "memory":  RESULT_CACHE.stats(),
+        "disk":    DISK_CACHE.stats() if DISK_CACHE is not None else None,
+        "single_flight": IN_FLIGHT.stats(),
+    }
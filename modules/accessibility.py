@@ -0,0 +1,169 @@
+"""
+modules/accessibility.py
+──────────────────────────────────────────────────────────────────────────────
+Batch station accessibility for POST /accessibility/batch — walking and
+driving minutes from many candidate sites to their nearest MTR stations,
+as numbers only (no maps).
+
+  1. sites are bucketed into grid cells of CELL_M; each cell shares one
+     street graph covering its sites plus the mode's reach
+  2. the cell's stations are snapped to the graph and one multi-source
+     Dijkstra (routing.nearest_sources) labels every node with its k
+     nearest stations
+  3. each site reads its stations off its snapped node
+
+When the offline graph has a precomputed station table (see
+modules/station_table.py) and covers the cell, step 2 is skipped: sites
+only need a small graph to snap to and read their stations from the table.
+
+Walking minutes use the 5 km/h of the walking map; driving minutes are
+site → station travel_time on the directed drive graph (graph_store speeds).
+"""
+
+import logging
+
+import numpy as np
+import osmnx as ox
+
+from osmnx._errors import InsufficientResponseError
+
+from modules.site_bundle import fetch_features
+from modules.graph_store import graph_from_point, add_travel_time, get_store
+from modules.projected import nearest_nodes
+from modules.routing import nearest_sources
+
+log = logging.getLogger(__name__)
+
+WALK_SPEED_KMPH = 5
+CELL_M          = 1500
+SNAP_M          = 300     # graph margin around a cell when using a station table
+
+# network type, edge weight, graph reach beyond the sites (m) — the largest
+# walk_dist / graph_dist the maps use.
+MODES = {
+    "walk":  {"network_type": "walk",  "weight": "length",      "reach_m": 2000},
+    "drive": {"network_type": "drive", "weight": "travel_time", "reach_m": 3000},
+}
+
+_M_PER_DEG = 6371009 * np.pi / 180
+
+
+def group_sites(points, cell_m: float = CELL_M):
+    """Indices of (lon, lat) points bucketed into cell_m grid cells."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return []
+    kx = _M_PER_DEG * np.cos(np.radians(pts[:, 1].mean()))
+    cells = np.column_stack([np.floor(pts[:, 0] * kx / cell_m),
+                             np.floor(pts[:, 1] * _M_PER_DEG / cell_m)])
+    _, inverse = np.unique(cells, axis=0, return_inverse=True)
+    return [np.flatnonzero(inverse.ravel() == g) for g in range(inverse.max() + 1)]
+
+
+def _station_name(row):
+    for col in ("name:en", "name"):
+        v = row.get(col)
+        if isinstance(v, str) and v.strip():
+            return v.strip()
+    return "MTR Station"
+
+
+def _stations(center, dist):
+    """One (name, lon, lat) per station name within dist of center."""
+    try:
+        gdf = fetch_features(center, dist, {"railway": "station"})
+    except InsufficientResponseError:
+        return []
+    cen = gdf.to_crs(3857).geometry.centroid.to_crs(4326)
+    out, seen = [], set()
+    for (_, row), pt in zip(gdf.iterrows(), cen):
+        name = _station_name(row)
+        if name not in seen:
+            seen.add(name)
+            out.append((name, pt.x, pt.y))
+    return out
+
+
+def _minutes(mode, cost, length):
+    return length / (WALK_SPEED_KMPH * 1000 / 60) if mode == "walk" else cost
+
+
+def _station_entry(name, mode, cost, length):
+    return {"name": name, "distance_m": round(float(length)),
+            "minutes": round(float(_minutes(mode, cost, length)), 1)}
+
+
+def _table_group(store, pts, center, half_diag, mode, k, cutoff):
+    """Stations read from the store's precomputed table."""
+    G = graph_from_point(center, dist=half_diag + SNAP_M,
+                         network_type=MODES[mode]["network_type"], simplify=True)
+    site_nodes, snap = nearest_nodes(G, pts[:, 0], pts[:, 1], return_dist=True)
+    near, cost, length = store.stations.lookup(store.positions(site_nodes.astype(np.int64)))
+    names = store.stations.names
+    results = []
+    for row_st, row_cost, row_len in zip(near, cost, length):
+        results.append([_station_entry(names[i], mode, c, ln)
+                        for i, c, ln in zip(row_st[:k], row_cost[:k], row_len[:k])
+                        if i >= 0 and c <= cutoff])
+    return results, snap
+
+
+def _score_group(pts, mode, k, cutoff_min):
+    spec   = MODES[mode]
+    lon0, lat0 = (pts.min(axis=0) + pts.max(axis=0)) / 2
+    half_x = (pts[:, 0].max() - pts[:, 0].min()) / 2 * _M_PER_DEG * np.cos(np.radians(lat0))
+    half_y = (pts[:, 1].max() - pts[:, 1].min()) / 2 * _M_PER_DEG
+    half_diag = float(np.hypot(half_x, half_y))
+    dist      = half_diag + spec["reach_m"]
+    cutoff    = (cutoff_min * WALK_SPEED_KMPH * 1000 / 60 if mode == "walk"
+                 else cutoff_min)
+
+    store = get_store(spec["network_type"])
+    if (store is not None and store.stations is not None and store.stations.k >= k
+            and store.covers(ox.utils_geo.bbox_from_point((lat0, lon0), half_diag + SNAP_M))):
+        return _table_group(store, pts, (lat0, lon0), half_diag, mode, k, cutoff)
+
+    G = graph_from_point((lat0, lon0), dist=dist,
+                         network_type=spec["network_type"], simplify=True)
+    if mode == "drive":
+        add_travel_time(G)
+    stations = _stations((lat0, lon0), dist)
+    if not stations:
+        return [[] for _ in pts], np.full(len(pts), np.nan)
+
+    st_nodes = nearest_nodes(G, [s[1] for s in stations], [s[2] for s in stations])
+    sources  = {}
+    for i, node in enumerate(st_nodes):
+        sources.setdefault(node, []).append(i)
+
+    # Drive costs run site → station, i.e. backwards from the stations.
+    labels = nearest_sources(G, sources, k=k, weight=spec["weight"],
+                             cutoff=cutoff, reverse=(mode == "drive"))
+
+    site_nodes, snap = nearest_nodes(G, pts[:, 0], pts[:, 1], return_dist=True)
+    results = []
+    for node in site_nodes:
+        results.append([_station_entry(stations[i][0], mode, cost, length)
+                        for cost, length, i in labels.get(node, [])])
+    return results, snap
+
+
+def score_sites(points, mode: str = "walk", k: int = 3, max_minutes: float = 15):
+    """
+    points: [(lon, lat), ...]. Returns one dict per point with its k nearest
+    stations within max_minutes and how far the point is from the graph.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    out = [None] * len(pts)
+    for idx in group_sites(pts):
+        try:
+            near, snap = _score_group(pts[idx], mode, k, max_minutes)
+        except Exception as e:
+            log.warning(f"accessibility: {mode} group of {len(idx)} failed: {e}")
+            for i in idx:
+                out[i] = {"error": str(e)}
+            continue
+        for j, i in enumerate(idx):
+            out[i] = {"stations": near[j],
+                      "snap_m": None if np.isnan(snap[j]) else round(float(snap[j]), 1)}
+    return out
@@ -0,0 +1,471 @@
+"""
+modules/cache.py
+──────────────────────────────────────────────────────────────────────────────
+Result caches for rendered analysis outputs (PNG / PDF bytes).
+
+ResultCache bounds what the API keeps in RAM:
+  • global byte budget with LRU eviction
+  • optional TTL — stale entries are dropped on access
+  • per-analysis quotas (e.g. "view" PNGs at dpi=200 are several MB each),
+    keyed by the analysis group — the part of analysis_type before the
+    first "_" ("walking_15" → "walking")
+  • hit / miss / eviction / expiry counters for /cache/stats
+
+Entries are stored as immutable bytes and every hit returns a fresh BytesIO,
+so two concurrent responses never share a read position.
+
+DiskCache is the second tier, shared by every uvicorn worker and surviving
+restarts:
+  • content-addressed files  <root>/<key[:2]>/<key>.bin  + <key>.json metadata
+  • atomic writes (temp file in the same directory → os.replace)
+  • per-key advisory file locks so concurrent workers compute a result once
+  • size-capped sweep that deletes least-recently-read files first
+
+canonical_request / fingerprint build the cache key from everything that
+changes the rendered output: rounded coordinates, sorted lot ids, normalised
+extents, analysis parameters and the analysis module version.
+
+SingleFlight coalesces identical in-flight computations inside one process:
+the first caller for a key runs the work, later callers block on the same
+Future and receive the same result (or exception).
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from io import BytesIO
+
+try:
+    import fcntl
+except ImportError:          # non-POSIX dev machines: locking becomes a no-op
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+def analysis_group(analysis_type: str) -> str:
+    """"walking_15" → "walking", "context_600" → "context", "view" → "view"."""
+    return str(analysis_type).split("_", 1)[0].lower()
+
+
+def parse_quotas(spec: str) -> dict:
+    """Parse "view=32,noise=16" (MB) into {"view": bytes, "noise": bytes}."""
+    quotas = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, mb = part.split("=", 1)
+        try:
+            quotas[name.strip().lower()] = int(float(mb) * 1024 * 1024)
+        except ValueError:
+            log.warning("cache: ignoring bad quota '%s'", part)
+    return quotas
+
+
+# ── Request fingerprint ───────────────────────────────────────
+COORD_DECIMALS  = 6     # ~0.1 m in WGS84
+EXTENT_DECIMALS = 1     # EPSG:2326 metres
+
+
+def _round_or_none(v, nd):
+    if v is None:
+        return None
+    try:
+        return round(float(v), nd)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalise_extents(extents):
+    out = []
+    for ext in extents or []:
+        if not ext:
+            continue
+        box = [_round_or_none(ext.get(k), EXTENT_DECIMALS)
+               for k in ("xmin", "ymin", "xmax", "ymax")]
+        if any(v is not None for v in box):
+            out.append(box)
+    return sorted(out, key=lambda b: [(v is None, v or 0) for v in b])
+
+
+def canonical_request(data_type, value, analysis_type,
+                      lon=None, lat=None, lot_ids=None, extents=None,
+                      params=None, version=None) -> dict:
+    """Canonical, JSON-serialisable description of one analysis request."""
+    return {
+        "data_type":     str(data_type).upper().strip(),
+        "value":         " ".join(str(value).split()),
+        "analysis_type": str(analysis_type),
+        "lon":           _round_or_none(lon, COORD_DECIMALS),
+        "lat":           _round_or_none(lat, COORD_DECIMALS),
+        "lot_ids":       sorted({str(i).strip() for i in (lot_ids or []) if str(i).strip()}),
+        "extents":       _normalise_extents(extents),
+        "params":        {k: params[k] for k in sorted(params or {})},
+        "version":       version,
+    }
+
+
+def fingerprint(canonical: dict) -> str:
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, ttl_s: float = None, quotas: dict = None):
+        self.max_bytes = int(max_bytes)
+        self.ttl_s     = float(ttl_s) if ttl_s else None
+        self.quotas    = dict(quotas or {})
+
+        self._entries     = OrderedDict()   # key -> (data, group, stored_at)
+        self._bytes       = 0
+        self._group_bytes = {}
+        self._lock        = threading.Lock()
+
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    # ── Internals (call with self._lock held) ─────────────────
+    def _drop(self, key):
+        data, group, _ = self._entries.pop(key)
+        self._bytes -= len(data)
+        self._group_bytes[group] = self._group_bytes.get(group, 0) - len(data)
+
+    def _evict_lru(self, group=None):
+        for key, (_, g, _) in self._entries.items():
+            if group is None or g == group:
+                self._drop(key)
+                self.evictions += 1
+                return True
+        return False
+
+    def _expired(self, stored_at):
+        return self.ttl_s is not None and time.time() - stored_at > self.ttl_s
+
+    # ── Public API ────────────────────────────────────────────
+    def get(self, key, count_miss: bool = True):
+        """
+        Return a fresh BytesIO for key, or None on miss/expiry.
+        count_miss=False lets a fast-path probe skip the miss counter when
+        the caller will look the key up again before computing it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += count_miss
+                return None
+            data, _, stored_at = entry
+            if self._expired(stored_at):
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return BytesIO(data)
+
+    def put(self, key, value, analysis_type: str):
+        """Store a BytesIO / bytes result. Oversized results are not cached."""
+        data  = value.getvalue() if isinstance(value, BytesIO) else bytes(value)
+        group = analysis_group(analysis_type)
+        size  = len(data)
+        quota = self.quotas.get(group)
+
+        if size > self.max_bytes or (quota is not None and size > quota):
+            log.info(f"cache: {analysis_type} result ({size/1e6:.1f} MB) "
+                     f"exceeds budget — not cached")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if quota is not None:
+                while self._group_bytes.get(group, 0) + size > quota:
+                    if not self._evict_lru(group):
+                        break
+            while self._bytes + size > self.max_bytes:
+                if not self._evict_lru():
+                    break
+            self._entries[key] = (data, group, time.time())
+            self._bytes += size
+            self._group_bytes[group] = self._group_bytes.get(group, 0) + size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._group_bytes = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":     len(self._entries),
+                "bytes":       self._bytes,
+                "max_bytes":   self.max_bytes,
+                "ttl_s":       self.ttl_s,
+                "hits":        self.hits,
+                "misses":      self.misses,
+                "hit_rate":    round(self.hits / lookups, 3) if lookups else None,
+                "evictions":   self.evictions,
+                "expirations": self.expirations,
+                "groups": {
+                    g: {"bytes": b, "quota": self.quotas.get(g)}
+                    for g, b in sorted(self._group_bytes.items()) if b > 0
+                },
+            }
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}               # key -> Future
+        self._lock  = threading.Lock()
+        self.leaders = self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once per key at a time; concurrent callers share the outcome."""
+        with self._lock:
+            fut    = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._calls[key] = fut
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight(),
+                "leaders": self.leaders, "shared": self.shared}
+
+
+class DiskCache:
+    SWEEP_INTERVAL_S = 60
+
+    def __init__(self, root: str, max_bytes: int, lock_timeout_s: float = 180):
+        self.root           = root
+        self.max_bytes      = int(max_bytes)
+        self.lock_timeout_s = float(lock_timeout_s)
+        self._last_sweep    = 0.0
+        self._sweep_lock    = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        self.hits = self.misses = self.writes = self.evictions = 0
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    # ── Read / write ──────────────────────────────────────────
+    def get(self, key):
+        """Return a BytesIO for key, or None. Reading refreshes the file's mtime."""
+        path = self._path(key, "bin")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return BytesIO(data)
+
+    def put(self, key, value, meta: dict = None):
+        data = value.getvalue() if isinstance(value, BytesIO) else bytes(value)
+        if len(data) > self.max_bytes:
+            return
+        meta = dict(meta or {}, key=key, size=len(data), stored_at=time.time())
+        try:
+            os.makedirs(os.path.dirname(self._path(key, "bin")), exist_ok=True)
+            self._atomic_write(self._path(key, "json"),
+                               json.dumps(meta, default=str).encode())
+            self._atomic_write(self._path(key, "bin"), data)
+            self.writes += 1
+        except OSError as e:
+            log.warning(f"disk cache: write failed for {key}: {e}")
+            return
+        self._maybe_sweep()
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key, "bin"))
+
+    def meta(self, key):
+        try:
+            with open(self._path(key, "json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _atomic_write(path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    # ── Cross-process locking ─────────────────────────────────
+    @contextmanager
+    def lock(self, key):
+        """
+        Exclusive advisory lock on key, shared across worker processes.
+        Gives up after lock_timeout_s so a crashed holder cannot wedge a
+        request forever — the caller then simply computes the result itself.
+        """
+        if fcntl is None:
+            yield True
+            return
+        path = self._path(key, "lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fh = open(path, "a+")
+        acquired = False
+        try:
+            deadline = time.time() + self.lock_timeout_s
+            while True:
+                try:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if time.time() >= deadline:
+                        log.warning(f"disk cache: lock wait for {key} timed out")
+                        break
+                    time.sleep(0.25)
+                    continue
+                if self._same_file(fh, path):
+                    acquired = True
+                    break
+                # sweep() unlinked the file between our open and flock —
+                # a lock on the orphaned inode excludes nobody, so reopen
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+                fh.close()
+                fh = open(path, "a+")
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            fh.close()
+
+    @staticmethod
+    def _same_file(fh, path):
+        try:
+            return os.path.samestat(os.fstat(fh.fileno()), os.stat(path))
+        except OSError:
+            return False
+
+    def _unlink_lock(self, path):
+        """
+        Remove a lock file only while holding it, so no worker is inside the
+        lock; lock() re-checks the path after flock, so anyone who opened the
+        file before the unlink retries on a fresh one.
+        """
+        if fcntl is None:
+            return
+        try:
+            fh = open(path, "r")
+        except OSError:
+            return
+        try:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return                # held — leave it to its owner
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            fh.close()
+
+    # ── Size-capped sweep ─────────────────────────────────────
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_INTERVAL_S:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.sweep()
+        finally:
+            self._sweep_lock.release()
+
+    def _scan(self):
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for n in names:
+                if n.endswith(".bin"):
+                    p = os.path.join(dirpath, n)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, p))
+        return files
+
+    def sweep(self):
+        """Delete least-recently-read entries until usage is below 90% of the cap."""
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+        target  = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            for p in (path, path[:-4] + ".json"):
+                try:
+                    os.unlink(p)
+                except OSError:
+                    pass
+            self._unlink_lock(path[:-4] + ".lock")
+            total   -= size
+            removed += 1
+        self.evictions += removed
+        log.info(f"disk cache: swept {removed} entries, {total/1e6:.1f} MB left")
+        return removed
+
+    def stats(self) -> dict:
+        files = self._scan()
+        return {
+            "root":      self.root,
+            "entries":   len(files),
+            "bytes":     sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "writes":    self.writes,
+            "evictions": self.evictions,
+        }
@@ -26,7 +26,7 @@ from shapely.geometry import Point, box as sbox
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from PIL import Image
 
-from modules.resolver import resolve_location, get_lot_boundary
+from modules.site_bundle import site_location, lot_boundary, features_from_point
 
 log = logging.getLogger(__name__)
 
@@ -134,9 +134,9 @@ def _empty_gdf():
     return gpd.GeoDataFrame(geometry=[], crs=3857)
 
 
-def _safe_osm(lat, lon, dist, tags, label=""):
+def _safe_osm(lat, lon, dist, tags, label="", bundle=None):
     try:
-        gdf = ox.features_from_point((lat, lon), dist=dist, tags=tags).to_crs(3857)
+        gdf = features_from_point(bundle, (lat, lon), dist, tags).to_crs(3857)
         gc.collect()
         log.info("context: OSM [%s] → %d rows", label, len(gdf))
         return gdf
@@ -192,12 +192,20 @@ def _spread_bus_stops(gdf, site_pt, n_total=10, min_dist_m=150):
     return gpd.GeoDataFrame(selected, crs=gdf.crs).reset_index(drop=True)
 
 
+def osm_layers(data_type, radius_m=None):
+    """(tags, dist) pairs generate_context fetches — see SiteBundle.reserve.
+    Label rules depend on the zone, so they are not declared."""
+    scope_r = int(radius_m) if radius_m is not None else MAP_HALF_SIZE
+    return [({"railway": "station"}, scope_r),
+            ({"highway": "bus_stop"}, scope_r)]
+
+
 # ── Main ──────────────────────────────────────────────────────────────────────
 
 def generate_context(
     data_type, value, zone_data,
     radius_m=None, lon=None, lat=None,
-    lot_ids=None, extents=None,
+    lot_ids=None, extents=None, bundle=None,
 ):
     lot_ids = lot_ids or []
     extents = extents or []
@@ -208,7 +216,7 @@ def generate_context(
     scope_r = int(radius_m) if radius_m is not None else MAP_HALF_SIZE
 
     # 1. Resolve
-    lon, lat = resolve_location(data_type, value, lon, lat, lot_ids, extents)
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
     log.info("context: resolved %.6f, %.6f", lon, lat)
     site_pt = gpd.GeoSeries([Point(lon, lat)], crs=4326).to_crs(3857).iloc[0]
 
@@ -245,6 +253,7 @@ def generate_context(
             "amenity": ["school", "college", "university"],
         },
         "landuse",
+        bundle=bundle,
     )
     polys = _clip_to_map(polys_raw, xmin, ymin, xmax, ymax)
     del polys_raw; gc.collect()
@@ -262,8 +271,8 @@ def generate_context(
         residential = industrial = parks = schools = _empty_gdf()
 
     # 4. Site footprint
-    lot_gdf   = get_lot_boundary(lon, lat, data_type,
-                                 extents if len(extents) > 1 else None)
+    lot_gdf   = lot_boundary(bundle, lon, lat, data_type,
+                             extents if len(extents) > 1 else None)
     site_geom = (lot_gdf.geometry.iloc[0]
                  if lot_gdf is not None and not lot_gdf.empty
                  else site_pt.buffer(80))
@@ -271,7 +280,8 @@ def generate_context(
 
     # 5. MTR stations
     log.info("context: fetching stations")
-    stations = _safe_osm(lat, lon, scope_r, {"railway": "station"}, "stations")
+    stations = _safe_osm(lat, lon, scope_r, {"railway": "station"}, "stations",
+                         bundle=bundle)
     if not stations.empty:
         ne = stations.get("name:en")
         nz = stations.get("name")
@@ -289,14 +299,16 @@ def generate_context(
 
     # 6. Bus stops
     log.info("context: fetching bus stops")
-    bus_raw   = _safe_osm(lat, lon, scope_r, {"highway": "bus_stop"}, "bus_stops")
+    bus_raw   = _safe_osm(lat, lon, scope_r, {"highway": "bus_stop"}, "bus_stops",
+                         bundle=bundle)
     bus_stops = _spread_bus_stops(bus_raw, site_pt, BUS_COUNT, min_dist_m=150)
     del bus_raw; gc.collect()
     log.info("context: %d bus stops selected", len(bus_stops))
 
     # 7. Labels
     log.info("context: fetching labels")
-    labels = _safe_osm(lat, lon, scope_r, _label_rules(s_type), "labels")
+    labels = _safe_osm(lat, lon, scope_r, _label_rules(s_type), "labels",
+                      bundle=bundle)
     if not labels.empty:
         ne = labels.get("name:en")
         nz = labels.get("name")
@@ -11,14 +11,17 @@ import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 import matplotlib.lines as mlines
 import matplotlib.patches as mpatches
-import networkx as nx
 import numpy as np
 
-from shapely.geometry import Point, LineString, MultiLineString
+from shapely.geometry import Point
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from io import BytesIO
 
-from modules.resolver import resolve_location, get_lot_boundary
+from modules.site_bundle import site_location, lot_boundary, features_from_point
+from modules.graph_store import graph_from_point, add_travel_time
+from modules.projected import projected, nearest_nodes
+from modules.routing import PathTree, route_array, route_overlap
+from modules.isochrone import isochrones, node_costs
 from modules.ring_configs import DRIVE_RING_CONFIGS as RING_CONFIGS
 
 ox.settings.use_cache   = True
@@ -27,7 +30,8 @@ ox.settings.log_console = False
 os.environ.setdefault("OMP_NUM_THREADS", "1")
 os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
 
-DRIVE_SPEED = 35  # km/h
+DRIVE_SPEED  = 35  # km/h — ring radius → minutes when a graph has no travel times
+ISO_BUFFER_M = 40  # half-width of the road corridor in isochrone polygons
 
 INGRESS_COLOR = "#e74c3c"
 EGRESS_COLOR  = "#27ae60"
@@ -50,91 +54,31 @@ def _add_mtr_icon(ax, x, y, size=0.035, zorder=15):
 
 
 # ── Arrow: one clean annotate arrow per route ─────────────────
-def _add_route_arrow(ax, gdf_route, color, position=1.0, zorder=20):
+def _add_route_arrow(ax, route, color, position=1.0, zorder=20):
     """
-    Draw a single directional arrow along the full route geometry.
+    Draw a single directional arrow along a Route (modules/routing.py).
 
-    The arrow is placed at a distance `position` * total_length
-    along the route, where `position` is in [0, 1].
+    The arrow head sits at `position` * total length along the route,
+    `position` in [0, 1]; the tail is 15% of the same segment behind it
+    (ahead of it at the very start).
     """
-    if gdf_route is None or gdf_route.empty:
+    if route is None or route.length == 0:
         return
 
-    # Flatten all line geometries into one ordered coordinate list
-    coords: list[tuple[float, float]] = []
-    for geom in gdf_route.geometry:
-        parts = list(geom.geoms) if isinstance(geom, MultiLineString) else [geom]
-        for p in parts:
-            if isinstance(p, LineString):
-                pts = list(p.coords)
-                if not coords:
-                    coords.extend(pts)
-                else:
-                    # Avoid duplicating the connecting point
-                    if pts and pts[0] == coords[-1]:
-                        coords.extend(pts[1:])
-                    else:
-                        coords.extend(pts)
-
-    if len(coords) < 2:
+    pos    = max(0.0, min(1.0, float(position)))
+    target = pos * route.length
+    i      = route.segment_at(target)
+    (x0, y0), (x1, y1) = route.xy[i], route.xy[i + 1]
+    seg_len = route.cum[i + 1] - route.cum[i]
+    if seg_len == 0:
         return
 
-    # Compute segment lengths and total length
-    seg_lengths = []
-    for (x0, y0), (x1, y1) in zip(coords[:-1], coords[1:]):
-        seg_lengths.append(math.hypot(x1 - x0, y1 - y0))
-
-    total_length = sum(seg_lengths)
-    if total_length == 0:
-        return
-
-    # Clamp position into [0, 1]
-    pos = max(0.0, min(1.0, float(position)))
-    target_dist = pos * total_length
-
-    # Special cases: exactly at start or end of the route
-    if pos <= 0.0:
-        (x0, y0) = coords[0]
-        (x1, y1) = coords[1]
-        head_x, head_y = x0, y0
-        # Tail a bit forward along first segment
-        back_t = 0.15
-        tail_x = x0 + back_t * (x1 - x0)
-        tail_y = y0 + back_t * (y1 - y0)
-    elif pos >= 1.0:
-        (x0, y0) = coords[-2]
-        (x1, y1) = coords[-1]
-        head_x, head_y = x1, y1
-        # Tail a bit back along last segment
-        back_t = 0.15
-        tail_x = x1 - back_t * (x1 - x0)
-        tail_y = y1 - back_t * (y1 - y0)
-    else:
-        # Find the segment where target_dist falls
-        dist_so_far = 0.0
-        seg_index = 0
-        for i, seg_len in enumerate(seg_lengths):
-            if dist_so_far + seg_len >= target_dist:
-                seg_index = i
-                break
-            dist_so_far += seg_len
-
-        (x0, y0) = coords[seg_index]
-        (x1, y1) = coords[seg_index + 1]
-        seg_len = seg_lengths[seg_index]
-        if seg_len == 0:
-            return
-
-        # Local fraction along this segment
-        local_t = (target_dist - dist_so_far) / seg_len
-        # Arrow head at this point
-        head_x = x0 + local_t * (x1 - x0)
-        head_y = y0 + local_t * (y1 - y0)
-
-        # Tail slightly before the head along the same segment
-        back_t = max(0.0, local_t - 0.15)
-        tail_x = x0 + back_t * (x1 - x0)
-        tail_y = y0 + back_t * (y1 - y0)
+    local_t = (target - route.cum[i]) / seg_len
+    head_x  = x0 + local_t * (x1 - x0)
+    head_y  = y0 + local_t * (y1 - y0)
+    back_t  = 0.15 if pos <= 0.0 else max(0.0, local_t - 0.15)
+    tail_x  = x0 + back_t * (x1 - x0)
+    tail_y  = y0 + back_t * (y1 - y0)
 
     if head_x == tail_x and head_y == tail_y:
         return
@@ -211,13 +155,29 @@ def _north_arrow(ax, xlim, ylim, extent):
             color="black", ha="center", va="center", zorder=25)
 
 
-# ── Main generator ────────────────────────────────────────────
-def generate_driving(data_type: str, value: str,
-                     zone_data: gpd.GeoDataFrame = None,
-                     lon: float = None, lat: float = None,
-                     lot_ids: list = None, extents: list = None,
-                     max_drive_minutes: int = 15):
+def network_speed(G):
+    """
+    Mean speed (km/h) of a drive graph under its own edge speeds: total
+    length over total travel_time, i.e. the length-weighted harmonic mean
+    of the per-class / maxspeed speeds graph_store assigned.
+    """
+    length = minutes = 0.0
+    for _, _, data in G.edges(data=True):
+        t = data.get("travel_time")
+        if t is not None:
+            length  += float(data.get("length", 0.0))
+            minutes += float(t)
+    return length / 1000 / (minutes / 60) if minutes > 0 else DRIVE_SPEED
+
+
+def ring_minutes(ring_r, speed=DRIVE_SPEED):
+    """Drive time (minutes) that matches a configured ring radius at speed
+    (km/h) — pass network_speed(G) so rings follow the edge speeds."""
+    return ring_r / (speed * 1000 / 60)
 
+
+# ── Main generator ────────────────────────────────────────────
+def _ring_config(max_drive_minutes):
     try:
         max_drive_minutes = int(max_drive_minutes)
     except (TypeError, ValueError):
@@ -225,16 +185,25 @@ def generate_driving(data_type: str, value: str,
     max_drive_minutes = max(5, min(20, max_drive_minutes))
     if max_drive_minutes not in RING_CONFIGS:
         max_drive_minutes = 15
-    cfg        = RING_CONFIGS[max_drive_minutes]
-    MAP_EXTENT = cfg["map_extent"]
-    MAP_EXTENT_X = MAP_EXTENT * (992 / 737)
-    MAP_EXTENT_Y = MAP_EXTENT                         
-    lon, lat = resolve_location(data_type, value, lon, lat, lot_ids, extents)
+    return RING_CONFIGS[max_drive_minutes]
+
+
+def _station_fetch_r(cfg):
+    return max(cfg["max_radius"] * 2, 1500)
 
+
+def osm_layers(data_type: str, max_drive_minutes: int = 15):
+    """(tags, dist) pairs generate_driving fetches — see SiteBundle.reserve.
+    The building fallback only runs when there is no lot boundary."""
+    cfg = _ring_config(max_drive_minutes)
+    return [({"railway": "station"}, _station_fetch_r(cfg))]
+
+
+def _site_polygon(bundle, data_type, lon, lat, zone_data):
+    """The site polygon the map draws → (site_poly, site_gdf)."""
     site_pt_3857 = gpd.GeoSeries([Point(lon, lat)], crs=4326).to_crs(3857).iloc[0]
 
-    # ── Site polygon ──────────────────────────────────────────
-    lot_gdf = get_lot_boundary(lon, lat, data_type)
+    lot_gdf = lot_boundary(bundle, lon, lat, data_type)
     if lot_gdf is not None:
         site_poly = lot_gdf.geometry.iloc[0]
         site_gdf  = lot_gdf
@@ -253,8 +222,8 @@ def generate_driving(data_type: str, value: str,
         if site_poly is None:
             for dist in [80, 150, 250]:   # expand search radius progressively
                 try:
-                    osm = ox.features_from_point(
-                        (lat, lon), dist=dist, tags={"building": True}
+                    osm = features_from_point(
+                        bundle, (lat, lon), dist, {"building": True}
                     ).to_crs(3857)
                     if len(osm):
                         osm["_a"] = osm.geometry.area
@@ -270,8 +239,8 @@ def generate_driving(data_type: str, value: str,
         if site_poly is None:
             for tags in [{"landuse": True}, {"amenity": True}]:
                 try:
-                    osm = ox.features_from_point(
-                        (lat, lon), dist=100, tags=tags
+                    osm = features_from_point(
+                        bundle, (lat, lon), 100, tags
                     ).to_crs(3857)
                     polys = osm[osm.geometry.geom_type.isin(["Polygon","MultiPolygon"])]
                     if len(polys):
@@ -287,36 +256,103 @@ def generate_driving(data_type: str, value: str,
             site_poly = site_pt_3857.buffer(80)   # 80m visible circle
 
         site_gdf = gpd.GeoDataFrame(geometry=[site_poly], crs=3857)
+    return site_poly, site_gdf
+
+
+def _bands(G, costs, cfg, centroid, speed):
+    """Drive-time isochrone per ring radius (minutes at speed km/h); the
+    configured circle around the site centroid where the graph gives no
+    usable polygon."""
+    ring_rs = [r for r, _ in cfg["rings"]]
+    try:
+        polys = isochrones(G, costs, [ring_minutes(r, speed) for r in ring_rs],
+                           weight="travel_time", buffer_m=ISO_BUFFER_M)
+    except Exception:
+        polys = [None] * len(ring_rs)
+    # isochrones() returns polygons in ascending cutoff order
+    polys = dict(zip(sorted(ring_rs), polys))
+    return {r: poly if poly is not None and not poly.is_empty else centroid.buffer(r)
+            for r, poly in polys.items()}
+
+
+def isochrone_bands(data_type: str, value: str,
+                    zone_data: gpd.GeoDataFrame = None,
+                    lon: float = None, lat: float = None,
+                    lot_ids: list = None, extents: list = None,
+                    max_drive_minutes: int = 15, bundle=None):
+    """The isochrone polygons generate_driving draws for this site →
+    (EPSG:3857 polygons, band properties), smallest band first."""
+    cfg = _ring_config(max_drive_minutes)
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
+    site_poly, _ = _site_polygon(bundle, data_type, lon, lat, zone_data)
+    G = add_travel_time(graph_from_point((lat, lon), dist=cfg["graph_dist"],
+                                         network_type="drive", simplify=True))
+    source = nearest_nodes(G, lon, lat)
+    rings  = sorted(cfg["rings"])
+    speed  = network_speed(G)
+    costs  = node_costs(G, source, ring_minutes(rings[-1][0], speed),
+                        weight="travel_time")
+    bands  = _bands(G, costs, cfg, site_poly.centroid, speed)
+    props  = [{"distance_m": r,
+               "minutes":    round(ring_minutes(r, speed), 1),
+               "speed_kmh":  round(speed, 1),
+               "label":      lbl.replace("\n", " ")} for r, lbl in rings]
+    return [bands[r] for r, _ in rings], props
+
+
+def generate_driving(data_type: str, value: str,
+                     zone_data: gpd.GeoDataFrame = None,
+                     lon: float = None, lat: float = None,
+                     lot_ids: list = None, extents: list = None,
+                     max_drive_minutes: int = 15, bundle=None):
+
+    cfg        = _ring_config(max_drive_minutes)
+    MAP_EXTENT = cfg["map_extent"]
+    MAP_EXTENT_X = MAP_EXTENT * (992 / 737)
+    MAP_EXTENT_Y = MAP_EXTENT                         
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
 
+    # ── Site polygon ──────────────────────────────────────────
+    site_poly, site_gdf = _site_polygon(bundle, data_type, lon, lat, zone_data)
     centroid       = site_poly.centroid
     cx_val, cy_val = centroid.x, centroid.y
 
     gc.collect()
 
     # ── Drive network ─────────────────────────────────────────
-    G = ox.graph_from_point((lat, lon), dist=cfg["graph_dist"],
-                            network_type="drive", simplify=True)
-    for u, v, k, data in G.edges(keys=True, data=True):
-        data["travel_time"] = data["length"] / (DRIVE_SPEED * 1000 / 60)
-    site_node = ox.distance.nearest_nodes(G, lon, lat)
+    G = graph_from_point((lat, lon), dist=cfg["graph_dist"],
+                         network_type="drive", simplify=True)
+    add_travel_time(G)
+    site_node = nearest_nodes(G, lon, lat)
+    speed     = network_speed(G)     # ring radius → minutes on these edges
 
     # ── Stations ──────────────────────────────────────────────
-    stations = ox.features_from_point(
-        (lat, lon), tags={"railway": "station"},
-        dist=max(cfg["max_radius"] * 2, 1500)
+    stations = features_from_point(
+        bundle, (lat, lon), _station_fetch_r(cfg), {"railway": "station"}
     ).to_crs(3857)
     stations["dist"] = stations.centroid.distance(centroid)
     # Keep up to 3 nearest stations, but only within the largest ring radius
     stations = stations.sort_values("dist")
     stations = stations[stations["dist"] <= cfg["max_radius"]].head(3)
+    if len(stations):
+        st_cen   = stations.geometry.centroid
+        stations = stations.assign(
+            node=nearest_nodes(G, st_cen.x.values, st_cen.y.values, crs=3857))
 
-    def _route(nf, nt):
+    # Two shortest-path trees cover every station: site → all (egress) and,
+    # on the reversed one-way network, all → site (ingress).
+    egress_tree  = PathTree(G, site_node, weight="travel_time")
+    ingress_tree = PathTree(G, site_node, weight="travel_time", reverse=True)
+
+    def _route(tree, st_node):
         try:
-            path = nx.shortest_path(G, nf, nt, weight="travel_time")
-            return ox.routing.route_to_gdf(G, path).to_crs(3857)
+            return route_array(G, tree.path(st_node), weight="travel_time")
         except Exception:
             return None
 
+    # Drive-time isochrones for the configured rings.
+    bands = _bands(G, egress_tree.dist, cfg, centroid, speed)
+
     gc.collect()
 
     # ── Figure ────────────────────────────────────────────────
@@ -330,18 +366,19 @@ def generate_driving(data_type: str, value: str,
     cx.add_basemap(ax, source=cx.providers.CartoDB.PositronNoLabels,
                    zoom=zoom, alpha=1)
 
-    ox.graph_to_gdfs(G, nodes=False).to_crs(3857).plot(
+    gpd.GeoSeries(projected(G).lines, crs=3857).plot(
         ax=ax, linewidth=0.3, color="#8a8a8a", alpha=0.35, zorder=1)
 
-    # Yellow rings
+    # Yellow rings — drive-time isochrones (circles if none could be built)
     max_r = cfg["rings"][-1][0]
-    gpd.GeoSeries([centroid.buffer(max_r)], crs=3857).plot(
+    gpd.GeoSeries([bands[max_r]], crs=3857).plot(
         ax=ax, color="#FFD700", alpha=0.18, zorder=2)
     for ring_r, ring_lbl in cfg["rings"]:
-        gpd.GeoSeries([centroid.buffer(ring_r)], crs=3857).boundary.plot(
+        ring = bands[ring_r]
+        gpd.GeoSeries([ring], crs=3857).boundary.plot(
             ax=ax, color="#e6b800", linewidth=2,
             linestyle=(0, (4, 3)), zorder=5)
-        ax.text(cx_val + ring_r + 30, cy_val,
+        ax.text(ring.bounds[2] + 30, cy_val,
                 ring_lbl, fontsize=10, color="black", weight="bold",
                 ha="left", va="center", zorder=10, clip_on=False)
 
@@ -350,41 +387,50 @@ def generate_driving(data_type: str, value: str,
 
     for _, station in stations.iterrows():
         st_cen  = station.geometry.centroid
-        st_wgs  = gpd.GeoSeries([st_cen], crs=3857).to_crs(4326).iloc[0]
-        st_node = ox.distance.nearest_nodes(G, st_wgs.x, st_wgs.y)
+        st_node = station["node"]
         st_name = _safe_name(station)
 
-        egress_gdf  = _route(site_node, st_node)
-        ingress_gdf = _route(st_node,   site_node)
-
-        # If ingress and egress share the same geometry, draw one centreline
-        # but keep both directional arrows so overlap is still clear.
-        overlap = False
-        if egress_gdf is not None and ingress_gdf is not None:
-            if len(egress_gdf) == len(ingress_gdf):
-                overlap = all(
-                    e.equals(i) for e, i in zip(egress_gdf.geometry, ingress_gdf.geometry)
-                )
-
-        if overlap:
-            # Single centreline (use ingress style), arrows for both directions.
-            # Egress arrow near the station end (position ~0.9),
-            # ingress arrow exactly at the site end (position = 1.0).
-            ingress_gdf.plot(ax=ax, linewidth=3.5, color=INGRESS_COLOR,
+        egress  = _route(egress_tree,  st_node)
+        ingress = _route(ingress_tree, st_node)
+
+        # Streets used both ways (compared by node ids) are drawn once as a
+        # single centreline in ingress style; both directional arrows stay
+        # on so the overlap is still clear. Egress arrow near the station
+        # end (position ~0.9), ingress arrow exactly at the site end (1.0).
+        if egress is not None and ingress is not None:
+            ov = route_overlap(egress.nodes, ingress.nodes)
+            ne, ni = len(egress.nodes), len(ingress.nodes)
+            if ov["same"]:
+                ingress.plot(ax, linewidth=3.5, color=INGRESS_COLOR,
                              alpha=0.92, zorder=8)
-            _add_route_arrow(ax, egress_gdf,  EGRESS_COLOR,  position=0.9, zorder=20)
-            _add_route_arrow(ax, ingress_gdf, INGRESS_COLOR, position=1.0, zorder=21)
+            else:
+                shared = [egress.section(0, ov["site"] - 1),
+                          egress.section(ne - ov["station"], ne - 1)]
+                for part in shared:
+                    if part is not None:
+                        part.plot(ax, linewidth=3.5, color=INGRESS_COLOR,
+                                  alpha=0.92, zorder=8)
+                own_e = egress.section(ov["site"] - 1, ne - ov["station"])
+                own_i = ingress.section(ov["station"] - 1, ni - ov["site"])
+                if own_e is not None:
+                    own_e.plot(ax, linewidth=3.5, color=EGRESS_COLOR,
+                               alpha=0.92, zorder=8)
+                if own_i is not None:
+                    own_i.plot(ax, linewidth=3.5, color=INGRESS_COLOR,
+                               alpha=0.92, zorder=9)
+            _add_route_arrow(ax, egress,  EGRESS_COLOR,  position=0.9, zorder=20)
+            _add_route_arrow(ax, ingress, INGRESS_COLOR, position=1.0, zorder=21)
         else:
-            if egress_gdf is not None:
-                egress_gdf.plot(ax=ax, linewidth=3.5, color=EGRESS_COLOR,
-                                alpha=0.92, zorder=8)
-                _add_route_arrow(ax, egress_gdf, EGRESS_COLOR, position=0.9, zorder=20)
-
-            if ingress_gdf is not None:
-                ingress_gdf.plot(ax=ax, linewidth=3.5, color=INGRESS_COLOR,
-                                 alpha=0.92, zorder=9)
+            if egress is not None:
+                egress.plot(ax, linewidth=3.5, color=EGRESS_COLOR,
+                            alpha=0.92, zorder=8)
+                _add_route_arrow(ax, egress, EGRESS_COLOR, position=0.9, zorder=20)
+
+            if ingress is not None:
+                ingress.plot(ax, linewidth=3.5, color=INGRESS_COLOR,
+                             alpha=0.92, zorder=9)
                 # Arrow head at the site end of the route
-                _add_route_arrow(ax, ingress_gdf, INGRESS_COLOR, position=1.0, zorder=21)
+                _add_route_arrow(ax, ingress, INGRESS_COLOR, position=1.0, zorder=21)
 
         # TO/FROM label at map edge
         base_pt  = _tofrom_pos(st_cen.x, st_cen.y, cx_val, cy_val, MAP_EXTENT)
@@ -0,0 +1,135 @@
+"""
+modules/executor.py
+──────────────────────────────────────────────────────────────────────────────
+Dedicated, bounded executor for analysis work.
+
+Analysis generators block for up to a minute each. Running them on
+Starlette's shared threadpool (plain `def` handlers) or the event loop's
+default executor lets a burst of requests starve everything else, including
+the Render health checks. AnalysisExecutor gives them their own pool:
+
+  • max_workers  — concurrent analyses, sized to memory (each one holds
+                   OSM layers + a matplotlib figure)
+  • max_queue    — analyses allowed to wait for a worker; beyond that
+                   run() raises AnalysisQueueFull and the API answers
+                   503 + Retry-After instead of queueing unboundedly
+  • submit(wait=True) — for work that is already accepted (report panels,
+                   background jobs): blocks for a free slot instead of
+                   raising, so it still counts against the same capacity
+  • stats()      — running / queued counts and recent durations
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class AnalysisQueueFull(RuntimeError):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Analysis queue is full — retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AnalysisExecutor:
+    def __init__(self, max_workers: int = 2, max_queue: int = 8):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue   = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                        thread_name_prefix="analysis")
+        self._lock      = threading.Lock()
+        self._slot      = threading.Condition(self._lock)
+        self._pending   = 0      # submitted and not finished (running + queued)
+        self._running   = 0
+        self._avg_s     = 60.0   # EWMA of task duration, seeds Retry-After
+        self.completed  = 0
+        self.rejected   = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _retry_after(self) -> int:
+        waves = max(1, self._pending // self.max_workers)
+        return int(max(5, min(300, waves * self._avg_s)))
+
+    def _admit(self, wait: bool = False):
+        with self._lock:
+            while self._pending >= self.capacity:
+                if not wait:
+                    self.rejected += 1
+                    raise AnalysisQueueFull(self._retry_after())
+                self._slot.wait()
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self._slot.notify()
+
+    def check(self):
+        """Raise AnalysisQueueFull now if no slot is free."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise AnalysisQueueFull(self._retry_after())
+
+    def _wrap(self, fn, args, kwargs):
+        with self._lock:
+            self._running += 1
+        t0 = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            dt = time.time() - t0
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._slot.notify()
+                self.completed += 1
+                self._avg_s = 0.8 * self._avg_s + 0.2 * dt
+
+    def submit(self, fn, *args, wait: bool = False, **kwargs):
+        """
+        Blocking-style submit; returns a concurrent.futures.Future.
+        wait=True blocks until a slot is free instead of raising — never use
+        it from a thread of this pool, or it can wait on itself.
+        """
+        self._admit(wait)
+        try:
+            return self._pool.submit(self._wrap, fn, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+
+    async def run(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) on the analysis pool."""
+        self._admit()
+        loop = asyncio.get_running_loop()
+        try:
+            fut = loop.run_in_executor(
+                self._pool, functools.partial(self._wrap, fn, args, kwargs))
+        except Exception:
+            self._release()
+            raise
+        return await fut
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers":   self.max_workers,
+                "max_queue":     self.max_queue,
+                "running":       self._running,
+                "queue_depth":   self._pending - self._running,
+                "completed":     self.completed,
+                "rejected":      self.rejected,
+                "avg_seconds":   round(self._avg_s, 1),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
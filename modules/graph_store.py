@@ -0,0 +1,500 @@
+"""
+modules/graph_store.py
+──────────────────────────────────────────────────────────────────────────────
+Offline street-network graphs for walking and driving routing.
+
+prepare_osm_data.py parses the territory PBF once and calls build_graph()
+for each network type; the result is a directory of flat numpy arrays
+
+  data/graphs/<network_type>/
+      meta.json            counts, bounds, highway code table
+      node_id.npy          int64   OSM node id                   (N,)
+      node_x.npy           float64 lon                           (N,)
+      node_y.npy           float64 lat                           (N,)
+      edge_u.npy           int32   node index of the edge start  (E,)
+      edge_v.npy           int32   node index of the edge end    (E,)
+      edge_length.npy      float32 metres                        (E,)
+      edge_highway.npy     uint16  index into meta["highway_codes"]
+      edge_maxspeed.npy    float32 km/h, NaN when untagged
+      edge_oneway.npy      bool    True → traversable u→v only
+      edge_osmid.npy       int64   OSM way id
+      geom_indptr.npy      int64   edge i's points are geom_xy[indptr[i]:indptr[i+1]]
+      geom_xy.npy          float64 (M, 2) lon/lat
+
+Ways are split at intersections and dead ends when the graph is built, so
+edges already match osmnx's simplified topology. GraphStore memory-maps the
+arrays at startup; subgraph() cuts the bbox osmnx would have downloaded for
+graph_from_point(center, dist) and returns an ordinary nx.MultiDiGraph with
+the attributes the analysis modules and ox.routing rely on (x/y, length,
+highway, oneway, reversed, maxspeed, osmid, geometry). Requests never touch
+Overpass or run graph simplification.
+
+graph_from_point() is the drop-in used by the modules: it serves from a
+registered store when the area is covered and falls back to osmnx otherwise.
+
+Drive travel times come from per-class free-flow speeds (a tagged maxspeed
+wins). A drive store computes them for every edge once at load and hands
+them out with each subgraph; add_travel_time() does the same in bulk for
+graphs that came from osmnx.
+
+graph_from_point() keeps the last few graphs (set_graph_cache), so repeat
+requests for a site reuse the graph together with its projected geometry
+and nearest-node index (modules/projected.py).
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+import networkx as nx
+import osmnx as ox
+import shapely
+
+from osmnx._errors import InsufficientResponseError
+
+from modules.station_table import StationTable
+
+log = logging.getLogger(__name__)
+
+# Way filters of osmnx 2.1's "walk" / "drive" network types, in Overpass
+# syntax, so offline graphs contain the same ways a live query would.
+NETWORK_FILTERS = {
+    "walk": (
+        '["highway"]["area"!~"yes"]["access"!~"private"]'
+        '["highway"!~"abandoned|bus_guideway|construction|cycleway|motor|no|planned|'
+        'platform|proposed|raceway|razed|rest_area|services"]["foot"!~"no"]'
+        '["service"!~"private"]["sidewalk"!~"separate"]["sidewalk:both"!~"separate"]'
+        '["sidewalk:left"!~"separate"]["sidewalk:right"!~"separate"]'
+    ),
+    "drive": (
+        '["highway"]["area"!~"yes"]["access"!~"private"]'
+        '["highway"!~"abandoned|bridleway|bus_guideway|construction|corridor|cycleway|'
+        'elevator|escalator|footway|no|path|pedestrian|planned|platform|proposed|raceway|'
+        'razed|rest_area|service|services|steps|track"]["motor_vehicle"!~"no"]'
+        '["motorcar"!~"no"]["service"!~"alley|driveway|emergency_access|parking|'
+        'parking_aisle|private"]'
+    ),
+}
+
+# osmnx treats these network types as fully bidirectional (oneway ignored).
+BIDIRECTIONAL = {"walk"}
+
+_ONEWAY_YES = {"yes", "true", "1", "-1", "reverse", "T", "F"}
+_ONEWAY_REV = {"-1", "reverse", "T"}
+
+_FILTER_RE = re.compile(r'\["([^"]+)"(?:!~"([^"]*)")?\]')
+
+# Free-flow drive speeds (km/h) by highway class, tuned for dense urban
+# streets; *_link roads use their parent class. Anything else gets
+# DEFAULT_SPEED, the flat speed the drive maps used before.
+HIGHWAY_SPEEDS = {
+    "motorway":       70,
+    "trunk":          60,
+    "primary":        45,
+    "secondary":      40,
+    "tertiary":       35,
+    "unclassified":   30,
+    "residential":    25,
+    "living_street":  15,
+    "road":           30,
+}
+DEFAULT_SPEED = 35
+
+
+def _parse_filter(spec):
+    """[(key, None)] for required keys, [(key, regex)] for excluded values."""
+    return [(k, re.compile(p) if p else None)
+            for k, p in _FILTER_RE.findall(spec)]
+
+
+def way_matches(tags: dict, network_type: str) -> bool:
+    for key, pattern in _parse_filter(NETWORK_FILTERS[network_type]):
+        value = tags.get(key)
+        if pattern is None:
+            if value is None:
+                return False
+        elif value is not None and pattern.search(value):
+            return False
+    return True
+
+
+def _parse_maxspeed(value):
+    if not value:
+        return np.nan
+    try:
+        v = str(value).split(";")[0].strip().lower()
+        if v.endswith("mph"):
+            return float(v[:-3].strip()) * 1.609344
+        return float(v.replace("km/h", "").replace("kph", "").strip())
+    except ValueError:
+        return np.nan
+
+
+def highway_speed(highway) -> float:
+    """Free-flow speed (km/h) for a highway value (osmnx may give a list)."""
+    if isinstance(highway, (list, tuple)):
+        return max((highway_speed(h) for h in highway), default=DEFAULT_SPEED)
+    hw = str(highway or "")
+    return HIGHWAY_SPEEDS.get(hw.removesuffix("_link"), DEFAULT_SPEED)
+
+
+def travel_times(length, speed_class, maxspeed) -> np.ndarray:
+    """Edge travel times in minutes: length (m) at the tagged maxspeed,
+    or the class speed where maxspeed is NaN."""
+    speed = np.where(np.isnan(maxspeed), speed_class, maxspeed)
+    speed = np.clip(speed, 5.0, None)
+    return (np.asarray(length, dtype=np.float64) / (speed * 1000 / 60)).astype(np.float32)
+
+
+def add_travel_time(G):
+    """Set edge travel_time (minutes) on a drive graph in one pass.
+    Graphs cut from a drive store already carry it and are returned as-is."""
+    if G.graph.get("travel_time"):
+        return G
+    keys, length, speed_class, maxspeed = [], [], [], []
+    for u, v, k, data in G.edges(keys=True, data=True):
+        keys.append((u, v, k))
+        length.append(data["length"])
+        speed_class.append(highway_speed(data.get("highway")))
+        ms = data.get("maxspeed")
+        maxspeed.append(_parse_maxspeed(ms[0] if isinstance(ms, list) else ms))
+    tt = travel_times(length, np.asarray(speed_class, dtype=np.float64),
+                      np.asarray(maxspeed, dtype=np.float64))
+    nx.set_edge_attributes(G, dict(zip(keys, tt.tolist())), "travel_time")
+    G.graph["travel_time"] = True
+    return G
+
+
+def _haversine(lon, lat):
+    lon, lat = np.radians(lon), np.radians(lat)
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    return 2 * 6371009 * np.arcsin(np.sqrt(a))
+
+
+# ── Build (prepare_osm_data.py) ───────────────────────────────
+def build_graph(ways, network_type: str, out_dir: str):
+    """
+    ways: iterable of (way_id, tags dict, [(node_id, lon, lat), ...]).
+    Writes the array layout described in the module docstring to out_dir.
+    """
+    ways = [w for w in ways if len(w[2]) >= 2 and way_matches(w[1], network_type)]
+    bidirectional = network_type in BIDIRECTIONAL
+
+    # A node splits ways when it is shared by several ways or ends one.
+    uses = {}
+    for _, _, nodes in ways:
+        for nid, _, _ in nodes:
+            uses[nid] = uses.get(nid, 0) + 1
+        uses[nodes[0][0]]  = uses[nodes[0][0]] + 1
+        uses[nodes[-1][0]] = uses[nodes[-1][0]] + 1
+
+    node_index, node_x, node_y = {}, [], []
+
+    def _node(nid, lon, lat):
+        idx = node_index.get(nid)
+        if idx is None:
+            idx = node_index[nid] = len(node_x)
+            node_x.append(lon)
+            node_y.append(lat)
+        return idx
+
+    highway_codes = {}
+    edge_u, edge_v, edge_len, edge_hw, edge_ms, edge_ow, edge_osmid = \
+        [], [], [], [], [], [], []
+    indptr, geom = [0], []
+
+    for way_id, tags, nodes in ways:
+        oneway = False
+        if not bidirectional:
+            ow = tags.get("oneway")
+            oneway = ow in _ONEWAY_YES or tags.get("junction") == "roundabout"
+            if ow in _ONEWAY_REV:
+                nodes = nodes[::-1]
+        highway = tags.get("highway", "")
+        hw_code = highway_codes.setdefault(highway, len(highway_codes))
+        maxspeed = _parse_maxspeed(tags.get("maxspeed"))
+
+        start = 0
+        for i in range(1, len(nodes)):
+            if uses[nodes[i][0]] < 2 and i < len(nodes) - 1:
+                continue
+            seg = nodes[start:i + 1]
+            xy  = np.array([(lon, lat) for _, lon, lat in seg], dtype=np.float64)
+            edge_u.append(_node(*seg[0]))
+            edge_v.append(_node(*seg[-1]))
+            edge_len.append(float(_haversine(xy[:, 0], xy[:, 1]).sum()))
+            edge_hw.append(hw_code)
+            edge_ms.append(maxspeed)
+            edge_ow.append(oneway)
+            edge_osmid.append(way_id)
+            geom.append(xy)
+            indptr.append(indptr[-1] + len(xy))
+            start = i
+
+    if len(highway_codes) > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"{len(highway_codes)} highway values do not fit edge_highway (uint16)")
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        "node_id":       np.fromiter(node_index.keys(), dtype=np.int64, count=len(node_index)),
+        "node_x":        np.asarray(node_x, dtype=np.float64),
+        "node_y":        np.asarray(node_y, dtype=np.float64),
+        "edge_u":        np.asarray(edge_u, dtype=np.int32),
+        "edge_v":        np.asarray(edge_v, dtype=np.int32),
+        "edge_length":   np.asarray(edge_len, dtype=np.float32),
+        "edge_highway":  np.asarray(edge_hw, dtype=np.uint16),
+        "edge_maxspeed": np.asarray(edge_ms, dtype=np.float32),
+        "edge_oneway":   np.asarray(edge_ow, dtype=bool),
+        "edge_osmid":    np.asarray(edge_osmid, dtype=np.int64),
+        "geom_indptr":   np.asarray(indptr, dtype=np.int64),
+        "geom_xy":       np.concatenate(geom) if geom else np.empty((0, 2)),
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), arr)
+
+    codes = sorted(highway_codes, key=highway_codes.get)
+    meta = {
+        "network_type":  network_type,
+        "nodes":         len(node_x),
+        "edges":         len(edge_u),
+        "bounds":        [min(node_x), min(node_y), max(node_x), max(node_y)] if node_x else None,
+        "highway_codes": codes,
+        "built":         time.time(),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+# ── Load / query ──────────────────────────────────────────────
+class GraphStore:
+    _ARRAYS = ("node_id", "node_x", "node_y", "edge_u", "edge_v", "edge_length",
+               "edge_highway", "edge_maxspeed", "edge_oneway", "edge_osmid",
+               "geom_indptr", "geom_xy")
+
+    def __init__(self, root: str):
+        with open(os.path.join(root, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.root         = root
+        self.network_type = self.meta["network_type"]
+        self.bounds       = tuple(self.meta["bounds"])
+        self.highway      = np.asarray(self.meta["highway_codes"], dtype=object)
+        for name in self._ARRAYS:
+            setattr(self, name, np.load(os.path.join(root, f"{name}.npy"), mmap_mode="r"))
+        self.edge_travel_time = None
+        if self.network_type == "drive":
+            class_speed = np.array([highway_speed(h) for h in self.highway], dtype=np.float64)
+            self.edge_travel_time = travel_times(
+                self.edge_length, class_speed[np.asarray(self.edge_highway)],
+                np.asarray(self.edge_maxspeed, dtype=np.float64))
+        self.stations = StationTable.load(root, self)  # see prepare_station_tables.py
+        self._order   = None
+        self._lock    = threading.Lock()
+        self.requests = 0
+        self._ms      = 0.0
+
+    @classmethod
+    def load(cls, root: str):
+        """GraphStore for root, or None when no graph has been built there."""
+        if not os.path.exists(os.path.join(root, "meta.json")):
+            return None
+        try:
+            store = cls(root)
+        except Exception as e:
+            log.warning(f"graph store: cannot load {root}: {e}")
+            return None
+        log.info(f"graph store: {store.network_type} "
+                 f"{store.meta['nodes']:,} nodes / {store.meta['edges']:,} edges")
+        return store
+
+    def directed_edges(self, weight: str = "length"):
+        """Directed edge arrays (u, v, cost, length) over store node indices,
+        two-way edges in both directions and only the cheapest of parallel
+        edges, sorted by key = u * N + v (also returned)."""
+        eu  = np.asarray(self.edge_u, dtype=np.int64)
+        ev  = np.asarray(self.edge_v, dtype=np.int64)
+        ln  = np.asarray(self.edge_length, dtype=np.float64)
+        cst = (ln if weight == "length"
+               else np.asarray(self.edge_travel_time, dtype=np.float64))
+        two = ~np.asarray(self.edge_oneway)
+        u   = np.concatenate([eu, ev[two]])
+        v   = np.concatenate([ev, eu[two]])
+        c   = np.concatenate([cst, cst[two]])
+        ln  = np.concatenate([ln, ln[two]])
+        n   = len(self.node_id)
+        key = u * n + v
+        order = np.lexsort((c, key))
+        key, first = np.unique(key[order], return_index=True)
+        pick = order[first]
+        # Zero costs would vanish from a sparse matrix.
+        return u[pick], v[pick], np.maximum(c[pick], 1e-6), ln[pick], key
+
+    def positions(self, ids):
+        """Store node indices of OSM node ids (all must be in the store)."""
+        if self._order is None:
+            self._order = np.argsort(self.node_id)
+        ids = np.asarray(ids, dtype=np.int64)
+        return self._order[np.searchsorted(self.node_id, ids, sorter=self._order)]
+
+    def covers(self, bbox) -> bool:
+        west, south, east, north = bbox
+        x0, y0, x1, y1 = self.bounds
+        return west >= x0 and south >= y0 and east <= x1 and north <= y1
+
+    def subgraph(self, center_point, dist: float, retain_all: bool = False):
+        """
+        Equivalent of ox.graph_from_point(center_point, dist, network_type,
+        simplify=True): nodes inside the bbox, edges between them, largest
+        weakly connected component unless retain_all.
+        """
+        t0 = time.time()
+        west, south, east, north = ox.utils_geo.bbox_from_point(center_point, dist)
+        x, y = self.node_x, self.node_y
+        inside = (x >= west) & (x <= east) & (y >= south) & (y <= north)
+        eu, ev = np.asarray(self.edge_u), np.asarray(self.edge_v)
+        sel = np.flatnonzero(inside[eu] & inside[ev])
+        if not len(sel):
+            raise InsufficientResponseError("No graph edges within the requested radius.")
+
+        # Edge geometries straight from the ragged coordinate array.
+        start, stop = self.geom_indptr[sel], self.geom_indptr[sel + 1]
+        counts = (stop - start).astype(np.int64)
+        offs   = np.repeat(start - np.cumsum(np.r_[0, counts[:-1]]), counts)
+        points = np.arange(counts.sum()) + offs
+        lines  = shapely.linestrings(np.asarray(self.geom_xy[points]),
+                                     indices=np.repeat(np.arange(len(sel)), counts))
+
+        u, v       = eu[sel], ev[sel]
+        node_ids   = np.asarray(self.node_id)
+        length     = np.asarray(self.edge_length[sel], dtype=float)
+        highway    = self.highway[np.asarray(self.edge_highway[sel])]
+        maxspeed   = np.asarray(self.edge_maxspeed[sel])
+        oneway     = np.asarray(self.edge_oneway[sel])
+        osmid      = np.asarray(self.edge_osmid[sel])
+        ttime      = (None if self.edge_travel_time is None
+                      else self.edge_travel_time[sel].tolist())
+
+        G = nx.MultiDiGraph(crs="epsg:4326", travel_time=ttime is not None)
+        nodes = np.unique(np.concatenate([u, v]))
+        G.add_nodes_from(
+            (int(node_ids[n]), {"x": float(x[n]), "y": float(y[n])}) for n in nodes)
+
+        def _edges():
+            for i in range(len(sel)):
+                a, b = int(node_ids[u[i]]), int(node_ids[v[i]])
+                data = {"osmid": int(osmid[i]), "highway": highway[i],
+                        "oneway": bool(oneway[i]), "reversed": False,
+                        "length": float(length[i]), "geometry": lines[i]}
+                if not np.isnan(maxspeed[i]):
+                    data["maxspeed"] = str(int(round(maxspeed[i])))
+                if ttime is not None:
+                    data["travel_time"] = ttime[i]
+                yield a, b, data
+                if not oneway[i]:
+                    yield b, a, dict(data, reversed=True, geometry=lines[i].reverse())
+
+        G.add_edges_from(_edges())
+        if not retain_all and len(G):
+            keep = max(nx.weakly_connected_components(G), key=len)
+            if len(keep) < len(G):
+                G = G.subgraph(keep).copy()
+        with self._lock:
+            self.requests += 1
+            self._ms      += (time.time() - t0) * 1000
+        return G
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "nodes":    self.meta["nodes"],
+                "edges":    self.meta["edges"],
+                "requests": self.requests,
+                "avg_ms":   round(self._ms / self.requests, 1) if self.requests else 0.0,
+                "stations": len(self.stations.names) if self.stations is not None else 0,
+            }
+
+
+# ── Graph cache ───────────────────────────────────────────────
+class _GraphCache:
+    def __init__(self, size: int = 0):
+        self.size   = size
+        self._lock  = threading.Lock()
+        self._items = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            G = self._items.get(key)
+            if G is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return G
+
+    def put(self, key, G):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = G
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"graphs": len(self._items), "size": self.size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_GRAPHS = _GraphCache()
+
+
+def set_graph_cache(size: int):
+    """Keep the last `size` graphs from graph_from_point (0 disables).
+    Cached graphs are shared between requests and must not be modified,
+    apart from idempotent weights such as add_travel_time()."""
+    global _GRAPHS
+    _GRAPHS = _GraphCache(max(0, int(size)))
+
+
+def graph_cache_stats() -> dict:
+    return _GRAPHS.stats()
+
+
+_STORES = {}
+
+
+def register_store(store):
+    if store is not None:
+        _STORES[store.network_type] = store
+
+
+def get_store(network_type: str):
+    return _STORES.get(network_type)
+
+
+def graph_from_point(center_point, dist: float, network_type: str = "walk",
+                     simplify: bool = True):
+    """ox.graph_from_point, served from the offline store when it covers the
+    area; recent graphs come from the graph cache."""
+    lat, lon = center_point
+    key = (network_type, round(lat, 6), round(lon, 6), float(dist), simplify)
+    G = _GRAPHS.get(key)
+    if G is not None:
+        return G
+    store = _STORES.get(network_type)
+    if (store is not None and simplify
+            and store.covers(ox.utils_geo.bbox_from_point(center_point, dist))):
+        G = store.subgraph(center_point, dist)
+    else:
+        G = ox.graph_from_point(center_point, dist=dist,
+                                network_type=network_type, simplify=simplify)
+    _GRAPHS.put(key, G)
+    return G
@@ -0,0 +1,121 @@
+"""
+modules/isochrone.py
+──────────────────────────────────────────────────────────────────────────────
+Network isochrones: the area reachable from the site along the street
+network within each configured band, instead of a Euclidean circle.
+
+  1. one Dijkstra from the site node bounded at the largest band
+     (or the node costs of an existing PathTree)
+  2. edge arrays: start-node cost, edge cost and geometry for every edge
+     (EPSG:3857 lines from modules/projected.py, projected once per graph)
+  3. per band, edges reached in full plus the reached fraction of frontier
+     edges, buffered and unioned into a polygon with holes filled
+
+Polygons are EPSG:3857 shapely geometries, one per band, nested smallest
+first. band_features() turns them into GeoJSON for POST /isochrones.
+"""
+
+import json
+import logging
+
+from io import BytesIO
+
+import numpy as np
+import networkx as nx
+import shapely
+
+from pyproj import Transformer
+from shapely.geometry import Polygon, MultiPolygon, mapping
+from shapely.ops import substring
+
+from modules.projected import projected
+
+log = logging.getLogger(__name__)
+
+_t3857_4326 = Transformer.from_crs(3857, 4326, always_xy=True)
+
+
+def _transform(geoms, transformer):
+    return shapely.transform(
+        geoms, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+
+def node_costs(G, source, cutoff, weight: str = "length") -> dict:
+    """Bounded single-source Dijkstra: node → cost from source."""
+    return nx.single_source_dijkstra_path_length(G, source, cutoff=cutoff, weight=weight)
+
+
+def _fill_holes(geom):
+    if geom.is_empty:
+        return geom
+    parts = geom.geoms if isinstance(geom, MultiPolygon) else [geom]
+    filled = [Polygon(p.exterior) for p in parts if isinstance(p, Polygon)]
+    return filled[0] if len(filled) == 1 else MultiPolygon(filled)
+
+
+def isochrones(G, costs: dict, cutoffs, weight: str = "length",
+               buffer_m: float = 25.0):
+    """
+    costs   — node → network cost from the site (see node_costs / PathTree.dist)
+    cutoffs — band limits in the units of `weight`, any order
+    Returns a list of EPSG:3857 polygons aligned with sorted(cutoffs).
+    """
+    cutoffs = sorted(cutoffs)
+    top     = cutoffs[-1]
+
+    # Edges whose start node is reached inside the largest band.
+    pg = projected(G)
+    starts, costs_e, picked = [], [], []
+    for i, (u, v, k) in enumerate(pg.edges):
+        cu = costs.get(u)
+        if cu is None or cu >= top:
+            continue
+        data = G[u][v][k]
+        starts.append(cu)
+        costs_e.append(float(data.get(weight, data.get("length", 0.0))))
+        picked.append(i)
+    if not picked:
+        return [Polygon() for _ in cutoffs]
+
+    starts  = np.asarray(starts)
+    costs_e = np.maximum(np.asarray(costs_e), 1e-9)
+    lines   = pg.lines[picked]
+
+    polys = []
+    for cutoff in cutoffs:
+        frac = np.clip((cutoff - starts) / costs_e, 0.0, 1.0)
+        full = frac >= 1.0
+        part = np.flatnonzero((frac > 0.0) & ~full)
+        geoms = list(lines[full])
+        geoms += [substring(lines[i], 0.0, frac[i], normalized=True) for i in part]
+        if not geoms:
+            polys.append(Polygon())
+            continue
+        area = shapely.union_all(shapely.buffer(np.asarray(geoms, dtype=object),
+                                                buffer_m, quad_segs=2))
+        polys.append(_fill_holes(area))
+    return polys
+
+
+def band_features(polys, bands):
+    """
+    GeoJSON FeatureCollection (EPSG:4326) for polygons from isochrones();
+    bands is a list of property dicts aligned with the polygons.
+    """
+    geoms = _transform(np.asarray(polys, dtype=object), _t3857_4326)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": mapping(g), "properties": props}
+            for g, props in zip(geoms, bands)
+        ],
+    }
+
+
+def band_geojson(bands_fn, *args, **kwargs) -> BytesIO:
+    """
+    bands_fn(*args, **kwargs) → (polys, bands), e.g. walking.isochrone_bands,
+    as encoded GeoJSON — the form run_analysis caches for /isochrones.
+    """
+    polys, bands = bands_fn(*args, **kwargs)
+    return BytesIO(json.dumps(band_features(polys, bands)).encode())
@@ -0,0 +1,250 @@
+"""
+modules/jobs.py
+──────────────────────────────────────────────────────────────────────────────
+Asynchronous job queue for long-running analyses and PDF reports.
+
+  POST /jobs               → JobManager.submit()   returns a job id at once
+  GET  /jobs/{id}          → JobManager.get()      status + per-module progress
+  GET  /jobs/{id}/result   → streams the file at job["result_path"]
+
+Jobs are persisted in SQLite (one row per job, progress as JSON) and results
+are written as files next to the database, so any uvicorn worker can answer
+status and result requests for a job another worker is running. Jobs are
+driven from a small in-process thread pool with a bounded queue; the runner
+callable is supplied by app.py, reports progress through a callback and
+does its rendering on the shared analysis executor.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    request     TEXT NOT NULL,
+    progress    TEXT NOT NULL DEFAULT '{}',
+    error       TEXT,
+    result_path TEXT,
+    media_type  TEXT,
+    owner_pid   INTEGER,
+    created     REAL NOT NULL,
+    started     REAL,
+    finished    REAL,
+    owner_boot  TEXT
+)
+"""
+
+# Identifies this process instance. A restarted container usually gets the
+# same pid back, so the pid alone cannot tell our jobs from a dead one's.
+_BOOT = uuid.uuid4().hex
+
+_EXT = {"application/pdf": "pdf", "image/png": "png"}
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed job table. Safe to share between threads and processes."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, "jobs.sqlite")
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(_SCHEMA)
+            cols = {row[1] for row in con.execute("PRAGMA table_info(jobs)")}
+            if "owner_boot" not in cols:
+                con.execute("ALTER TABLE jobs ADD COLUMN owner_boot TEXT")
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with con:            # commit / rollback
+                yield con
+        finally:
+            con.close()
+
+    def _row(self, row):
+        if row is None:
+            return None
+        keys = ("id", "kind", "status", "request", "progress", "error",
+                "result_path", "media_type", "owner_pid",
+                "created", "started", "finished", "owner_boot")
+        job = dict(zip(keys, row))
+        job["request"]  = json.loads(job["request"])
+        job["progress"] = json.loads(job["progress"] or "{}")
+        return job
+
+    def create(self, kind, request: dict) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock, self._connect() as con:
+            con.execute(
+                "INSERT INTO jobs (id, kind, status, request, owner_pid, owner_boot, created) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(request, default=str), os.getpid(), _BOOT,
+                 time.time()))
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as con:
+            row = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def update(self, job_id, **fields):
+        if not fields:
+            return
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock, self._connect() as con:
+            con.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def set_progress(self, job_id, name, status):
+        # Read-modify-write under the lock; progress is only written by the
+        # process that owns the job, so the in-process lock is sufficient.
+        with self._lock, self._connect() as con:
+            row = con.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            progress = json.loads(row[0] or "{}")
+            progress[name] = status
+            con.execute("UPDATE jobs SET progress = ? WHERE id = ?",
+                        (json.dumps(progress), job_id))
+
+    def result_path(self, job_id, media_type):
+        return os.path.join(self.root, f"{job_id}.{_EXT.get(media_type, 'bin')}")
+
+    def fail_orphans(self):
+        """
+        Mark jobs whose owning process is gone (crash / redeploy) as failed.
+        A job is ours only if its boot token matches; one from an earlier
+        process that had our pid is an orphan even though the pid is alive.
+        """
+        with self._lock, self._connect() as con:
+            rows = con.execute(
+                "SELECT id, owner_pid, owner_boot FROM jobs "
+                "WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            orphans = [jid for jid, pid, boot in rows
+                       if boot != _BOOT
+                       and (pid == os.getpid() or not _pid_alive(pid))]
+            for jid in orphans:
+                con.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                    ("interrupted by server restart", time.time(), jid))
+        if orphans:
+            log.info(f"jobs: marked {len(orphans)} orphaned job(s) as failed")
+
+    def purge(self, older_than_s: float):
+        cutoff = time.time() - older_than_s
+        with self._lock, self._connect() as con:
+            rows = con.execute(
+                "SELECT id, result_path FROM jobs "
+                "WHERE status IN ('done', 'failed') AND finished < ?", (cutoff,)
+            ).fetchall()
+            for jid, path in rows:
+                if path:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                con.execute("DELETE FROM jobs WHERE id = ?", (jid,))
+        return len(rows)
+
+
+class JobManager:
+    """
+    runner(kind, request, progress) must return (bytes, media_type); progress
+    is a callable progress(name, status) the runner uses for per-module state.
+    """
+
+    def __init__(self, store: JobStore, runner, workers: int = 1,
+                 max_queue: int = 20, ttl_s: float = 86400):
+        self.store     = store
+        self.runner    = runner
+        self.workers   = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.ttl_s     = float(ttl_s)
+        self._pool     = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="job")
+        self._lock     = threading.Lock()
+        self._pending  = 0
+        store.fail_orphans()
+
+    def submit(self, kind: str, request: dict) -> str:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise JobQueueFull("Job queue is full — retry later")
+            self._pending += 1
+        job_id = None
+        try:
+            self.store.purge(self.ttl_s)
+            job_id = self.store.create(kind, request)
+            self._pool.submit(self._execute, job_id, kind, request)
+        except Exception as e:
+            with self._lock:
+                self._pending -= 1
+            if job_id is not None:
+                self.store.update(job_id, status="failed", error=str(e),
+                                  finished=time.time())
+            raise
+        log.info(f"jobs: queued {kind} job {job_id}")
+        return job_id
+
+    def _execute(self, job_id, kind, request):
+        self.store.update(job_id, status="running", started=time.time())
+        t0 = time.time()
+        try:
+            data, media_type = self.runner(
+                kind, request,
+                lambda name, status: self.store.set_progress(job_id, name, status))
+            path = self.store.result_path(job_id, media_type)
+            tmp  = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self.store.update(job_id, status="done", result_path=path,
+                              media_type=media_type, finished=time.time())
+            log.info(f"jobs: {kind} job {job_id} done in {time.time()-t0:.1f}s")
+        except Exception as e:
+            log.warning(f"jobs: {kind} job {job_id} failed: {e}")
+            self.store.update(job_id, status="failed", error=str(e),
+                              finished=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "max_queue": self.max_queue,
+                    "pending": self._pending}
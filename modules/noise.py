@@ -7,17 +7,34 @@
 #          Map view is now cropped to plot_radius independently of
 #          study_radius (150m). Matches the tight zoom of the Colab
 #          output. Change plot_radius in CFG to adjust zoom level.
+# PERF  — Propagation kernel: all densified segments are flattened
+#          into arrays and summed over the grid in chunks of
+#          (segments x cells) within propagation_chunk_mb, instead of
+#          one full-grid pass per segment. Same energy grid (float64);
+#          scripts/bench_propagation.py compares it with the old loop.
+#          Optional cutoff mode (propagation_cutoff_m, NOISE_CUTOFF_M):
+#          grid blocks sum only segments within the cutoff, far segments
+#          enter as a point-source tail and the worst-case error on the
+#          mapped cells is logged and shown on the map.
+#          The road mask reads the nearest-segment distance the kernel
+#          tracks instead of a second pass over every segment.
+#          Quality presets (QUALITY_PRESETS, noise_quality): draft /
+#          standard / high, as grid resolution and source spacing.
+#          NoiseRaster / noise_raster(): the grid as a float32 raster
+#          product (GeoTIFF, .npy, point sampling) for /noise/raster.
 # + all v2.10 fixes retained
 # ============================================================
 
 import gc
 import io
+import json
 import re
 import time
 import warnings
 import logging
 
 import numpy as np
+import shapely
 import requests
 import geopandas as gpd
 import contextily as cx
@@ -28,12 +45,14 @@ import matplotlib.patheffects as pe
 import matplotlib.patches as mpatches
 
 from io import BytesIO
+from rasterio.io import MemoryFile
+from rasterio.transform import Affine
 from shapely.geometry import Point
 from shapely.strtree import STRtree
 from shapely.validation import make_valid
 from scipy.ndimage import gaussian_filter
 
-from modules.resolver import resolve_location, get_lot_boundary
+from modules.site_bundle import site_location, lot_boundary, features_from_point
 
 warnings.filterwarnings("ignore")
 log = logging.getLogger(__name__)
@@ -67,6 +86,9 @@ CFG = {
     "grid_resolution":     5,
     "densify_spacing":     5.0,
     "road_mask_distance": 80.0,
+    "propagation_chunk_mb":  4,     # working set of the segment kernel
+    "propagation_cutoff_m": None,   # metres; None = every segment reaches every cell
+    "cutoff_block_cells":     8,    # cutoff mode: cells per block side
 
     # Acoustics
     "ground_absorption":  0.6,
@@ -120,6 +142,22 @@ CFG = {
 }
 
 
+# Quality presets (request field noise_quality) — overrides of CFG.
+# "standard" is the 5 m grid above. "draft" is a fast preview: a 10 m
+# grid with 10 m source spacing. "high" renders at 2.5 m. smooth_sigma is
+# in cells, so it scales with the resolution to keep the same smoothing
+# in metres.
+QUALITY_PRESETS = {
+    "draft": {
+        "grid_resolution": 10, "densify_spacing": 10.0, "smooth_sigma": 0.75,
+    },
+    "standard": {},
+    "high": {
+        "grid_resolution": 2.5, "smooth_sigma": 3.0,
+    },
+}
+
+
 # ============================================================
 # UTILITIES
 # ============================================================
@@ -137,7 +175,7 @@ def _densify_line(line, spacing):
         return np.array(line.coords)
     n_pts = max(2, int(np.ceil(total / spacing)) + 1)
     dists = np.linspace(0, total, n_pts)
-    return np.array([line.interpolate(d).coords[0] for d in dists])
+    return shapely.get_coordinates(shapely.line_interpolate_point(line, dists))
 
 
 def _hw_lookup(hw, table):
@@ -487,29 +525,28 @@ class PropagationEngine:
             np.arange(miny, maxy, res),
         )
 
-    def _road_proximity_mask(self, X, Y, road_lines):
+    def _road_proximity_mask(self, X, Y, min_dist, segs):
+        """
+        Cells within road_mask_distance of a road, read off the nearest
+        segment distances the propagation kernel tracks. In cutoff mode
+        cells with no segment inside the cutoff have min_dist = inf; if
+        the cutoff is shorter than the mask distance those few cells are
+        settled with one STRtree query.
+        """
         dist_thresh = self.cfg.get("road_mask_distance", 80.0)
         if dist_thresh is None or dist_thresh <= 0:
             return np.ones_like(X, dtype=bool)
         dist_thresh = float(dist_thresh)
-        min_dist = np.full(X.shape, np.inf, dtype=np.float64)
+        mask = min_dist <= dist_thresh
 
-        for coords, _ in road_lines:
-            n = len(coords) - 1
-            if n < 1:
-                continue
-            for i in range(n):
-                x1, y1 = coords[i];  x2, y2 = coords[i + 1]
-                dx, dy = x2 - x1, y2 - y1
-                q = dx * dx + dy * dy
-                if q < 1e-6:
-                    d = np.sqrt((X - x1) ** 2 + (Y - y1) ** 2)
-                else:
-                    t = np.clip(((X - x1) * dx + (Y - y1) * dy) / q, 0, 1)
-                    d = np.sqrt((X - x1 - t * dx) ** 2 + (Y - y1 - t * dy) ** 2)
-                min_dist = np.minimum(min_dist, d)
+        cutoff  = self.cfg.get("propagation_cutoff_m")
+        unknown = np.flatnonzero(~np.isfinite(min_dist))
+        if segs is not None and cutoff and float(cutoff) < dist_thresh and len(unknown):
+            tree = STRtree(self._segment_lines(segs))
+            pts  = shapely.points(X.ravel()[unknown], Y.ravel()[unknown])
+            hit  = tree.query(pts, predicate="dwithin", distance=dist_thresh)[0]
+            mask.ravel()[unknown[np.unique(hit)]] = True
 
-        mask = min_dist <= dist_thresh
         log.info(
             f"  Road mask: {100*mask.sum()/mask.size:.1f}% cells "
             f"within {dist_thresh}m of a road"
@@ -548,49 +585,187 @@ class PropagationEngine:
         )
         return out
 
+    def _segments(self, lines):
+        """
+        Flatten densified lines into segment arrays: start points (S, 2),
+        direction vectors (S, 2) and the linear source weight
+        10^((L_link + Rg) / 10) / n_segments, so each line still
+        contributes the mean over its segments.
+        """
+        Rg = float(self.cfg["base_reflection"])
+        starts, ends, w = [], [], []
+        for coords, L_link in lines:
+            n = len(coords) - 1
+            if n < 1:
+                continue
+            starts.append(coords[:-1])
+            ends.append(coords[1:])
+            w.append(np.full(n, 10 ** ((L_link + Rg) / 10) / n))
+        if not starts:
+            return None
+        p1 = np.concatenate(starts).astype(np.float64)
+        return p1, np.concatenate(ends).astype(np.float64) - p1, np.concatenate(w)
+
     @staticmethod
-    def _seg_dist(X, Y, x1, y1, x2, y2):
-        dx, dy = x2 - x1, y2 - y1
-        q = dx * dx + dy * dy
-        if q < 1e-6:
-            return np.sqrt((X - x1) ** 2 + (Y - y1) ** 2)
-        t = np.clip(((X - x1) * dx + (Y - y1) * dy) / q, 0, 1)
-        return np.sqrt((X - x1 - t * dx) ** 2 + (Y - y1 - t * dy) ** 2)
+    def _segment_lines(segs):
+        p1, d, _ = segs
+        return shapely.linestrings(np.stack([p1, p1 + d], axis=1))
+
+    def _attenuation(self):
+        """a in (d + 1)^-a = 10^(-(20 + G·GC)·log10(d + 1) / 10)."""
+        return (20 + float(self.cfg["ground_absorption"])
+                * float(self.cfg["ground_term_coeff"])) / 10
+
+    def _kernel(self, X, Y, segs):
+        """
+        Per-grid inputs of _accumulate. Cell coordinates are centred on
+        the grid so the expansion of |r|² below keeps its precision.
+        """
+        p1, d, w = segs
+        o  = np.array([X.mean(), Y.mean()])
+        px, py = X.ravel() - o[0], Y.ravel() - o[1]
+        K  = np.column_stack([px, py, np.ones_like(px), px * px + py * py]).T
+        s  = p1 - o
+        q  = (d ** 2).sum(axis=1)
+        inv_q = np.divide(1.0, q, out=np.zeros_like(q), where=q >= 1e-6)
+        Bp = np.column_stack([d, -(s * d).sum(axis=1), np.zeros_like(q)])
+        Br = np.column_stack([-2 * s, (s ** 2).sum(axis=1), np.ones_like(q)])
+        return K, Bp, Br, q, inv_q, w
+
+    def _accumulate(self, K, kernel, seg_idx=None):
+        """
+        Summed linear energy of segments seg_idx (default all) at the cells
+        of K, and each cell's distance to the nearest of them, computed in
+        chunks of (segments × cells) sized to propagation_chunk_mb.
+
+        Per chunk, the projection r·d and |r|² of every cell on every
+        segment come out of two small matrix products; the clipped
+        point-to-segment distance follows as |r|² − t(2·r·d − t|d|²).
+        The attenuation is one power, (d + 1)^−a, and the chunk is folded
+        in with a weighted dot product.
+        """
+        _, Bp, Br, q, inv_q, w = kernel
+        if seg_idx is not None:
+            Bp, Br, q, inv_q, w = Bp[seg_idx], Br[seg_idx], q[seg_idx], inv_q[seg_idx], w[seg_idx]
+        a      = self._attenuation()
+        energy = np.zeros(K.shape[1], dtype=np.float64)
+        near   = np.full(K.shape[1], np.inf)
+
+        budget = float(self.cfg.get("propagation_chunk_mb", 4)) * 2 ** 20
+        chunk  = int(max(1, budget // (4 * 8 * max(K.shape[1], 1))))
+        for c in range(0, len(w), chunk):
+            e  = slice(c, c + chunk)
+            rd = Bp[e] @ K                      # r·d
+            rr = Br[e] @ K                      # |r|²
+            t  = rd * inv_q[e, None]            # degenerate segments: t = 0
+            np.maximum(t, 0, out=t)
+            np.minimum(t, 1, out=t)
+            rd *= 2
+            rd -= t * q[e, None]
+            t  *= rd
+            rr -= t
+            np.maximum(rr, 0, out=rr)
+            np.sqrt(rr, out=rr)
+            np.minimum(near, rr.min(axis=0), out=near)
+            rr += 1
+            np.power(rr, -a, out=rr)
+            energy += w[e] @ rr
+        return energy, near
+
+    def _energy(self, X, Y, segs):
+        """Summed linear energy of all segments on the grid and the
+        distance from each cell to the nearest segment."""
+        if segs is None:
+            return (np.zeros_like(X, dtype=np.float64),
+                    np.full(X.shape, np.inf))
+        kernel = self._kernel(X, Y, segs)
+        energy, near = self._accumulate(kernel[0], kernel)
+        return energy.reshape(X.shape), near.reshape(X.shape)
+
+    def _energy_culled(self, X, Y, segs, cutoff):
+        """
+        Cutoff mode: the grid is split into blocks of cutoff_block_cells²
+        cells and each block sums exactly only the segments within cutoff
+        metres of it (STRtree query). Every other segment is at least
+        cutoff away from all of the block's cells, so its share is replaced
+        by an analytic far-field tail: the segment as a point source at its
+        midpoint, seen from the block centre.
+
+        Returns (energy, bound, min_dist): bound per cell is the ratio of
+        the largest possible tail error to the smallest possible true
+        energy (exact part plus the tail's lower bound), so
+        10·log10(1 + bound) caps the level error either way; min_dist is
+        the nearest segment distance, inf where no segment lies within the
+        cutoff.
+        """
+        if segs is None:
+            z = np.zeros_like(X, dtype=np.float64)
+            return z, z.copy(), np.full(X.shape, np.inf)
+        p1, d, w = segs
+        a      = self._attenuation()
+        kernel = self._kernel(X, Y, segs)
+        K      = kernel[0]
+        b      = max(1, int(self.cfg.get("cutoff_block_cells", 8)))
+        ny, nx = X.shape
+        flat   = np.arange(X.size).reshape(X.shape)
+        blocks = [flat[r:r + b, c:c + b].ravel()
+                  for r in range(0, ny, b) for c in range(0, nx, b)]
+        xs, ys = X.ravel(), Y.ravel()
+        boxes  = shapely.box([xs[i].min() for i in blocks], [ys[i].min() for i in blocks],
+                             [xs[i].max() for i in blocks], [ys[i].max() for i in blocks])
+        tree   = STRtree(self._segment_lines(segs))
+        blk, seg = tree.query(boxes, predicate="dwithin", distance=cutoff)
+
+        order  = np.argsort(blk, kind="stable")
+        splits = np.searchsorted(blk[order], np.arange(len(blocks) + 1))
+        mid    = p1 + d / 2
+        half   = np.hypot(*d.T) / 2
+        energy = np.zeros(X.size, dtype=np.float64)
+        bound  = np.zeros(X.size, dtype=np.float64)
+        dmin   = np.full(X.size, np.inf)
+        for k, cells in enumerate(blocks):
+            idx = seg[order[splits[k]:splits[k + 1]]]
+            e = 0.0
+            if len(idx):
+                e, dmin[cells] = self._accumulate(K[:, cells], kernel, idx)
+
+            # Far-field tail; its error is bounded by the nearest and
+            # farthest any cell of the block can be from each segment.
+            far = np.ones(len(w), dtype=bool)
+            far[idx] = False
+            cx, cy = xs[cells].mean(), ys[cells].mean()
+            reach  = np.hypot(xs[cells] - cx, ys[cells] - cy).max() + half[far]
+            r      = np.hypot(mid[far, 0] - cx, mid[far, 1] - cy)
+            wf     = w[far]
+            tail   = wf @ (r + 1) ** -a
+            hi     = wf @ (np.maximum(r - reach, cutoff) + 1) ** -a
+            lo     = wf @ (r + reach + 1) ** -a
+            energy[cells] = e + tail
+            bound[cells]  = max(hi - tail, tail - lo) / np.maximum(e + lo, 1e-12)
+        dmin[dmin > cutoff] = np.inf      # only exact up to the cutoff
+        return energy.reshape(X.shape), bound.reshape(X.shape), dmin.reshape(X.shape)
 
     def run(self, roads, site_polygon):
         bounds = site_polygon.buffer(self.cfg["study_radius"]).bounds
         X, Y   = self._grid(bounds)
-        energy = np.zeros_like(X, dtype=np.float64)
-        G      = float(self.cfg["ground_absorption"])
-        GC     = float(self.cfg["ground_term_coeff"])
-        Rg     = float(self.cfg["base_reflection"])
 
         lines = self._extract_lines(roads)
         log.info(f"  Propagation: {len(lines)} sources | {X.size:,} cells")
         t0 = time.time()
 
-        for coords, L_link in lines:
-            n = len(coords) - 1
-            if n < 1:
-                continue
-            le = np.zeros_like(X, dtype=np.float64)
-            for i in range(n):
-                x1, y1 = coords[i];  x2, y2 = coords[i + 1]
-                d  = self._seg_dist(X, Y, x1, y1, x2, y2)
-                Lc = (L_link
-                      - 20 * np.log10(d + 1)
-                      - G * GC * np.log10(d + 1)
-                      + Rg)
-                le += 10 ** (Lc / 10)
-            energy += le / n
-
+        segs   = self._segments(lines)
+        cutoff = self.cfg.get("propagation_cutoff_m")
+        if cutoff:
+            energy, bound, min_dist = self._energy_culled(X, Y, segs, float(cutoff))
+        else:
+            (energy, min_dist), bound = self._energy(X, Y, segs), None
         noise = 10 * np.log10(energy + 1e-12)
 
         sigma = float(self.cfg.get("smooth_sigma", 1.5))
         if sigma > 0:
             noise = gaussian_filter(noise, sigma=sigma)
 
-        road_mask = self._road_proximity_mask(X, Y, lines)
+        road_mask = self._road_proximity_mask(X, Y, min_dist, segs)
         noise[~road_mask] = np.nan
 
         nf = float(self.cfg.get("noise_floor_db", 45.0))
@@ -602,6 +777,15 @@ class PropagationEngine:
                 f"  Noise >={nf} dB: "
                 f"min={v.min():.1f} max={v.max():.1f} mean={v.mean():.1f} dB(A)"
             )
+        self.cutoff_error_db = None
+        if bound is not None:
+            shown = bound[np.isfinite(noise)]
+            self.cutoff_error_db = (float(10 * np.log10(1 + shown.max()))
+                                    if len(shown) else 0.0)
+            log.info(
+                f"  Cutoff {float(cutoff):.0f}m: max error "
+                f"<= {self.cutoff_error_db:.2f} dB on mapped cells"
+            )
         log.info(f"  Propagation done: {time.time() - t0:.1f}s")
         gc.collect()
         return X, Y, noise
@@ -765,7 +949,8 @@ class NoiseVisualizer:
                 f"Max:  {v.max():.1f} dB(A)\n"
                 f"Mean: {v.mean():.1f} dB(A)\n"
                 f"Min:  {v.min():.1f} dB(A)\n"
-                f"Src:  {meta.get('L_source_range', '-')}",
+                f"Src:  {meta.get('L_source_range', '-')}"
+                + (f"\nCut:  {meta['cutoff']}" if "cutoff" in meta else ""),
                 fontsize=8, ha="right", va="bottom", zorder=30,
                 bbox=dict(boxstyle="round,pad=0.4", facecolor="white",
                           edgecolor="#aaa", alpha=0.88),
@@ -779,7 +964,9 @@ class NoiseVisualizer:
             f"[R={int(R_study)}m  view={int(R_plot)}m  "
             f"LNRS={meta.get('lnrs_roads', 0)} roads]\n"
             f"Canyon per-road - Road mask {mask_d}m - "
-            f"Colorbar 50-{cb_max} dB  [v2.11]",
+            f"Colorbar 50-{cb_max} dB  [v2.11"
+            + ("" if meta.get("quality", "standard") == "standard"
+               else f" {meta['quality']}") + "]",
             fontsize=12, weight="bold", pad=10,
         )
         ax.text(
@@ -802,16 +989,112 @@ class NoiseVisualizer:
         return buf
 
 
+# ============================================================
+# PHASE 6 — RASTER PRODUCT
+# ============================================================
+
+class NoiseRaster:
+    """
+    The propagated grid as a north-up float32 raster in EPSG:3857.
+    data[row, col] is dB(A), NaN where the map shows no level (road mask,
+    noise floor). transform is the affine (res, 0, x_left, 0, -res, y_top)
+    from pixel (col, row) to the cell's top-left corner, as in rasterio.
+    meta carries the map's source notes (level range, LNRS roads, cutoff)
+    so the map can be drawn from the raster alone.
+    """
+    CRS = "EPSG:3857"
+
+    def __init__(self, data, transform, meta=None):
+        self.data      = np.asarray(data, dtype=np.float32)
+        self.transform = tuple(float(v) for v in transform)
+        self.meta      = dict(meta or {})
+
+    @classmethod
+    def from_grid(cls, X, Y, noise, res, meta=None):
+        """From PropagationEngine.run output (cell centres, rows south → north)."""
+        x_left = float(X[0, 0]) - res / 2
+        y_top  = float(Y[-1, 0]) + res / 2
+        return cls(noise[::-1], (res, 0.0, x_left, 0.0, -res, y_top), meta)
+
+    def to_grid(self):
+        """Back to (X, Y, noise) as PropagationEngine.run returns them."""
+        res, _, x_left, _, _, y_top = self.transform
+        h, w = self.data.shape
+        xs = x_left + res * (np.arange(w) + 0.5)
+        ys = y_top - res * (np.arange(h)[::-1] + 0.5)
+        X, Y = np.meshgrid(xs, ys)
+        return X, Y, self.data[::-1].astype(np.float64)
+
+    @property
+    def resolution(self):
+        return self.transform[0]
+
+    def to_bytes(self) -> bytes:
+        """Compact cache form: compressed .npz with data, transform and meta."""
+        buf = BytesIO()
+        np.savez_compressed(buf, data=self.data, transform=np.array(self.transform),
+                            meta=np.array(json.dumps(self.meta)))
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, raw):
+        with np.load(BytesIO(raw)) as f:
+            meta = json.loads(str(f["meta"])) if "meta" in f.files else None
+            return cls(f["data"], f["transform"], meta)
+
+    def to_npy(self) -> bytes:
+        buf = BytesIO()
+        np.save(buf, self.data)
+        return buf.getvalue()
+
+    def to_geotiff(self) -> bytes:
+        h, w = self.data.shape
+        with MemoryFile() as mem:
+            with mem.open(driver="GTiff", width=w, height=h, count=1,
+                          dtype="float32", crs=self.CRS, nodata=np.nan,
+                          transform=Affine(*self.transform),
+                          compress="deflate") as dst:
+                dst.write(self.data, 1)
+                dst.update_tags(units="dB(A) Leq")
+            return mem.read()
+
+    def sample(self, x, y):
+        """Levels at EPSG:3857 points (nearest cell); NaN outside the grid."""
+        res, _, x_left, _, _, y_top = self.transform
+        col = np.floor((np.asarray(x, dtype=np.float64) - x_left) / res).astype(np.int64)
+        row = np.floor((y_top - np.asarray(y, dtype=np.float64)) / res).astype(np.int64)
+        h, w = self.data.shape
+        inside = (row >= 0) & (row < h) & (col >= 0) & (col < w)
+        out = np.full(row.shape, np.nan, dtype=np.float32)
+        out[inside] = self.data[row[inside], col[inside]]
+        return out
+
+
 # ============================================================
 # PUBLIC API ENTRY POINT
 # ============================================================
 
-def generate_noise(data_type: str, value: str,
-                   lon: float = None, lat: float = None,
-                   lot_ids: list = None, extents: list = None) -> BytesIO:
-    cfg = CFG.copy()
+def set_propagation_cutoff(metres):
+    """Cutoff mode for PropagationEngine.run (see _energy_culled); 0 / None = off."""
+    CFG["propagation_cutoff_m"] = float(metres) if metres else None
+
 
-    lon, lat = resolve_location(data_type, value, lon, lat, lot_ids, extents)
+def osm_layers(data_type: str):
+    """(tags, dist) pairs generate_noise fetches — see SiteBundle.reserve."""
+    return [({"building": True}, 80),
+            ({"building": True}, CFG["study_radius"]),
+            ({"highway": True}, CFG["study_radius"])]
+
+
+def _quality_cfg(quality):
+    if quality not in QUALITY_PRESETS:
+        raise ValueError(f"noise quality must be one of {sorted(QUALITY_PRESETS)}")
+    return {**CFG, **QUALITY_PRESETS[quality]}
+
+
+def _site_layers(cfg, data_type, value, lon, lat, lot_ids, extents, bundle):
+    """Site polygon, roads and buildings in the study radius (EPSG:3857)."""
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
 
 
 
@@ -819,7 +1102,7 @@ def generate_noise(data_type: str, value: str,
     site_gdf     = None
     pt = gpd.GeoSeries([Point(lon, lat)], crs=4326).to_crs(3857).iloc[0]
 
-    lot_gdf = get_lot_boundary(lon, lat, data_type, extents)
+    lot_gdf = lot_boundary(bundle, lon, lat, data_type, extents)
     if lot_gdf is not None:
         geom = lot_gdf.geometry.iloc[0]
         if geom is not None and geom.geom_type in ("Polygon", "MultiPolygon") and geom.area > 100:
@@ -831,8 +1114,8 @@ def generate_noise(data_type: str, value: str,
 
     if site_polygon is None:
         try:
-            cands = ox.features_from_point(
-                (lat, lon), dist=80, tags={"building": True}
+            cands = features_from_point(
+                bundle, (lat, lon), 80, {"building": True}
             ).to_crs(3857)
             cands["area"] = cands.area
             cands = cands[cands.geometry.type.isin(["Polygon", "MultiPolygon"])]
@@ -846,8 +1129,8 @@ def generate_noise(data_type: str, value: str,
         site_gdf = gpd.GeoDataFrame(geometry=[site_polygon], crs=3857)
 
     try:
-        roads = ox.features_from_point(
-            (lat, lon), dist=cfg["study_radius"], tags={"highway": True}
+        roads = features_from_point(
+            bundle, (lat, lon), cfg["study_radius"], {"highway": True}
         ).to_crs(3857)
         roads = roads[
             roads.geometry.type.isin(["LineString", "MultiLineString"])
@@ -859,14 +1142,22 @@ def generate_noise(data_type: str, value: str,
         raise ValueError(f"Road fetch failed: {e}") from e
 
     try:
-        bld = ox.features_from_point(
-            (lat, lon), dist=cfg["study_radius"], tags={"building": True}
+        bld = features_from_point(
+            bundle, (lat, lon), cfg["study_radius"], {"building": True}
         ).to_crs(3857)
         bld = bld[bld.geometry.type.isin(["Polygon", "MultiPolygon"])]
         log.info(f"  OSM buildings: {len(bld)}")
     except Exception as e:
         log.warning(f"  Buildings fetch failed: {e}")
         bld = gpd.GeoDataFrame(geometry=[], crs=3857)
+    return site_polygon, site_gdf, bld, roads
+
+
+def _propagate(data_type, value, lon, lat, lot_ids, extents, quality, bundle):
+    """Site, roads, emission and propagation — everything up to the map."""
+    cfg = _quality_cfg(quality)
+    site_polygon, site_gdf, bld, roads = _site_layers(
+        cfg, data_type, value, lon, lat, lot_ids, extents, bundle)
 
     atc_data = ATCWFSLoader(cfg).load()
     lnrs_gdf = LNRSWFSLoader(cfg).load()
@@ -877,15 +1168,55 @@ def generate_noise(data_type: str, value: str,
     roads = EmissionEngine(cfg).compute(roads)
 
     Lv = roads["L_link"].values
-    X, Y, noise = PropagationEngine(cfg).run(roads, site_polygon)
+    engine      = PropagationEngine(cfg)
+    X, Y, noise = engine.run(roads, site_polygon)
 
     meta = {
         "type":           data_type,
         "value":          value,
         "L_source_range": f"{Lv.min():.0f}-{Lv.max():.0f} dB(A)",
         "lnrs_roads":     int((roads["lnrs_corr"] < 0).sum()),
+        "quality":        quality,
     }
+    if engine.cutoff_error_db is not None:
+        meta["cutoff"] = (f"{cfg['propagation_cutoff_m']:.0f}m "
+                          f"(<={engine.cutoff_error_db:.1f} dB)")
+    return cfg, X, Y, noise, site_polygon, site_gdf, bld, roads, meta
+
+
+def generate_noise(data_type: str, value: str,
+                   lon: float = None, lat: float = None,
+                   lot_ids: list = None, extents: list = None,
+                   quality: str = "standard", bundle=None,
+                   raster=None) -> BytesIO:
+    """
+    raster — a NoiseRaster (or its to_bytes() form) from noise_raster for
+    the same site and quality: the map is drawn from it, and only the site,
+    roads and buildings are fetched again for the overlay.
+    """
+    if raster is None:
+        cfg, X, Y, noise, site_polygon, site_gdf, bld, roads, meta = _propagate(
+            data_type, value, lon, lat, lot_ids, extents, quality, bundle)
+    else:
+        if not isinstance(raster, NoiseRaster):
+            raster = NoiseRaster.from_bytes(raster)
+        cfg = _quality_cfg(quality)
+        site_polygon, site_gdf, bld, roads = _site_layers(
+            cfg, data_type, value, lon, lat, lot_ids, extents, bundle)
+        X, Y, noise = raster.to_grid()
+        meta = dict(raster.meta, type=data_type, value=value, quality=quality)
 
     return NoiseVisualizer(cfg).render(
         X, Y, noise, site_polygon, site_gdf, bld, roads, meta
     )
+
+
+def noise_raster(data_type: str, value: str,
+                 lon: float = None, lat: float = None,
+                 lot_ids: list = None, extents: list = None,
+                 quality: str = "standard", bundle=None) -> BytesIO:
+    """The propagated grid as a serialised NoiseRaster (see to_bytes)."""
+    cfg, X, Y, noise, *_, meta = _propagate(
+        data_type, value, lon, lat, lot_ids, extents, quality, bundle)
+    return BytesIO(NoiseRaster.from_grid(
+        X, Y, noise, float(cfg["grid_resolution"]), meta).to_bytes())
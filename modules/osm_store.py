@@ -0,0 +1,179 @@
+"""
+modules/osm_store.py
+──────────────────────────────────────────────────────────────────────────────
+Local OSM feature provider backed by the GeoPackages prepare_osm_data.py
+writes to data/osm/:
+
+  buildings.gpkg   building, name, amenity, tourism, office, shop
+  landuse.gpkg     landuse, leisure, natural, name          (areas only)
+  amenities.gpkg   amenity, tourism, shop, office, name     (nodes + areas)
+  transport.gpkg   highway=bus_stop, railway=station/halt/tram_stop
+
+OSMStore.features() takes the same (center, dist, tags) an analysis passes
+to ox.features_from_point. Queries are bbox reads against each GeoPackage's
+R-tree index with the tag filter pushed down as SQL, so a lookup costs a few
+milliseconds and never touches the network.
+
+Only tag sets the extracts can answer completely are served: roads, rail
+lines, coastline and other tags the script does not extract, or a point
+outside the extract's coverage, return None and the caller falls back to
+Overpass. Results follow osmnx conventions — EPSG:4326, one column per tag,
+missing tags as NaN, InsufficientResponseError when nothing matches.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import geopandas as gpd
+import pandas as pd
+import osmnx as ox
+import pyogrio
+
+from osmnx._errors import InsufficientResponseError
+from shapely.geometry import box
+
+log = logging.getLogger(__name__)
+
+LAYER_FILES = {
+    "buildings": "buildings.gpkg",
+    "landuse":   "landuse.gpkg",
+    "amenities": "amenities.gpkg",
+    "transport": "transport.gpkg",
+}
+
+# The landuse extract only keeps areas, so natural=* is limited to values
+# that are mapped as areas; peaks, cliffs and coastline are not in it.
+_AREA_NATURAL = {"wood", "grassland", "scrub", "heath", "water",
+                 "wetland", "beach", "bay"}
+
+# OSM tag key → (layer, values the extract holds, or None for all of them)
+TAG_LAYERS = {
+    "building": ("buildings", None),
+    "landuse":  ("landuse",   None),
+    "leisure":  ("landuse",   None),
+    "natural":  ("landuse",   _AREA_NATURAL),
+    "amenity":  ("amenities", None),
+    "tourism":  ("amenities", None),
+    "shop":     ("amenities", None),
+    "office":   ("amenities", None),
+    "highway":  ("transport", {"bus_stop"}),
+    "railway":  ("transport", {"station", "halt", "tram_stop"}),
+}
+
+# Building ways are written both as outlines and as areas; osmnx returns
+# the polygon, so the outline copies are dropped.
+_POLYGON_ONLY = {"buildings"}
+
+
+def _values(v):
+    return v if isinstance(v, (list, tuple, set)) else [v]
+
+
+def _sql_quote(v):
+    return "'" + str(v).replace("'", "''") + "'"
+
+
+class OSMStore:
+    def __init__(self, root: str):
+        self.root   = root
+        self.layers = {}                 # layer → (path, (xmin, ymin, xmax, ymax))
+        for layer, fname in LAYER_FILES.items():
+            path = os.path.join(root, fname)
+            if not os.path.exists(path):
+                continue
+            try:
+                info = pyogrio.read_info(path, force_total_bounds=True)
+                self.layers[layer] = (path, tuple(info["total_bounds"]))
+            except Exception as e:
+                log.warning(f"osm store: cannot open {path}: {e}")
+        self._lock  = threading.Lock()
+        self.served = self.fallbacks = 0
+        self._ms    = 0.0
+        if self.layers:
+            log.info(f"osm store: {sorted(self.layers)} from {root}")
+
+    @property
+    def available(self) -> bool:
+        return bool(self.layers)
+
+    def plan(self, tags: dict):
+        """layer → {key: value} for a tags dict, or None if any part of it
+        cannot be answered from the local extracts."""
+        plan = {}
+        for key, value in tags.items():
+            spec = TAG_LAYERS.get(key)
+            if spec is None or spec[0] not in self.layers:
+                return None
+            layer, held = spec
+            if held is not None and (value is True
+                                     or not set(map(str, _values(value))) <= held):
+                return None
+            plan.setdefault(layer, {})[key] = value
+        return plan
+
+    def _covers(self, layers, bbox):
+        xmin, ymin, xmax, ymax = bbox
+        for layer in layers:
+            lx0, ly0, lx1, ly1 = self.layers[layer][1]
+            if xmin < lx0 or ymin < ly0 or xmax > lx1 or ymax > ly1:
+                return False
+        return True
+
+    def _read(self, layer, bbox, tags):
+        clauses = []
+        for key, value in tags.items():
+            if value is True:
+                clauses.append(f"({key} IS NOT NULL AND {key} <> '')")
+            else:
+                clauses.append(f"{key} IN ({', '.join(map(_sql_quote, _values(value)))})")
+        gdf = gpd.read_file(self.layers[layer][0], bbox=bbox,
+                            where=" OR ".join(clauses), engine="pyogrio")
+        if layer in _POLYGON_ONLY and len(gdf):
+            gdf = gdf[gdf.geometry.geom_type.isin(["Polygon", "MultiPolygon"])]
+        # The extracts store absent tags as "" — osmnx leaves them NaN.
+        cols = [c for c in gdf.columns
+                if c != "geometry" and pd.api.types.is_string_dtype(gdf[c])]
+        gdf[cols] = gdf[cols].mask(gdf[cols] == "")
+        return gdf
+
+    def features(self, center_point, dist, tags: dict):
+        """
+        Local equivalent of ox.features_from_point(center_point, tags, dist).
+        Returns None when the query has to go to Overpass instead.
+        """
+        plan = self.plan(tags)
+        bbox = ox.utils_geo.bbox_from_point(center_point, dist)
+        if plan is None or not self._covers(plan, bbox):
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        t0 = time.time()
+        try:
+            frames = [self._read(layer, bbox, layer_tags)
+                      for layer, layer_tags in plan.items()]
+        except Exception as e:
+            log.warning(f"osm store: read failed for {tags}: {e}")
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        frames = [f for f in frames if len(f)]
+        gdf = (gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=4326)
+               if frames else gpd.GeoDataFrame(geometry=[], crs=4326))
+        gdf = gdf[gdf.intersects(box(*bbox))]
+        with self._lock:
+            self.served += 1
+            self._ms    += (time.time() - t0) * 1000
+        if gdf.empty:
+            raise InsufficientResponseError("No matching features in the local OSM extract.")
+        return gdf
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "layers":    sorted(self.layers),
+                "served":    self.served,
+                "fallbacks": self.fallbacks,
+                "avg_ms":    round(self._ms / self.served, 1) if self.served else 0.0,
+            }
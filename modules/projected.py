@@ -0,0 +1,112 @@
+"""
+modules/projected.py
+──────────────────────────────────────────────────────────────────────────────
+EPSG:3857 geometry of a street graph, built once per graph.
+
+Graphs stay in EPSG:4326 (osmnx and the offline store both produce them
+that way), but everything the maps do with them is in metres: drawing the
+streets, snapping sites and stations, isochrone polygons, route lines.
+projected(G) converts node coordinates and edge geometries in one pyproj
+call each and keeps the result for the graph's lifetime — graphs from the
+graph cache (graph_store.set_graph_cache) therefore keep it across
+requests — together with a KD-tree for nearest-node queries.
+
+nearest_nodes() replaces ox.distance.nearest_nodes for both CRSs.
+"""
+
+import threading
+import weakref
+
+import numpy as np
+import shapely
+
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+
+_t4326_3857 = Transformer.from_crs(4326, 3857, always_xy=True)
+
+
+def to_3857(x, y):
+    """lon / lat arrays → EPSG:3857 x / y arrays."""
+    return _t4326_3857.transform(np.asarray(x, dtype=np.float64),
+                                 np.asarray(y, dtype=np.float64))
+
+
+def mercator_scale(y, crs: int = 3857):
+    """Ground metres per EPSG:3857 unit, cos(latitude), at map y (or at
+    latitude y with crs=4326)."""
+    y = np.asarray(y, dtype=np.float64)
+    if crs == 3857:
+        y = np.degrees(2 * np.arctan(np.exp(y / 6378137.0)) - np.pi / 2)
+    return np.cos(np.radians(y))
+
+
+class ProjectedGraph:
+    """
+    nodes  — node ids, aligned with xy (N, 2) in EPSG:3857
+    edges  — (u, v, key) tuples, aligned with lines (EPSG:3857 LineStrings)
+    """
+
+    def __init__(self, G):
+        self.size  = len(G)
+        self.nodes = np.array(list(G.nodes), dtype=object)
+        lon = np.fromiter((d["x"] for _, d in G.nodes(data=True)), dtype=np.float64, count=len(G))
+        lat = np.fromiter((d["y"] for _, d in G.nodes(data=True)), dtype=np.float64, count=len(G))
+        self.xy   = np.column_stack(to_3857(lon, lat)) if len(G) else np.empty((0, 2))
+        self.tree = cKDTree(self.xy)
+        self._pos = {n: i for i, n in enumerate(self.nodes)}
+
+        self.edges, lines = [], []
+        for u, v, k, data in G.edges(keys=True, data=True):
+            geom = data.get("geometry")
+            if geom is None:
+                geom = shapely.linestrings([(lon[self._pos[u]], lat[self._pos[u]]),
+                                            (lon[self._pos[v]], lat[self._pos[v]])])
+            self.edges.append((u, v, k))
+            lines.append(geom)
+        self.lines = shapely.transform(
+            np.asarray(lines, dtype=object),
+            lambda xy: np.column_stack(to_3857(xy[:, 0], xy[:, 1])))
+        self.edge_index = {e: i for i, e in enumerate(self.edges)}
+
+    def line(self, u, v, k):
+        return self.lines[self.edge_index[(u, v, k)]]
+
+    def nearest(self, X, Y):
+        """(node ids, EPSG:3857 distances) for arrays of EPSG:3857 x / y."""
+        X = np.atleast_1d(np.asarray(X, dtype=np.float64))
+        Y = np.atleast_1d(np.asarray(Y, dtype=np.float64))
+        dist, idx = self.tree.query(np.column_stack([X, Y]))
+        return self.nodes[idx], dist
+
+
+_PROJECTED = weakref.WeakKeyDictionary()
+_LOCK      = threading.Lock()
+
+
+def projected(G) -> ProjectedGraph:
+    """The ProjectedGraph of G, built once and dropped with the graph."""
+    with _LOCK:
+        pg = _PROJECTED.get(G)
+    if pg is None or pg.size != len(G):
+        pg = ProjectedGraph(G)
+        with _LOCK:
+            _PROJECTED[G] = pg
+    return pg
+
+
+def nearest_nodes(G, X, Y, return_dist: bool = False, crs: int = 4326):
+    """
+    Drop-in for ox.distance.nearest_nodes on an unprojected graph: scalar
+    X / Y give one node id, arrays give an array of ids. crs=3857 takes
+    map coordinates directly. Distances are ground metres.
+    """
+    scalar = np.ndim(X) == 0
+    scale  = np.atleast_1d(mercator_scale(Y, crs))           # Mercator units → metres
+    if crs == 4326:
+        X, Y = to_3857(X, Y)
+    nodes, dist = projected(G).nearest(X, Y)
+    dist = dist * scale
+    if scalar:
+        nodes, dist = nodes[0], float(dist[0])
+    return (nodes, dist) if return_dist else nodes
@@ -0,0 +1,149 @@
+"""
+modules/render_pool.py
+──────────────────────────────────────────────────────────────────────────────
+Optional process-pool rendering backend.
+
+Inside one process the generators share the GIL, so the report's parallel
+batches get little real parallelism on CPU-heavy steps (noise contourf, the
+200-dpi view figure, basemap compositing). RenderPool runs them in
+pre-forked worker processes instead:
+
+  • workers are forked once at startup, after the heavy modules are imported
+    and the static datasets are loaded, so each worker starts warm and shares
+    ZONE_DATA / BUILDING_DATA copy-on-write with the parent
+  • tasks carry only small payloads — the generator (pickled by reference)
+    and its plain arguments; registered datasets travel as DatasetRef names
+  • workers return PNG bytes, never figures or GeoDataFrames
+  • a worker killed by the OOM killer breaks the pool; the failing request
+    gets the error and later calls render in the calling thread. The pool
+    is not rebuilt: by then the parent runs threads, so forking is unsafe,
+    and forkserver / spawn workers would not share the datasets
+"""
+
+import os
+import logging
+import importlib
+import threading
+import multiprocessing as mp
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(__name__)
+
+# Populated in the parent before the workers fork; inherited by every worker.
+_DATASETS = {}
+
+
+class DatasetRef:
+    """Picklable stand-in for a large object registered with register_dataset."""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"DatasetRef({self.name!r})"
+
+
+def register_dataset(name: str, obj):
+    _DATASETS[name] = obj
+
+
+def _worker_init(preload):
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+    import matplotlib
+    matplotlib.use("Agg")
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            log.warning(f"render worker: preload {name} failed: {e}")
+
+
+def _noop():
+    return os.getpid()
+
+
+def _render_task(func, args, kwargs):
+    args = [_DATASETS[a.name] if isinstance(a, DatasetRef) else a for a in args]
+    kwargs = {k: (_DATASETS[v.name] if isinstance(v, DatasetRef) else v)
+              for k, v in kwargs.items()}
+    buf = func(*args, **kwargs)
+    return buf.getvalue()
+
+
+class RenderPool:
+    def __init__(self, processes: int, preload=(), start_method: str = "fork"):
+        self.processes    = max(1, int(processes))
+        self.preload      = tuple(preload)
+        self.start_method = start_method
+        self._lock = threading.Lock()
+        self._pool = None
+        self.broken = False
+        self.tasks = self.failures = self.inline = 0
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=mp.get_context(self.start_method),
+            initializer=_worker_init,
+            initargs=(self.preload,),
+        )
+
+    def start(self):
+        """Fork all workers now, while the parent is still single-threaded."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._new_pool()
+            pool = self._pool
+        pids = {f.result() for f in [pool.submit(_noop) for _ in range(self.processes)]}
+        log.info(f"render pool: {len(pids)} worker(s) ready ({self.start_method})")
+        return self
+
+    def _payload(self, args, kwargs):
+        by_id = {id(obj): name for name, obj in _DATASETS.items()}
+        args = [DatasetRef(by_id[id(a)]) if id(a) in by_id else a for a in args]
+        kwargs = {k: (DatasetRef(by_id[id(v)]) if id(v) in by_id else v)
+                  for k, v in kwargs.items()}
+        return args, kwargs
+
+    def render(self, func, *args, **kwargs) -> bytes:
+        """Run func(*args, **kwargs) in a worker and return the PNG bytes."""
+        with self._lock:
+            if not self.broken and self._pool is None:
+                self._pool = self._new_pool()
+            pool = self._pool
+        self.tasks += 1
+        if pool is None:
+            self.inline += 1
+            return func(*args, **kwargs).getvalue()
+        payload_args, payload_kwargs = self._payload(args, kwargs)
+        try:
+            return pool.submit(_render_task, func, payload_args, payload_kwargs).result()
+        except BrokenProcessPool:
+            self.failures += 1
+            with self._lock:
+                if self._pool is pool:
+                    log.warning("render pool: worker died — rendering in-process from now on")
+                    self._pool  = None
+                    self.broken = True
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "processes":    self.processes,
+            "start_method": self.start_method,
+            "tasks":        self.tasks,
+            "failures":     self.failures,
+            "broken":       self.broken,
+            "inline":       self.inline,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
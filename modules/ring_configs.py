@@ -47,7 +47,7 @@ _WALK_ANCHORS = {
 WALK_RING_CONFIGS = {m: _interp_rings(_WALK_ANCHORS, m) for m in range(5, 21)}
 
 
-# ── Driving (35 km/h) ────────────────────────────────────────────
+# ── Driving (network speed) ──────────────────────────────────────
 _DRIVE_ANCHORS = {
     5: {
         "rings": [(83, "1.5 MINS\n0.083 KM"), (250, "3 MINS\n0.25 KM"), (400, "5 MINS\n0.40 KM")],
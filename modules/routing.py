@@ -0,0 +1,194 @@
+"""
+modules/routing.py
+──────────────────────────────────────────────────────────────────────────────
+Shortest-path trees for the station routes.
+
+walking and driving route the site to its nearest stations. One Dijkstra
+from the site node gives every station path at once (egress); on the
+directed drive graph a second search over the reversed graph gives every
+station → site path (ingress). Cost stays flat as the station count grows,
+instead of one nx.shortest_path per station and direction.
+
+nearest_sources() runs the search the other way round for batch scoring:
+one multi-source Dijkstra from every station labels each node with its k
+nearest stations, so any number of sites on the graph are a lookup.
+
+Route holds a path for drawing: one (N, 2) EPSG:3857 polyline with its
+cumulative length, so arrows and labels are placed with searchsorted
+instead of a per-route GeoDataFrame. route_overlap() compares ingress and
+egress by node ids so shared streets can be drawn once.
+"""
+
+import heapq
+import itertools
+
+import numpy as np
+import networkx as nx
+import shapely
+
+from modules.projected import projected, mercator_scale
+
+
+class PathTree:
+    """
+    Shortest paths between `source` and every node reachable in G.
+
+    reverse=False: paths source → node (egress)
+    reverse=True:  paths node → source (ingress), searched on G's reverse view
+    """
+
+    def __init__(self, G, source, weight: str = "length", reverse: bool = False):
+        self.source  = source
+        self.reverse = reverse
+        H = G.reverse(copy=False) if reverse else G
+        self.pred, self.dist = nx.dijkstra_predecessor_and_distance(
+            H, source, weight=weight)
+
+    def __contains__(self, node):
+        return node in self.dist
+
+    def cost(self, node):
+        return self.dist.get(node)
+
+    def path(self, node):
+        """Node list of the shortest path, oriented by the tree direction,
+        or None when node is unreachable."""
+        if node not in self.dist:
+            return None
+        path = [node]
+        while path[-1] != self.source:
+            path.append(self.pred[path[-1]][0])
+        return path if self.reverse else path[::-1]
+
+
+def _edge_weights(nbrs, weight, track):
+    """Cheapest parallel edge of a MultiDiGraph adjacency entry → (cost, tracked)."""
+    best = None
+    for data in nbrs.values():
+        c = data.get(weight, 1)
+        if best is None or c < best[0]:
+            best = (c, data.get(track, 0))
+    return best
+
+
+def nearest_sources(G, sources: dict, k: int = 1, weight: str = "length",
+                    cutoff: float = None, reverse: bool = False,
+                    track: str = "length") -> dict:
+    """
+    Multi-source Dijkstra keeping the k nearest distinct sources per node.
+
+    sources — node → list of labels starting there (e.g. station ids)
+    reverse — False: cost label → node; True: cost node → label (the
+              search follows edges backwards, for directed graphs)
+    track   — edge attribute summed along each shortest path, reported
+              next to the cost (e.g. length while minimising travel_time)
+
+    Returns node → [(cost, tracked, label), ...] nearest first. A label's
+    search stops at nodes that already have k nearer labels, so the whole
+    run costs about k single-source searches.
+    """
+    adj    = G.pred if reverse else G.succ
+    tie    = itertools.count()
+    heap   = [(0.0, 0.0, next(tie), n, lab) for n, labs in sources.items() for lab in labs]
+    heapq.heapify(heap)
+    found  = {}
+    closed = set()
+    while heap:
+        cost, tracked, _, node, lab = heapq.heappop(heap)
+        labels = found.setdefault(node, [])
+        if (node, lab) in closed or len(labels) >= k:
+            continue
+        closed.add((node, lab))
+        labels.append((cost, tracked, lab))
+        for nbr, nbrs in adj[node].items():
+            if (nbr, lab) in closed or len(found.get(nbr, ())) >= k:
+                continue
+            c, t = _edge_weights(nbrs, weight, track)
+            nc = cost + c
+            if cutoff is None or nc <= cutoff:
+                heapq.heappush(heap, (nc, tracked + t, next(tie), nbr, lab))
+    return found
+
+
+# ── Route geometry ────────────────────────────────────────────
+class Route:
+    """A path as one EPSG:3857 polyline: xy (N, 2), cum[i] = distance
+    along the line to xy[i] in map units, the graph nodes it passes and,
+    for each of them, its vertex index in xy (vertex[i] for nodes[i]).
+    length is in map units (for placing things on the line); metres is
+    the ground length."""
+
+    def __init__(self, nodes, xy, vertex=None):
+        self.nodes  = list(nodes)
+        self.xy     = xy
+        self.vertex = (np.asarray(vertex) if vertex is not None
+                       else np.array([0, len(xy) - 1]))
+        self.cum    = np.r_[0.0, np.cumsum(np.hypot(*np.diff(xy, axis=0).T))]
+
+    @property
+    def length(self) -> float:
+        return float(self.cum[-1])
+
+    @property
+    def metres(self) -> float:
+        """Ground length: each segment scaled by cos(latitude) at its middle."""
+        mid_y = (self.xy[1:, 1] + self.xy[:-1, 1]) / 2
+        return float(np.diff(self.cum) @ mercator_scale(mid_y))
+
+    def segment_at(self, distance: float) -> int:
+        """Index i of the segment xy[i] → xy[i+1] holding `distance`."""
+        i = np.searchsorted(self.cum[1:], distance, side="left")
+        return int(min(i, len(self.xy) - 2))
+
+    def point_at(self, fraction: float):
+        """(x, y) at `fraction` of the route length."""
+        d = float(np.clip(fraction, 0.0, 1.0)) * self.length
+        i = self.segment_at(d)
+        seg = self.cum[i + 1] - self.cum[i]
+        t = (d - self.cum[i]) / seg if seg > 0 else 0.0
+        x0, y0 = self.xy[i]
+        x1, y1 = self.xy[i + 1]
+        return x0 + t * (x1 - x0), y0 + t * (y1 - y0)
+
+    def section(self, i: int, j: int):
+        """Route from nodes[i] to nodes[j] (i < j), or None if empty."""
+        if j <= i:
+            return None
+        a, b = self.vertex[i], self.vertex[j]
+        return Route(self.nodes[i:j + 1], self.xy[a:b + 1], self.vertex[i:j + 1] - a)
+
+    def plot(self, ax, **kwargs):
+        return ax.plot(self.xy[:, 0], self.xy[:, 1], solid_capstyle="round", **kwargs)
+
+
+def route_array(G, path, weight: str = "length"):
+    """Route for a node path on an unprojected graph (the cheapest of any
+    parallel edges, as ox.routing.route_to_gdf), or None for no path.
+    Edge lines come from the graph's cached EPSG:3857 projection."""
+    if path is None or len(path) < 2:
+        return None
+    pg, parts, vertex = projected(G), [], [0]
+    for u, v in zip(path[:-1], path[1:]):
+        k  = min(G[u][v], key=lambda key: G[u][v][key].get(weight, 0))
+        xy = shapely.get_coordinates(pg.line(u, v, k))
+        parts.append(xy if not parts else xy[1:])
+        vertex.append(vertex[-1] + len(xy) - 1)
+    return Route(path, np.concatenate(parts), vertex)
+
+
+def route_overlap(egress, ingress) -> dict:
+    """
+    Compare an egress path (site → station) with an ingress path
+    (station → site) by node ids in O(n). The ingress path is read
+    backwards, so shared streets driven both ways line up.
+
+    site    — nodes shared from the site end (>= 1 when both start there)
+    station — nodes shared from the station end
+    same    — the two paths are the same streets in opposite directions
+    """
+    back = ingress[::-1]
+    n    = min(len(egress), len(back))
+    site = next((i for i in range(n) if egress[i] != back[i]), n)
+    station = next((i for i in range(n) if egress[-1 - i] != back[-1 - i]), n)
+    same = site == len(egress) == len(back)
+    return {"site": site, "station": station, "same": same}
@@ -0,0 +1,292 @@
+"""
+modules/site_bundle.py
+──────────────────────────────────────────────────────────────────────────────
+Per-site data shared by the analysis generators.
+
+Every generator resolves the site, looks up its lot boundary and pulls OSM
+layers around it; in a full report that means the same station / building
+queries go to Overpass four or five times at slightly different radii.
+A SiteBundle is built once per report and passed to each generator:
+
+  • location()       — resolve_location, once (failures are remembered too)
+  • lot_boundary()   — get_lot_boundary, once per extents variant
+  • reserve()        — declare (tags, dist) a generator is going to ask for;
+                       layers reserved by two or more callers are fetched
+                       once at the largest radius and kept for the bundle's
+                       lifetime, everything else passes straight through
+  • features()       — ox.features_from_point semantics (EPSG:4326 result,
+                       InsufficientResponseError when nothing matches),
+                       answered by clipping a kept layer when one covers the
+                       request, e.g. {"building": True} @150 m also answers
+                       {"building": True} @60 m
+
+Generators take bundle=None and go through the module-level helpers below,
+so a standalone call behaves exactly as a direct osmnx / resolver call.
+
+Every fetch first asks the local OSM store (see modules/osm_store.py, set
+with set_feature_store) and only goes to Overpass for tag sets or areas the
+local extracts do not cover.
+"""
+
+import json
+import logging
+import threading
+
+import geopandas as gpd
+import osmnx as ox
+
+from concurrent.futures import ThreadPoolExecutor
+from osmnx._errors import InsufficientResponseError
+from shapely.geometry import box
+
+from modules.resolver import resolve_location, get_lot_boundary
+
+log = logging.getLogger(__name__)
+
+_FEATURE_STORE = None
+
+
+def set_feature_store(store):
+    """Serve feature queries from a local OSMStore before Overpass."""
+    global _FEATURE_STORE
+    _FEATURE_STORE = store if store is not None and store.available else None
+
+
+def fetch_features(center_point, dist, tags):
+    """ox.features_from_point, answered from the local store when it can."""
+    if _FEATURE_STORE is not None:
+        gdf = _FEATURE_STORE.features(center_point, dist, tags)
+        if gdf is not None:
+            return gdf
+    return ox.features_from_point(center_point, dist=dist, tags=tags)
+
+
+def _values(v):
+    return v if isinstance(v, (list, tuple)) else [v]
+
+
+def tags_key(tags: dict) -> str:
+    """Order-independent key for an osmnx tags dict."""
+    norm = {k: (True if v is True else sorted(str(x) for x in _values(v)))
+            for k, v in tags.items()}
+    return json.dumps(norm, sort_keys=True)
+
+
+def _covers(have: dict, want: dict) -> bool:
+    """True if every feature matching `want` also matches `have`."""
+    for k, v in want.items():
+        if k not in have:
+            return False
+        if have[k] is True:
+            continue
+        if v is True or not set(map(str, _values(v))) <= set(map(str, _values(have[k]))):
+            return False
+    return True
+
+
+def _match(gdf: gpd.GeoDataFrame, tags: dict):
+    """Boolean mask of rows matching any of the tags (osmnx union semantics)."""
+    mask = None
+    for k, v in tags.items():
+        if k not in gdf.columns:
+            continue
+        col = gdf[k]
+        m = col.notna() if v is True else col.isin([str(x) for x in _values(v)])
+        mask = m if mask is None else (mask | m)
+    if mask is None:
+        return gdf.index.isin([])
+    return mask
+
+
+def _extents_key(extents):
+    # get_lot_boundary only looks at extents when there is more than one.
+    if not extents or len(extents) < 2:
+        return None
+    return json.dumps(extents, sort_keys=True, default=str)
+
+
+class SiteBundle:
+    def __init__(self, data_type: str, value: str,
+                 lon: float = None, lat: float = None,
+                 lot_ids: list = None, extents: list = None):
+        self.data_type = data_type.upper()
+        self.value     = value
+        self.lon, self.lat = lon, lat
+        self.lot_ids   = lot_ids or []
+        self.extents   = extents or []
+        self._init_sync()
+        self._location = None        # (lon, lat) or the exception raised
+        self._lots     = {}          # extents key → lot GeoDataFrame | None
+        self._planned  = {}          # tags key → [tags, max dist, callers]
+        self._layers   = {}          # tags key → (tags, dist, GeoDataFrame 4326)
+        self.fetches = self.hits = 0
+
+    def _init_sync(self):
+        self._lock        = threading.Lock()
+        self._layer_locks = {}
+
+    # Locks do not pickle; the render pool ships bundles to worker processes.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"], state["_layer_locks"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_sync()
+
+    # ── Site ──────────────────────────────────────────────────
+    def location(self):
+        with self._lock:
+            if self._location is None:
+                try:
+                    self._location = resolve_location(
+                        self.data_type, self.value, self.lon, self.lat,
+                        self.lot_ids, self.extents)
+                except Exception as e:
+                    self._location = e
+            loc = self._location
+        if isinstance(loc, Exception):
+            raise loc
+        return loc
+
+    def lot_boundary(self, extents=None):
+        key = _extents_key(extents)
+        with self._lock:
+            if key in self._lots:
+                return self._lots[key]
+        lon, lat = self.location()
+        lot = get_lot_boundary(lon, lat, self.data_type, extents)
+        with self._lock:
+            return self._lots.setdefault(key, lot)
+
+    # ── OSM layers ────────────────────────────────────────────
+    def reserve(self, tags: dict, dist: float):
+        key = tags_key(tags)
+        with self._lock:
+            plan = self._planned.setdefault(key, [tags, 0, 0])
+            plan[1] = max(plan[1], dist)
+            plan[2] += 1
+
+    def reserve_all(self, layers):
+        for tags, dist in layers:
+            self.reserve(tags, dist)
+
+    def _kept(self, tags, dist):
+        for have, have_dist, gdf in self._layers.values():
+            if have_dist >= dist and _covers(have, tags):
+                return have, gdf
+        return None
+
+    def _clip(self, have, gdf, tags, dist):
+        lat, lon = self._center
+        if have != tags:
+            gdf = gdf[_match(gdf, tags)]
+        gdf = gdf[gdf.intersects(box(*ox.utils_geo.bbox_from_point((lat, lon), dist)))]
+        if gdf.empty:
+            raise InsufficientResponseError("No matching features within the requested radius.")
+        return gdf
+
+    @property
+    def _center(self):
+        lon, lat = self.location()
+        return lat, lon
+
+    def features(self, tags: dict, dist: float) -> gpd.GeoDataFrame:
+        key = tags_key(tags)
+        with self._lock:
+            kept = self._kept(tags, dist)
+            plan = self._planned.get(key)
+            lock = self._layer_locks.setdefault(key, threading.Lock())
+        if kept is not None:
+            self.hits += 1
+            return self._clip(*kept, tags, dist)
+
+        if plan is None or plan[2] < 2:
+            self.fetches += 1
+            return fetch_features(self._center, dist, tags)
+
+        # Shared layer: one fetch at the planned radius, concurrent callers wait.
+        with lock:
+            with self._lock:
+                kept = self._kept(tags, dist)
+            if kept is None:
+                fetch_r = max(dist, plan[1])
+                self.fetches += 1
+                try:
+                    gdf = fetch_features(self._center, fetch_r, tags)
+                except InsufficientResponseError:
+                    gdf = gpd.GeoDataFrame(geometry=[], crs=4326)
+                log.info(f"site bundle: fetched {key} @ {fetch_r:.0f}m → {len(gdf)} rows")
+                with self._lock:
+                    self._layers[key] = (tags, fetch_r, gdf)
+                kept = (tags, gdf)
+            else:
+                self.hits += 1
+        return self._clip(*kept, tags, dist)
+
+    def prefetch(self, workers: int = 4):
+        """Resolve the site and fetch every shared layer now (errors are left
+        for the generators to hit and report)."""
+        try:
+            self.location()
+            self.lot_boundary(None)
+            if _extents_key(self.extents) is not None:
+                self.lot_boundary(self.extents)
+        except Exception as e:
+            log.warning(f"site bundle: resolve failed: {e}")
+            return self
+        with self._lock:
+            shared = [(tags, dist) for tags, dist, n in self._planned.values() if n >= 2]
+
+        def _one(spec):
+            try:
+                self.features(*spec)
+            except Exception as e:
+                log.debug(f"site bundle: prefetch {spec[0]} failed: {e}")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(_one, shared))
+        return self
+
+    def snapshot(self, layers=()):
+        """Copy holding the resolved site plus only the kept layers that
+        answer `layers` — what a worker process needs for one generator."""
+        with self._lock:
+            out = SiteBundle.__new__(SiteBundle)
+            out.__setstate__(self.__getstate__())
+            out._planned = {}
+            out._lots    = dict(self._lots)
+            out._layers  = {}
+            out.fetches = out.hits = 0
+            for tags, dist in layers:
+                for key, (have, have_dist, gdf) in self._layers.items():
+                    if have_dist >= dist and _covers(have, tags):
+                        out._layers[key] = (have, have_dist, gdf)
+                        break
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"layers": len(self._layers), "fetches": self.fetches,
+                    "hits": self.hits}
+
+
+# ── Generator helpers (bundle may be None) ────────────────────
+def site_location(bundle, data_type, value, lon=None, lat=None,
+                  lot_ids=None, extents=None):
+    if bundle is not None:
+        return bundle.location()
+    return resolve_location(data_type, value, lon, lat, lot_ids, extents)
+
+
+def lot_boundary(bundle, lon, lat, data_type, extents=None):
+    if bundle is not None:
+        return bundle.lot_boundary(extents)
+    return get_lot_boundary(lon, lat, data_type, extents)
+
+
+def features_from_point(bundle, center_point, dist, tags):
+    if bundle is not None:
+        return bundle.features(tags, dist)
+    return fetch_features(center_point, dist, tags)
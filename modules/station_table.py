@@ -0,0 +1,160 @@
+"""
+modules/station_table.py
+──────────────────────────────────────────────────────────────────────────────
+Precomputed node → nearest-station table for an offline street graph.
+
+MTR stations are a small fixed set, so prepare_station_tables.py runs one
+multi-source search per graph (scipy.sparse.csgraph, stations in chunks)
+and stores, for every node, its k nearest stations by network cost:
+
+  data/graphs/<network_type>/
+      stations.json        k, weight, station list (name, lon, lat, node),
+                           node count and edge cost checksum of the graph
+      station_near.npy     int16   station index per node, -1 = none   (N, k)
+      station_cost.npy     float32 cost node → station (weight units)   (N, k)
+      station_length.npy   float32 metres along that path               (N, k)
+
+Costs run node → station (site to station), so on the one-way drive graph
+they are the egress direction. Walk costs are metres, drive costs are
+travel_time minutes (graph_store speeds). GraphStore loads the table with
+the graph, and drops it when the graph was rebuilt or its speeds changed
+since; batch accessibility scoring then reads a site's stations off its
+snapped node instead of searching.
+"""
+
+import os
+import json
+import time
+import logging
+
+import numpy as np
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, connected_components
+from scipy.spatial import cKDTree
+
+log = logging.getLogger(__name__)
+
+_M_PER_DEG = 6371009 * np.pi / 180
+_FILES     = ("station_near", "station_cost", "station_length")
+
+
+def _cost_checksum(cost) -> float:
+    return round(float(np.sum(cost, dtype=np.float64)), 3)
+
+
+def _edge_cost(store, weight):
+    return store.edge_travel_time if weight == "travel_time" else store.edge_length
+
+
+def _path_lengths(pred, keys, lengths, n):
+    """Metres from each node to the search root following pred (a row of
+    csgraph predecessors on the transposed graph) by pointer jumping."""
+    nodes = np.arange(n)
+    ok    = pred >= 0
+    jump  = np.where(ok, pred, nodes)
+    acc   = np.zeros(n)
+    acc[ok] = lengths[np.searchsorted(keys, nodes[ok] * n + pred[ok])]
+    while True:
+        nxt = jump[jump]
+        if np.array_equal(nxt, jump):
+            return acc
+        acc  = acc + acc[jump]
+        jump = nxt
+
+
+def build_station_table(store, stations, k: int = 3, chunk: int = 16):
+    """
+    stations: [(name, lon, lat), ...]. Writes the table into store.root.
+    Stations snap to the nearest node of the graph's largest component.
+    """
+    weight = "length" if store.network_type == "walk" else "travel_time"
+    u, v, cost, length, keys = store.directed_edges(weight)
+    n = len(store.node_id)
+    C = csr_matrix((cost, (u, v)), shape=(n, n))
+
+    _, comp = connected_components(C, directed=True, connection="weak")
+    main = np.flatnonzero(comp == np.bincount(comp).argmax())
+    x, y = np.asarray(store.node_x), np.asarray(store.node_y)
+    kx   = _M_PER_DEG * np.cos(np.radians(y.mean()))
+    tree = cKDTree(np.column_stack([x[main] * kx, y[main] * _M_PER_DEG]))
+    sx   = np.array([s[1] for s in stations]) * kx
+    sy   = np.array([s[2] for s in stations]) * _M_PER_DEG
+    st_node = main[tree.query(np.column_stack([sx, sy]))[1]]
+
+    best_st   = np.full((n, k), -1, dtype=np.int16)
+    best_cost = np.full((n, k), np.inf)
+    best_len  = np.full((n, k), np.inf)
+    CT = C.T.tocsr()                  # search backwards: cost node → station
+    for start in range(0, len(stations), chunk):
+        idx = np.arange(start, min(start + chunk, len(stations)))
+        D, P = dijkstra(CT, directed=True, indices=st_node[idx],
+                        return_predecessors=True)
+        L = np.vstack([_path_lengths(P[i], keys, length, n) for i in range(len(idx))])
+        cand_st   = np.hstack([best_st, np.broadcast_to(idx, (n, len(idx)))])
+        cand_cost = np.hstack([best_cost, D.T])
+        cand_len  = np.hstack([best_len, L.T])
+        top = np.argsort(cand_cost, axis=1, kind="stable")[:, :k]
+        best_st   = np.take_along_axis(cand_st, top, axis=1).astype(np.int16)
+        best_cost = np.take_along_axis(cand_cost, top, axis=1)
+        best_len  = np.take_along_axis(cand_len, top, axis=1)
+        log.info(f"station table: {idx[-1] + 1}/{len(stations)} stations")
+
+    none = ~np.isfinite(best_cost)
+    best_st[none] = -1
+    np.save(os.path.join(store.root, "station_near.npy"), best_st)
+    np.save(os.path.join(store.root, "station_cost.npy"),
+            np.where(none, np.nan, best_cost).astype(np.float32))
+    np.save(os.path.join(store.root, "station_length.npy"),
+            np.where(none, np.nan, best_len).astype(np.float32))
+    meta = {
+        "k":        k,
+        "weight":   weight,
+        "stations": [{"name": s[0], "lon": float(s[1]), "lat": float(s[2]),
+                      "node": int(store.node_id[st_node[i]])}
+                     for i, s in enumerate(stations)],
+        "nodes":    n,
+        "checksum": _cost_checksum(_edge_cost(store, weight)),
+        "built":    time.time(),
+    }
+    with open(os.path.join(store.root, "stations.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+class StationTable:
+    def __init__(self, root: str):
+        with open(os.path.join(root, "stations.json")) as f:
+            self.meta = json.load(f)
+        self.k      = self.meta["k"]
+        self.weight = self.meta["weight"]
+        self.names  = [s["name"] for s in self.meta["stations"]]
+        self.near, self.cost, self.length = (
+            np.load(os.path.join(root, f"{name}.npy"), mmap_mode="r") for name in _FILES)
+
+    @classmethod
+    def load(cls, root: str, store):
+        """StationTable for a store, or None when missing or built for another
+        graph (rows follow node indices, costs follow edge costs)."""
+        if not all(os.path.exists(os.path.join(root, f))
+                   for f in ("stations.json",) + tuple(f"{n}.npy" for n in _FILES)):
+            return None
+        try:
+            table = cls(root)
+        except Exception as e:
+            log.warning(f"station table: cannot load {root}: {e}")
+            return None
+        cost = _edge_cost(store, table.weight)
+        if (table.meta.get("nodes") != len(store.node_id) or cost is None
+                or _cost_checksum(cost) != table.meta.get("checksum")):
+            log.warning(f"station table: {root} was built for another graph or "
+                        f"other edge costs — ignored, rerun prepare_station_tables.py")
+            return None
+        return table
+
+    def lookup(self, idx):
+        """(station index, cost, metres) arrays of shape (len(idx), k) for
+        store node indices; index -1 / NaN where no station is reachable."""
+        idx = np.asarray(idx, dtype=np.int64)
+        return (np.asarray(self.near[idx]), np.asarray(self.cost[idx]),
+                np.asarray(self.length[idx]))
@@ -37,7 +37,7 @@ from io import BytesIO
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from PIL import Image
 
-from modules.resolver import resolve_location, get_lot_boundary
+from modules.site_bundle import site_location, lot_boundary, features_from_point
 
 ox.settings.use_cache        = True
 ox.settings.log_console      = False
@@ -203,11 +203,11 @@ def _keep_lines(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
 # ── Safe fetch ────────────────────────────────────────────────────────────────
 
 def _safe_fetch(lat: float, lon: float, dist: int, tags: dict,
-                timeout: int = 25) -> gpd.GeoDataFrame:
+                timeout: int = 25, bundle=None) -> gpd.GeoDataFrame:
     try:
         old_t = ox.settings.requests_timeout
         ox.settings.requests_timeout = timeout
-        gdf = ox.features_from_point((lat, lon), dist=dist, tags=tags)
+        gdf = features_from_point(bundle, (lat, lon), dist, tags)
         ox.settings.requests_timeout = old_t
         if gdf is not None and not gdf.empty:
             result = gdf.to_crs(3857)
@@ -249,13 +249,14 @@ def _clean_name(val) -> Optional[str]:
 
 # ── MTR route fetch ───────────────────────────────────────────────────────────
 
-def _fetch_mtr_routes(lat: float, lon: float, dist: int) -> gpd.GeoDataFrame:
+def _fetch_mtr_routes(lat: float, lon: float, dist: int,
+                      bundle=None) -> gpd.GeoDataFrame:
     frames = []
 
     for src_tag, tags in [("rail",   {"railway": "rail"}),
                            ("subway", {"railway": "subway"})]:
         try:
-            raw = _safe_fetch(lat, lon, dist, tags, timeout=30)
+            raw = _safe_fetch(lat, lon, dist, tags, timeout=30, bundle=bundle)
             if raw.empty:
                 continue
             flat = _flatten(raw)
@@ -303,6 +304,12 @@ def _fetch_mtr_routes(lat: float, lon: float, dist: int) -> gpd.GeoDataFrame:
         return gpd.GeoDataFrame(geometry=[], crs=3857)
 
 
+def osm_layers(data_type: str, radius_m: Optional[int] = None):
+    """(tags, dist) pairs generate_transport fetches — see SiteBundle.reserve."""
+    fetch_r = radius_m if radius_m else FETCH_RADIUS
+    return [({"railway": "station"}, fetch_r)]
+
+
 # ── Main generator ────────────────────────────────────────────────────────────
 
 def generate_transport(
@@ -313,14 +320,15 @@ def generate_transport(
     lot_ids: List[str] = None,
     extents: List[dict] = None,
     radius_m: Optional[int] = None,
+    bundle=None,
 ):
-    lon, lat = resolve_location(data_type, value, lon, lat, lot_ids, extents)
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
     fetch_r  = radius_m if radius_m else FETCH_RADIUS
     log.info(f"[transport] {data_type} {value} → lon={lon:.5f} lat={lat:.5f} r={fetch_r}m")
 
     # ── Site polygon ──────────────────────────────────────────────────────────
     try:
-        lot_gdf = get_lot_boundary(lon, lat, data_type, extents)
+        lot_gdf = lot_boundary(bundle, lon, lat, data_type, extents)
     except Exception as e:
         log.warning(f"[transport] get_lot_boundary: {e}")
         lot_gdf = None
@@ -344,15 +352,16 @@ def generate_transport(
     log.info("[transport] Fetching roads...")
     roads = _keep_lines(_flatten(_safe_fetch(lat, lon, fetch_r, {
         "highway": ["motorway", "trunk", "primary", "secondary", "tertiary"],
-    }, timeout=25)))
+    }, timeout=25, bundle=bundle)))
     gc.collect()
 
     log.info("[transport] Fetching MTR routes...")
-    mtr_routes = _fetch_mtr_routes(lat, lon, fetch_r)
+    mtr_routes = _fetch_mtr_routes(lat, lon, fetch_r, bundle=bundle)
     gc.collect()
 
     log.info("[transport] Fetching stations...")
-    stations = _flatten(_safe_fetch(lat, lon, fetch_r, {"railway": "station"}, timeout=25))
+    stations = _flatten(_safe_fetch(lat, lon, fetch_r, {"railway": "station"},
+                                    timeout=25, bundle=bundle))
     gc.collect()
 
     log.info("[transport] Rendering...")
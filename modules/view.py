@@ -14,7 +14,7 @@ from matplotlib.patches import Wedge, Patch
 from io import BytesIO
 
 # IMPORT UNIVERSAL RESOLVER
-from modules.resolver import resolve_location, get_lot_boundary
+from modules.site_bundle import site_location, lot_boundary, features_from_point
 
 ox.settings.use_cache = True
 ox.settings.log_console = False
@@ -600,13 +600,18 @@ def _draw_panel(ax, center, site_geom, buildings, parks, water,
     ax.set_axis_off()
 
 
+def osm_layers(data_type: str):
+    """(tags, dist) pairs generate_view fetches — see SiteBundle.reserve."""
+    return [({"building": True}, 60)]
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # MAIN GENERATOR  (called by the API)
 # ══════════════════════════════════════════════════════════════════════════════
 
 def generate_view(data_type: str, value: str, BUILDING_DATA: gpd.GeoDataFrame,
                   lon: float = None, lat: float = None,
-                  lot_ids: list = None, extents: list = None):
+                  lot_ids: list = None, extents: list = None, bundle=None):
     """
     Generate a dual-panel (MID HEIGHT / MAX HEIGHT) view-analysis map.
 
@@ -618,6 +623,7 @@ def generate_view(data_type: str, value: str, BUILDING_DATA: gpd.GeoDataFrame,
     lon, lat      : optional override coordinates (EPSG:4326)
     lot_ids       : optional lot ID list for resolver
     extents       : optional extent list for resolver
+    bundle        : optional SiteBundle shared with the other analyses
 
     Returns
     -------
@@ -625,11 +631,11 @@ def generate_view(data_type: str, value: str, BUILDING_DATA: gpd.GeoDataFrame,
     """
 
     # ── 1. Resolve location ────────────────────────────────────────────────────
-    lon, lat = resolve_location(data_type, value, lon, lat, lot_ids, extents)
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
     log.info("[view] site coordinate (lon, lat) = (%.6f, %.6f)", lon, lat)
 
     # ── 2. Site polygon ────────────────────────────────────────────────────────
-    lot_gdf = get_lot_boundary(lon, lat, data_type)
+    lot_gdf = lot_boundary(bundle, lon, lat, data_type)
     if lot_gdf is not None:
         site_geom = lot_gdf.geometry.iloc[0]
         center    = site_geom.centroid
@@ -647,8 +653,8 @@ def generate_view(data_type: str, value: str, BUILDING_DATA: gpd.GeoDataFrame,
                 "[view] buildings intersecting lot polygon: count=0, HEIGHT_M max=n/a"
             )
     else:
-        site_building = ox.features_from_point(
-            (lat, lon), dist=60, tags={"building": True}
+        site_building = features_from_point(
+            bundle, (lat, lon), 60, {"building": True}
         ).to_crs(3857)
 
         if len(site_building):
@@ -675,8 +681,8 @@ def generate_view(data_type: str, value: str, BUILDING_DATA: gpd.GeoDataFrame,
         can still proceed.
         """
         try:
-            gdf = ox.features_from_point(
-                (lat, lon), dist=FETCH_RADIUS, tags=tags
+            gdf = features_from_point(
+                bundle, (lat, lon), FETCH_RADIUS, tags
             ).to_crs(3857)
             if gdf is None or gdf.empty:
                 log.info(
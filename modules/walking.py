@@ -8,7 +8,6 @@ import geopandas as gpd
 import contextily as cx
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
-import networkx as nx
 import numpy as np
 
 from matplotlib.patches import Circle
@@ -16,7 +15,11 @@ from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from shapely.geometry import Point
 from io import BytesIO
 
-from modules.resolver import resolve_location, get_lot_boundary
+from modules.site_bundle import site_location, lot_boundary, features_from_point
+from modules.graph_store import graph_from_point
+from modules.projected import projected, nearest_nodes
+from modules.routing import PathTree, route_array
+from modules.isochrone import isochrones, node_costs
 from modules.ring_configs import WALK_RING_CONFIGS as RING_CONFIGS
 
 ox.settings.log_console = False
@@ -26,6 +29,7 @@ os.environ.setdefault("OMP_NUM_THREADS", "1")
 os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
 
 WALK_SPEED_KMPH = 5
+ISO_BUFFER_M    = 25    # half-width of the street corridor in isochrone polygons
 
 _STATIC_DIR    = os.path.join(os.path.dirname(__file__), "..", "static")
 _MTR_LOGO_PATH = os.path.join(_STATIC_DIR, "HK_MTR_logo.png")
@@ -60,11 +64,7 @@ def _add_mtr_icon(ax, x, y, size=0.04, zorder=15):
                 zorder=zorder+1, transform=ax.transData)
 
 
-def generate_walking(data_type: str, value: str,
-                     max_walk_minutes: int = 5,
-                     lon: float = None, lat: float = None,
-                     lot_ids: list = None, extents: list = None):
-
+def _ring_config(max_walk_minutes):
     try:
         max_walk_minutes = int(max_walk_minutes)
     except (TypeError, ValueError):
@@ -72,22 +72,38 @@ def generate_walking(data_type: str, value: str,
     max_walk_minutes = max(5, min(20, max_walk_minutes))
     if max_walk_minutes not in RING_CONFIGS:
         max_walk_minutes = 15
-    cfg        = RING_CONFIGS[max_walk_minutes]
-    MAP_EXTENT = cfg["map_extent"]
-    MAP_EXTENT_X = MAP_EXTENT * (992 / 737)
-    MAP_EXTENT_Y = MAP_EXTENT
+    return RING_CONFIGS[max_walk_minutes]
+
+
+def _station_fetch_r(cfg, data_type):
+    station_fetch_r = max(int(cfg["shade_r"] * 1.5), 1200)
+    if data_type.upper() == "ADDRESS":
+        station_fetch_r = max(station_fetch_r, 2000)
+    return station_fetch_r
+
+
+def osm_layers(data_type: str, max_walk_minutes: int = 5):
+    """(tags, dist) pairs generate_walking fetches — see SiteBundle.reserve."""
+    cfg = _ring_config(max_walk_minutes)
+    return [({"building": True}, 60),
+            ({"railway": "station"}, _station_fetch_r(cfg, data_type))]
 
-    lon, lat = resolve_location(data_type, value, lon, lat, lot_ids, extents)
 
-    lot_gdf = get_lot_boundary(lon, lat, data_type, extents)
+def _site(bundle, data_type, value, lon, lat, lot_ids, extents):
+    """Resolved (lon, lat) and the site polygon the map draws →
+    (lon, lat, site_geom, site_gdf, site_point); routes and isochrones
+    start from site_point, the polygon's centroid."""
+    lon, lat = site_location(bundle, data_type, value, lon, lat, lot_ids, extents)
+
+    lot_gdf = lot_boundary(bundle, lon, lat, data_type, extents)
     if lot_gdf is not None:
         site_geom  = lot_gdf.geometry.iloc[0]
         site_gdf   = lot_gdf
         site_point = site_geom.centroid
     else:
         try:
-            osm_site = ox.features_from_point(
-                (lat, lon), dist=60, tags={"building": True}
+            osm_site = features_from_point(
+                bundle, (lat, lon), 60, {"building": True}
             ).to_crs(3857)
             if len(osm_site):
                 osm_site["area_calc"] = osm_site.geometry.area
@@ -105,29 +121,83 @@ def generate_walking(data_type: str, value: str,
 
         site_gdf   = gpd.GeoDataFrame(geometry=[site_geom], crs=3857)
         site_point = site_geom.centroid
+    return lon, lat, site_geom, site_gdf, site_point
+
+
+def _band_limits(cfg):
+    """Walking distances with a polygon on the map: the rings and the shade."""
+    return sorted({r for r, _ in cfg["rings"]} | {cfg["shade_r"]})
+
+
+def _bands(G_walk, costs, cfg, site_point):
+    """Network isochrone per band limit; the configured Euclidean circle
+    where the graph gives no usable polygon."""
+    limits = _band_limits(cfg)
+    try:
+        polys = isochrones(G_walk, costs, limits,
+                           weight="length", buffer_m=ISO_BUFFER_M)
+    except Exception:
+        polys = [None] * len(limits)
+    return {r: poly if poly is not None and not poly.is_empty else site_point.buffer(r)
+            for r, poly in zip(limits, polys)}
+
+
+def isochrone_bands(data_type: str, value: str,
+                    lon: float = None, lat: float = None,
+                    lot_ids: list = None, extents: list = None,
+                    max_walk_minutes: int = 5, bundle=None):
+    """The isochrone polygons generate_walking draws for this site →
+    (EPSG:3857 polygons, band properties), smallest band first."""
+    cfg = _ring_config(max_walk_minutes)
+    lon, lat, _, _, site_point = _site(bundle, data_type, value,
+                                       lon, lat, lot_ids, extents)
+    G = graph_from_point((lat, lon), dist=cfg["walk_dist"],
+                         network_type="walk", simplify=True)
+    source = nearest_nodes(G, site_point.x, site_point.y, crs=3857)
+    limits = _band_limits(cfg)
+    costs  = node_costs(G, source, limits[-1], weight="length")
+    bands  = _bands(G, costs, cfg, site_point)
+    labels = {r: lbl.replace("\n", " ") for r, lbl in cfg["rings"]}
+    props  = [{"distance_m": r,
+               "minutes":    round(r / (WALK_SPEED_KMPH * 1000 / 60), 1),
+               "label":      labels.get(r, "shade"),
+               "shade":      r == cfg["shade_r"]} for r in limits]
+    return [bands[r] for r in limits], props
+
+
+def generate_walking(data_type: str, value: str,
+                     max_walk_minutes: int = 5,
+                     lon: float = None, lat: float = None,
+                     lot_ids: list = None, extents: list = None,
+                     bundle=None):
+
+    cfg        = _ring_config(max_walk_minutes)
+    MAP_EXTENT = cfg["map_extent"]
+    MAP_EXTENT_X = MAP_EXTENT * (992 / 737)
+    MAP_EXTENT_Y = MAP_EXTENT
+
+    lon, lat, site_geom, site_gdf, site_point = _site(
+        bundle, data_type, value, lon, lat, lot_ids, extents)
 
     gc.collect()
 
-    G_walk = ox.graph_from_point(
+    G_walk = graph_from_point(
         (lat, lon),
         dist=cfg["walk_dist"],
         network_type="walk",
         simplify=True
     )
-    roads = ox.graph_to_gdfs(G_walk, nodes=False).to_crs(3857)
+    roads = gpd.GeoSeries(projected(G_walk).lines, crs=3857)
 
-    site_wgs  = gpd.GeoSeries([site_point], crs=3857).to_crs(4326).iloc[0]
-    site_node = ox.distance.nearest_nodes(G_walk, site_wgs.x, site_wgs.y)
+    site_node = nearest_nodes(G_walk, site_point.x, site_point.y, crs=3857)
 
-    station_fetch_r = max(int(cfg["shade_r"] * 1.5), 1200)
-    if data_type.upper() == "ADDRESS":
-        station_fetch_r = max(station_fetch_r, 2000)
+    station_fetch_r = _station_fetch_r(cfg, data_type)
 
     stations = gpd.GeoDataFrame()
     for search_r in [station_fetch_r, 3000, 5000]:
         try:
-            found = ox.features_from_point(
-                (lat, lon), tags={"railway": "station"}, dist=search_r
+            found = features_from_point(
+                bundle, (lat, lon), search_r, {"railway": "station"}
             ).to_crs(3857)
             found = found[found.geometry.notnull()]
             if not found.empty:
@@ -152,17 +222,24 @@ def generate_walking(data_type: str, value: str,
 
     gc.collect()
 
+    # Snap every station in one batched lookup.
+    if len(stations):
+        st_cen   = stations.geometry.centroid
+        stations = stations.assign(
+            node=nearest_nodes(G_walk, st_cen.x.values, st_cen.y.values, crs=3857))
+
+    # One shortest-path tree from the site serves every station route.
+    tree   = PathTree(G_walk, site_node, weight="length")
     routes = []
     for _, row in stations.iterrows():
         st_centroid = row.geometry.centroid
-        st_wgs      = gpd.GeoSeries([st_centroid], crs=3857).to_crs(4326).iloc[0]
-        st_node     = ox.distance.nearest_nodes(G_walk, st_wgs.x, st_wgs.y)
         try:
-            path  = nx.shortest_path(G_walk, site_node, st_node, weight="length")
-            route = ox.routing.route_to_gdf(G_walk, path).to_crs(3857)
+            route = route_array(G_walk, tree.path(row["node"]))
         except Exception:
             continue
-        dist_km  = round(route.length.sum() / 1000, 2)
+        if route is None:
+            continue
+        dist_km  = round(route.metres / 1000, 2)
         time_min = max(1, round((dist_km / WALK_SPEED_KMPH) * 60))
         routes.append({
             "route": route, "distance": dist_km, "time": time_min,
@@ -171,6 +248,9 @@ def generate_walking(data_type: str, value: str,
             "name": row["station_name"]
         })
 
+    # ── Network isochrones (ring radii as walking distance) ───────────────────
+    bands = _bands(G_walk, tree.dist, cfg, site_point)
+
     # ── Plot ───────────────────────────────────────────────────────────────────
     fig, ax = plt.subplots(figsize=(20, 15))
 
@@ -190,13 +270,16 @@ def generate_walking(data_type: str, value: str,
     gc.collect()
 
     # ── Isochrone shade + rings ────────────────────────────────────────────────
-    gpd.GeoSeries([site_point.buffer(cfg["shade_r"])], crs=3857).plot(
+    # Network isochrones when the graph gave usable polygons, otherwise the
+    # configured Euclidean circles.
+    gpd.GeoSeries([bands[cfg["shade_r"]]], crs=3857).plot(
         ax=ax, color="#2aa9ff", alpha=0.15, zorder=3)
 
     for ring_r, ring_lbl in cfg["rings"]:
-        gpd.GeoSeries([site_point.buffer(ring_r)], crs=3857).boundary.plot(
+        ring = bands[ring_r]
+        gpd.GeoSeries([ring], crs=3857).boundary.plot(
             ax=ax, linestyle=(0, (4, 3)), linewidth=2, color="#2aa9ff", zorder=4)
-        ax.text(site_point.x + ring_r + 30, site_point.y,
+        ax.text(ring.bounds[2] + 30, site_point.y,
                 ring_lbl, fontsize=10, color="black", weight="bold",
                 va="center", zorder=10, clip_on=False)
 
@@ -204,7 +287,7 @@ def generate_walking(data_type: str, value: str,
 
     for i, r in enumerate(routes):
         rc = colors[i % len(colors)]
-        r["route"].plot(ax=ax, linewidth=2.8, color=rc, alpha=0.85, zorder=5)
+        r["route"].plot(ax, linewidth=2.8, color=rc, alpha=0.85, zorder=5)
 
         sg = r["station_polygon"]
         if sg.geom_type == "Point":
@@ -212,8 +295,8 @@ def generate_walking(data_type: str, value: str,
         gpd.GeoSeries([sg], crs=3857).plot(
             ax=ax, facecolor=rc, edgecolor=rc, linewidth=1, alpha=0.25, zorder=4)
 
-        mid = r["route"].geometry.iloc[len(r["route"]) // 2].centroid
-        ax.text(mid.x, mid.y, f"{r['time']} min\n{r['distance']} km",
+        mid_x, mid_y = r["route"].point_at(0.5)
+        ax.text(mid_x, mid_y, f"{r['time']} min\n{r['distance']} km",
                 fontsize=9, weight="bold", color=rc, ha="center", zorder=6)
 
         icon_x = r["station_centroid"].x
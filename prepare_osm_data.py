@@ -11,8 +11,13 @@ Downloads HK OSM extract from Geofabrik and extracts:
     data/osm/landuse.gpkg     — landuse + leisure polygons
     data/osm/amenities.gpkg   — amenity, tourism, shop points + polygons
     data/osm/transport.gpkg   — bus stops (points) + MTR stations (polygons)
+    data/graphs/walk/, data/graphs/drive/
+                              — street graphs for modules/graph_store.py,
+                                with nearest-station tables
+                                (prepare_station_tables.py)
 
-All outputs in EPSG:4326. context.py reprojects to 3857 at load time.
+All outputs in EPSG:4326. modules/osm_store.py serves them to the analysis
+modules in place of Overpass (see OSM_LOCAL / OSM_DATA_DIR in app.py).
 Total file size estimate: ~80–120 MB for HK island + Kowloon.
 """
 
@@ -36,7 +41,8 @@ except FileExistsError:
         os.remove(OUT_DIR)
         Path(OUT_DIR).mkdir(parents=True, exist_ok=True)
 
-PBF_PATH = os.path.join(OUT_DIR, "hong-kong-latest.osm.pbf")
+PBF_PATH  = os.path.join(OUT_DIR, "hong-kong-latest.osm.pbf")
+GRAPH_DIR = os.path.join(os.path.dirname(__file__), "data", "graphs")
 
 # ── HK bounding box (WGS84) ───────────────────────────────────────────────────
 # Covers HK Island, Kowloon, New Territories
@@ -262,6 +268,28 @@ class TransportHandler(osmium.SimpleHandler):
             pass
 
 
+class HighwayHandler(osmium.SimpleHandler):
+    """Collect highway ways with their node coordinates for the graph store."""
+    KEEP_TAGS = ("highway", "area", "access", "foot", "service", "sidewalk",
+                 "sidewalk:both", "sidewalk:left", "sidewalk:right",
+                 "motor_vehicle", "motorcar", "oneway", "junction", "maxspeed")
+
+    def __init__(self):
+        super().__init__()
+        self.ways = []
+
+    def way(self, w):
+        if "highway" not in w.tags:
+            return
+        tags = {k: w.tags[k] for k in self.KEEP_TAGS if k in w.tags}
+        try:
+            nodes = [(n.ref, n.location.lon, n.location.lat) for n in w.nodes]
+        except osmium.InvalidLocationError:
+            nodes = [(n.ref, n.location.lon, n.location.lat)
+                     for n in w.nodes if n.location.valid()]
+        self.ways.append((w.id, tags, nodes))
+
+
 # ============================================================
 # STEP 3 — Parse PBF and write GeoPackages
 # ============================================================
@@ -288,15 +316,34 @@ def parse_and_save(handler_cls, out_path, label):
     print(f"  Saved: {os.path.getsize(out_path)/1e6:.1f} MB")
 
 
+def build_graphs():
+    from modules.graph_store import build_graph
+
+    print("\nParsing street network...")
+    h = HighwayHandler()
+    h.apply_file(PBF_PATH, locations=True, idx="flex_mem")
+    print(f"  {len(h.ways):,} highway ways")
+    for network_type in ("walk", "drive"):
+        out_dir = os.path.join(GRAPH_DIR, network_type)
+        meta = build_graph(h.ways, network_type, out_dir)
+        size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+        print(f"  {network_type}: {meta['nodes']:,} nodes, {meta['edges']:,} edges "
+              f"→ {out_dir} ({size/1e6:.1f} MB)")
+
+
 def main():
     download_pbf()
     parse_and_save(BuildingHandler, os.path.join(OUT_DIR, "buildings.gpkg"),  "buildings")
     parse_and_save(LanduseHandler,  os.path.join(OUT_DIR, "landuse.gpkg"),    "landuse")
     parse_and_save(AmenityHandler,  os.path.join(OUT_DIR, "amenities.gpkg"),  "amenities")
     parse_and_save(TransportHandler,os.path.join(OUT_DIR, "transport.gpkg"),  "transport")
+    build_graphs()
+
+    from prepare_station_tables import build_station_tables
+    build_station_tables()
 
     print("\n✓ All GeoPackages ready.")
-    print("Copy data/osm/ to your Render project and redeploy.")
+    print("Copy data/osm/ and data/graphs/ to your Render project and redeploy.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+"""
+prepare_station_tables.py — Precompute nearest-station tables for the
+offline street graphs. Run after prepare_osm_data.py (which also calls it).
+
+Usage:
+    python prepare_station_tables.py [k]
+
+Reads the MTR / rail stations from data/osm/transport.gpkg and, for every
+node of data/graphs/walk/ and data/graphs/drive/, stores its k nearest
+stations (default 3) by network distance / drive time. See
+modules/station_table.py for the file layout; POST /accessibility/batch
+uses the tables instead of searching per request.
+"""
+
+import os
+import sys
+import time
+
+import geopandas as gpd
+
+from modules.graph_store import GraphStore
+from modules.station_table import build_station_table
+
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+OSM_DIR   = os.path.join(BASE_DIR, "data", "osm")
+GRAPH_DIR = os.path.join(BASE_DIR, "data", "graphs")
+
+
+def load_stations():
+    """One (name, lon, lat) per named station — the area when there is one."""
+    gdf = gpd.read_file(os.path.join(OSM_DIR, "transport.gpkg"),
+                        where="railway = 'station'", engine="pyogrio")
+    gdf = gdf[gdf["name"].fillna("") != ""]
+    gdf["_area"] = gdf.to_crs(3857).geometry.area
+    gdf = gdf.sort_values("_area", ascending=False).drop_duplicates("name")
+    cen = gdf.to_crs(3857).geometry.centroid.to_crs(4326)
+    return [(name, pt.x, pt.y) for name, pt in zip(gdf["name"], cen)]
+
+
+def build_station_tables(k: int = 3):
+    stations = load_stations()
+    print(f"\nStation tables: {len(stations)} stations, k={k}")
+    for network_type in ("walk", "drive"):
+        store = GraphStore.load(os.path.join(GRAPH_DIR, network_type))
+        if store is None:
+            print(f"  {network_type}: no graph — run prepare_osm_data.py first")
+            continue
+        t0 = time.time()
+        build_station_table(store, stations, k=k)
+        print(f"  {network_type}: {store.meta['nodes']:,} nodes in {time.time() - t0:.0f}s")
+
+
+if __name__ == "__main__":
+    build_station_tables(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,66 @@
+"""
+Shared fixtures: small synthetic street graphs written with
+graph_store.build_graph, so the routing and table code runs without
+Overpass or the prepared data/graphs directory.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.graph_store import build_graph, GraphStore
+
+N, STEP = 24, 0.0008
+LON0, LAT0 = 114.05, 22.27
+HIGHWAYS = ["residential", "tertiary", "secondary", "primary", "trunk"]
+
+
+def grid_ways(seed: int = 5):
+    """A jittered N × N street grid with mixed classes, one-ways and
+    maxspeeds. Node positions are jittered so shortest paths are unique."""
+    rng = np.random.default_rng(seed)
+    pos = {(i, j): (LON0 + j * STEP + rng.normal(0, 4e-5),
+                    LAT0 + i * STEP + rng.normal(0, 4e-5))
+           for i in range(N) for j in range(N)}
+
+    def nid(i, j):
+        return i * 1000 + j + 1
+
+    ways, wid = [], 1
+    for i in range(N):
+        tags = {"highway": HIGHWAYS[rng.integers(len(HIGHWAYS))]}
+        if rng.random() < 0.3:
+            tags["oneway"] = "yes"
+        if rng.random() < 0.2:
+            tags["maxspeed"] = str(rng.choice([30, 50, 70]))
+        ways.append((wid, tags, [(nid(i, j), *pos[i, j]) for j in range(N)]))
+        wid += 1
+    for j in range(N):
+        tags = {"highway": HIGHWAYS[rng.integers(len(HIGHWAYS))]}
+        if rng.random() < 0.3:
+            tags["oneway"] = "-1"
+        ways.append((wid, tags, [(nid(i, j), *pos[i, j]) for i in range(N)]))
+        wid += 1
+    return ways
+
+
+def grid_center():
+    return (LAT0 + N * STEP / 2, LON0 + N * STEP / 2)
+
+
+@pytest.fixture(scope="session")
+def graph_root(tmp_path_factory):
+    root = tmp_path_factory.mktemp("graphs")
+    ways = grid_ways()
+    for network_type in ("walk", "drive"):
+        build_graph(ways, network_type, str(root / network_type))
+    return root
+
+
+@pytest.fixture(scope="session")
+def drive_store(graph_root):
+    return GraphStore.load(str(graph_root / "drive"))
@@ -0,0 +1,19 @@
+import numpy as np
+
+from modules.graph_store import build_graph, GraphStore
+
+from conftest import LON0, LAT0, STEP
+
+
+def test_many_highway_values_round_trip(tmp_path):
+    # one two-node way per highway value, more values than a uint8 holds
+    values = [f"class_{i}" for i in range(300)]
+    ways = [(i + 1, {"highway": hw},
+             [(2 * i + 1, LON0 + i * STEP, LAT0), (2 * i + 2, LON0 + i * STEP, LAT0 + STEP)])
+            for i, hw in enumerate(values)]
+    build_graph(ways, "drive", str(tmp_path))
+    store = GraphStore.load(str(tmp_path))
+
+    assert store.edge_highway.dtype == np.uint16
+    got = store.highway[np.asarray(store.edge_highway)]
+    assert sorted(set(got)) == sorted(values)
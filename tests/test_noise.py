@@ -0,0 +1,83 @@
+import numpy as np
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString, Point
+
+from modules.noise import CFG, PropagationEngine
+
+ORIGIN = np.array([12_711_000.0, 2_545_000.0])      # EPSG:3857, Kowloon
+RADIUS = 150.0
+
+
+def random_roads(n_roads=40, seed=3):
+    """Bent roads crossing the study area, with L_link levels."""
+    rng = np.random.default_rng(seed)
+    R = RADIUS * 1.3
+    geoms = []
+    for _ in range(n_roads):
+        a, b = rng.uniform(-R, R, size=(2, 2))
+        mid  = (a + b) / 2 + rng.normal(0, RADIUS / 6, size=2)
+        geoms.append(LineString(np.array([a, mid, b]) + ORIGIN))
+    return gpd.GeoDataFrame({"L_link": rng.uniform(60, 80, n_roads)},
+                            geometry=geoms, crs=3857)
+
+
+def reference_energy(cfg, X, Y, lines):
+    """The per-segment loop the kernel replaced (scripts/bench_propagation.py)."""
+    G, GC, Rg = cfg["ground_absorption"], cfg["ground_term_coeff"], cfg["base_reflection"]
+    energy = np.zeros_like(X, dtype=np.float64)
+    for coords, L_link in lines:
+        n  = len(coords) - 1
+        le = np.zeros_like(X, dtype=np.float64)
+        for (x1, y1), (x2, y2) in zip(coords[:-1], coords[1:]):
+            dx, dy = x2 - x1, y2 - y1
+            q = dx * dx + dy * dy
+            t = 0.0 if q < 1e-6 else np.clip(((X - x1) * dx + (Y - y1) * dy) / q, 0, 1)
+            d = np.sqrt((X - x1 - t * dx) ** 2 + (Y - y1 - t * dy) ** 2)
+            le += 10 ** ((L_link - 20 * np.log10(d + 1) - G * GC * np.log10(d + 1) + Rg) / 10)
+        energy += le / n
+    return energy
+
+
+@pytest.fixture(scope="module")
+def site():
+    return Point(*ORIGIN).buffer(40)
+
+
+# On this grid 0.05 MB is one segment per chunk, 4 MB (default) 22 with a
+# partial last chunk, 64 MB every segment at once.
+@pytest.mark.parametrize("chunk_mb", [0.05, 4, 64])
+def test_kernel_matches_segment_loop(site, chunk_mb):
+    engine = PropagationEngine(dict(CFG, study_radius=RADIUS, propagation_chunk_mb=chunk_mb))
+    X, Y   = engine._grid(site.buffer(RADIUS).bounds)
+    lines  = engine._extract_lines(random_roads(6))
+    segs   = engine._segments(lines)
+
+    energy, _ = engine._energy(X, Y, segs)
+    ref = reference_energy(engine.cfg, X, Y, lines)
+    assert np.abs(10 * np.log10(energy / ref)).max() < 0.01
+
+
+@pytest.mark.parametrize("cutoff", [30.0, 60.0, 100.0])
+def test_cutoff_energy_within_reported_bound(site, cutoff):
+    engine = PropagationEngine(dict(CFG, study_radius=RADIUS))
+    X, Y   = engine._grid(site.buffer(RADIUS).bounds)
+    segs   = engine._segments(engine._extract_lines(random_roads()))
+
+    full, _ = engine._energy(X, Y, segs)
+    culled, bound, _ = engine._energy_culled(X, Y, segs, cutoff)
+
+    err = np.abs(10 * np.log10(culled / full))
+    assert (err <= 10 * np.log10(1 + bound) + 1e-9).all()
+
+
+@pytest.mark.parametrize("cutoff", [40.0, 100.0])
+def test_cutoff_map_within_reported_error(site, cutoff):
+    cfg  = dict(CFG, study_radius=RADIUS, smooth_sigma=0)
+    full = PropagationEngine(cfg).run(random_roads(), site)[2]
+    engine = PropagationEngine(dict(cfg, propagation_cutoff_m=cutoff))
+    cut  = engine.run(random_roads(), site)[2]
+
+    both = np.isfinite(full) & np.isfinite(cut)
+    assert both.any()
+    assert np.abs(cut - full)[both].max() <= engine.cutoff_error_db + 1e-9
@@ -0,0 +1,30 @@
+import numpy as np
+import networkx as nx
+import pytest
+
+from modules.routing import route_array
+
+from conftest import grid_center, N, STEP
+
+
+@pytest.fixture(scope="module")
+def drive_graph(drive_store):
+    return drive_store.subgraph(grid_center(), N * STEP * 111000 / 2 * 0.9)
+
+
+def test_route_metres_are_ground_lengths(drive_graph):
+    nodes = list(drive_graph.nodes)
+    rng   = np.random.default_rng(1)
+    for _ in range(10):
+        a, b = (nodes[i] for i in rng.integers(len(nodes), size=2))
+        try:
+            path = nx.shortest_path(drive_graph, a, b, weight="length")
+        except nx.NetworkXNoPath:
+            continue
+        route = route_array(drive_graph, path)
+        if route is None:
+            continue
+        # Web-Mercator units overstate distance by 1 / cos(lat), ~8% at 22°N
+        assert route.metres == pytest.approx(
+            nx.path_weight(drive_graph, path, "length"), rel=5e-3)
+        assert route.length > route.metres * 1.05
@@ -0,0 +1,59 @@
+import networkx as nx
+import pytest
+
+from modules import graph_store
+from modules.graph_store import GraphStore, build_graph
+from modules.station_table import build_station_table
+
+from conftest import grid_center, grid_ways, LON0, LAT0, N, STEP
+
+STATIONS = [("A", LON0 + 3 * STEP, LAT0 + 4 * STEP),
+            ("B", LON0 + 15 * STEP, LAT0 + 18 * STEP),
+            ("C", LON0 + 20 * STEP, LAT0 + 6 * STEP),
+            ("D", LON0 + 8 * STEP, LAT0 + 21 * STEP),
+            ("E", LON0 + 12 * STEP, LAT0 + 12 * STEP)]
+
+
+@pytest.mark.parametrize("network_type", ["walk", "drive"])
+def test_station_lengths_follow_cheapest_path(graph_root, network_type):
+    store = GraphStore.load(str(graph_root / network_type))
+    meta  = build_station_table(store, STATIONS, k=3, chunk=2)
+    store = GraphStore.load(store.root)
+    weight = meta["weight"]
+
+    G = store.subgraph(grid_center(), N * STEP * 111000, retain_all=True)
+    R = G.reverse(copy=False)
+    paths = {}
+    for i, st in enumerate(meta["stations"]):
+        _, paths[i] = nx.single_source_dijkstra(R, st["node"], weight=weight)
+
+    nodes = list(G.nodes)
+    near, cost, length = store.stations.lookup(store.positions(nodes))
+    checked = 0
+    for node, row_st, row_cost, row_len in zip(nodes, near, cost, length):
+        for i, c, ln in zip(row_st, row_cost, row_len):
+            if i < 0:
+                continue
+            path = paths[i][node][::-1]          # node → station
+            assert c == pytest.approx(nx.path_weight(G, path, weight), rel=1e-5)
+            assert ln == pytest.approx(nx.path_weight(G, path, "length"), rel=1e-5)
+            checked += 1
+    assert checked > len(nodes)
+
+
+def test_table_dropped_for_another_graph(tmp_path, monkeypatch):
+    root = str(tmp_path / "drive")
+    build_graph(grid_ways(), "drive", root)
+    build_station_table(GraphStore.load(root), STATIONS, k=2)
+    assert GraphStore.load(root).stations is not None
+
+    # drive travel_time is recomputed from the speed table on load
+    monkeypatch.setitem(graph_store.HIGHWAY_SPEEDS, "residential", 7)
+    assert GraphStore.load(root).stations is None
+    monkeypatch.undo()
+
+    # a rebuilt graph shifts node indices under the table's rows
+    extra = (99_999, {"highway": "primary"},
+             [(900_001, LON0 - STEP, LAT0), (900_002, LON0 - STEP, LAT0 + STEP)])
+    build_graph(grid_ways() + [extra], "drive", root)
+    assert GraphStore.load(root).stations is None